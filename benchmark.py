@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+# benchmark.py
+#
+# End-to-end benchmark. Loads synthetic people, tasks and completions into
+# a scratch Postgres database, points the scripts at the in-process SMTP
+# and IMAP stand-ins, and times reminders, reply processing and the report
+# at several scales. Results are written as JSON so runs can be compared.
+#
+# The database named with --database is wiped on every scale; never point
+# it at real data.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from email.mime.text import MIMEText
+
+from local_services import LocalIMAPServer, LocalSMTPServer
+
+DEFAULT_SCALES = ['100x10x500x50', '1000x20x10000x500', '10000x40x200000x5000']
+BOT_ADDRESS = 'tasks@example.com'
+BOT_PASSWORD = 'benchmark'
+
+def parse_scale(value):
+    """Parse 'PEOPLExTASKSxCOMPLETIONSxREPLIES' into a dict."""
+    people, tasks, completions, replies = (int(part) for part in value.lower().split('x'))
+    if completions > people * tasks:
+        raise ValueError(f"{value}: more completions than person/task pairs")
+    return {'people': people, 'tasks': tasks, 'completions': completions, 'replies': replies}
+
+def generate_dataset(people, tasks, completions, today=None, seed=1):
+    """Return synthetic people, tasks and task_completion rows as tuples.
+
+    Roughly a fifth of the completions are due on or before ``today``.
+    """
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    people_rows = [(n, f'Person {n}', f'person{n}@example.com') for n in range(1, people + 1)]
+    task_rows = [(n, f'Task {n} {rng.choice(["Training", "Certification", "Review"])}', rng.choice([30, 90, 180, 365]))
+                 for n in range(1, tasks + 1)]
+
+    pairs = rng.sample(range(people * tasks), completions)
+    completion_rows = []
+    for pair in pairs:
+        person_id, task_index = divmod(pair, tasks)
+        task = task_rows[task_index]
+        if rng.random() < 0.2:
+            next_due = today - datetime.timedelta(days=rng.randrange(30))
+        else:
+            next_due = today + datetime.timedelta(days=1 + rng.randrange(task[2]))
+        completed = next_due - datetime.timedelta(days=task[2])
+        completion_rows.append((person_id + 1, task[0], completed, next_due))
+    return {'people': people_rows, 'tasks': task_rows, 'task_completion': completion_rows}
+
+def build_reply_corpus(dataset, replies, today=None, seed=1):
+    """Return raw reply emails reporting completions for random people and tasks."""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    corpus = []
+    for _ in range(replies):
+        person = rng.choice(dataset['people'])
+        lines = ['Hi,', '']
+        for task in rng.sample(dataset['tasks'], min(3, len(dataset['tasks']))):
+            done = today - datetime.timedelta(days=rng.randrange(10))
+            lines.append(f"Completed: {task[1]} on {done.isoformat()}")
+        lines += ['', 'Thanks', '', f'On {today:%a, %b %d, %Y}, Tasks <{BOT_ADDRESS}> wrote:', '> Dear Person,']
+        msg = MIMEText('\n'.join(lines), 'plain', 'utf-8')
+        msg['From'] = person[2]
+        msg['To'] = BOT_ADDRESS
+        msg['Subject'] = 'Re: Task Reminder - Tasks Due'
+        corpus.append(msg.as_bytes())
+    return corpus
+
+def load_dataset(connection, dataset):
+    from psycopg2.extras import execute_values
+
+    from schema import migrate
+
+    migrate(connection)
+    cursor = connection.cursor()
+    cursor.execute("""
+        TRUNCATE reminder_outbox, reminder_state, completion_history, task_completion_deletions,
+            task_completion, tasks, people RESTART IDENTITY CASCADE
+    """)
+    execute_values(cursor, "INSERT INTO people (person_id, name, email) VALUES %s", dataset['people'])
+    execute_values(cursor, "INSERT INTO tasks (task_id, task_name, recurrence_period) VALUES %s", dataset['tasks'])
+    execute_values(cursor, """
+        INSERT INTO task_completion (person_id, task_id, completion_date, next_due_date) VALUES %s
+    """, dataset['task_completion'], page_size=1000)
+    cursor.execute("ANALYZE people; ANALYZE tasks; ANALYZE task_completion;")
+    connection.commit()
+
+def timed(timings, errors, name, func):
+    started = time.perf_counter()
+    try:
+        result = func()
+    except Exception as e:
+        errors[name] = repr(e)
+        result = None
+    timings[name] = round(time.perf_counter() - started, 4)
+    return result
+
+def run_scale(scale, workdir, smtp, imap, seed=1):
+    """Load one scale's data and time each job against it."""
+    import lookup_cache
+    from db_connection import pooled_connection
+    from generate_reports import run_report
+    from process_replies import load_imap_config, process_emails
+    from send_reminders import run_reminders
+    from smtp_pool import pool_from_env
+
+    dataset = generate_dataset(scale['people'], scale['tasks'], scale['completions'], seed=seed)
+    corpus = build_reply_corpus(dataset, scale['replies'], seed=seed)
+    timings, errors = {}, {}
+
+    with pooled_connection() as connection:
+        timed(timings, errors, 'load', lambda: load_dataset(connection, dataset))
+    # The previous scale's people and tasks would otherwise be served until
+    # the next probe; start every scale with an empty cache
+    lookup_cache._cache = None
+
+    delivered_before = len(smtp.messages)
+    timed(timings, errors, 'remind', run_reminders)
+    reminders_sent = len(smtp.messages) - delivered_before
+
+    for raw in corpus:
+        imap.add_message(raw)
+    config = load_imap_config()
+    config['checkpoint_file'] = os.path.join(workdir, 'imap_checkpoint.json')
+    timed(timings, errors, 'ingest', lambda: process_emails(config))
+
+    def report():
+        with pool_from_env() as pool:
+            return run_report(force=True, pool=pool)
+
+    timed(timings, errors, 'report', report)
+    return dict(scale, timings=timings, errors=errors, reminders_sent=reminders_sent)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Time reminders, reply processing and reports end to end.")
+    arg_parser.add_argument('--database', required=True,
+                            help="scratch Postgres database to use; its task tables are wiped")
+    arg_parser.add_argument('--scale', action='append', dest='scales',
+                            help="PEOPLExTASKSxCOMPLETIONSxREPLIES, may be repeated (default: %s)" % ', '.join(DEFAULT_SCALES))
+    arg_parser.add_argument('--output', help="result file (default: benchmark_results/<timestamp>.json)")
+    arg_parser.add_argument('--seed', type=int, default=1)
+    args = arg_parser.parse_args()
+    scales = [parse_scale(value) for value in args.scales or DEFAULT_SCALES]
+
+    output = os.path.abspath(args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'benchmark_results',
+        f"{datetime.datetime.now():%Y%m%dT%H%M%S}.json"))
+    workdir = tempfile.mkdtemp(prefix='llama_tasks_bench_')
+    results = {
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'runs': [],
+    }
+
+    with LocalSMTPServer(user=BOT_ADDRESS, password=BOT_PASSWORD) as smtp, \
+            LocalIMAPServer(user=BOT_ADDRESS, password=BOT_PASSWORD) as imap:
+        # load_dotenv never overrides variables that are already set
+        os.environ.update({
+            'DB_NAME': args.database,
+            'SMTP_SERVER': '127.0.0.1', 'SMTP_PORT': str(smtp.port), 'SMTP_STARTTLS': 'false',
+            'IMAP_SERVER': '127.0.0.1', 'IMAP_PORT': str(imap.port), 'IMAP_SSL': 'false',
+            'EMAIL_ADDRESS': BOT_ADDRESS, 'EMAIL_PASSWORD': BOT_PASSWORD,
+            'ADMIN_EMAILS': 'admin@example.com',
+            'REPORT_CACHE_FILE': os.path.join(workdir, 'report_cache.sqlite3'),
+        })
+        os.chdir(workdir)
+        for scale in scales:
+            run = run_scale(scale, workdir, smtp, imap, args.seed)
+            results['runs'].append(run)
+            summary = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in run['timings'].items())
+            print(f"{scale['people']} people / {scale['tasks']} tasks / {scale['completions']} completions / "
+                  f"{scale['replies']} replies: {summary}")
+            for name, error in run['errors'].items():
+                print(f"  {name} failed: {error}")
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# benchmark_history.py
+#
+# Range-query benchmark for the partitioned completion history. History is
+# grown month by month at a fixed number of completions per month, and
+# after each step a one-month report query is timed and EXPLAINed to show
+# how many partitions it touches. With pruning both should stay flat as the
+# table grows to millions of rows.
+#
+# The database named with --database has its completion history wiped;
+# never point it at real data.
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import time
+
+START = datetime.date(2015, 1, 1)
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return datetime.date(day.year + month // 12, month % 12 + 1, 1)
+
+def scanned_relations(plan):
+    """Names of every relation an EXPLAIN plan node reads."""
+    found = set()
+    if 'Relation Name' in plan:
+        found.add(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found |= scanned_relations(child)
+    return found
+
+def grow_history(connection, first_month, months, rows_per_month):
+    cursor = connection.cursor()
+    end = add_months(first_month, months)
+    cursor.execute("""
+        SELECT completion_history_ensure_partition(month::date)
+        FROM generate_series(%s::date, %s::date - 1, interval '1 month') AS month
+    """, (first_month, end))
+    connection.commit()
+    cursor.execute("""
+        INSERT INTO completion_history (person_id, task_id, completion_date, next_due_date)
+        SELECT 1 + (random() * 9999)::int, 1 + (random() * 39)::int, day, day + 365
+        FROM (
+            SELECT %(start)s::date + (random() * (%(end)s::date - %(start)s::date - 1))::int AS day
+            FROM generate_series(1, %(count)s)
+        ) generated
+    """, {'start': first_month, 'end': end, 'count': months * rows_per_month})
+    cursor.execute("ANALYZE completion_history")
+    connection.commit()
+
+def time_range_query(connection, start, end, repeat):
+    from completion_history import COMPLETIONS_BY_MONTH_QUERY, completions_by_month
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        completions_by_month(connection, start, end)
+        timings.append(time.perf_counter() - started)
+    cursor = connection.cursor()
+    cursor.execute("EXPLAIN (FORMAT JSON) " + COMPLETIONS_BY_MONTH_QUERY.strip().rstrip(';'), (start, end))
+    plan = cursor.fetchone()['QUERY PLAN']
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    connection.rollback()
+    return {
+        'median_seconds': round(statistics.median(timings), 6),
+        'partitions_scanned': len(scanned_relations(plan[0]['Plan'])),
+    }
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmark date-range queries over the completion history.")
+    arg_parser.add_argument('--database', required=True,
+                            help="scratch Postgres database to use; its completion history is wiped")
+    arg_parser.add_argument('--months', default='6,24,60',
+                            help="history lengths in months to measure at, comma-separated")
+    arg_parser.add_argument('--rows-per-month', type=int, default=100000)
+    arg_parser.add_argument('--repeat', type=int, default=20)
+    arg_parser.add_argument('--output', help="write the results here as JSON")
+    args = arg_parser.parse_args()
+    steps = sorted(int(months) for months in args.months.split(','))
+
+    # load_dotenv never overrides variables that are already set
+    os.environ['DB_NAME'] = args.database
+    from db_connection import pooled_connection
+    from schema import migrate
+
+    results = {'rows_per_month': args.rows_per_month, 'steps': []}
+    with pooled_connection() as connection:
+        migrate(connection)
+        connection.cursor().execute("TRUNCATE completion_history")
+        connection.commit()
+
+        loaded = 0
+        for months in steps:
+            grow_history(connection, add_months(START, loaded), months - loaded, args.rows_per_month)
+            loaded = months
+            last_month = add_months(START, months - 1)
+            step = dict(months=months, rows=months * args.rows_per_month,
+                        **time_range_query(connection, last_month, add_months(last_month, 1), args.repeat))
+            results['steps'].append(step)
+            print(f"{step['rows']:>10} rows over {months} months: one-month query "
+                  f"{step['median_seconds'] * 1000:.2f} ms, {step['partitions_scanned']} partition(s) scanned")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
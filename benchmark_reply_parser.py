@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# benchmark_reply_parser.py
+#
+# Throughput of reply parsing over a generated corpus of realistic reply
+# bodies, compared with the original per-line regex and strptime loop.
+
+import argparse
+import datetime
+import random
+import re
+import time
+
+from dateutil import parser as date_parser
+
+from reply_parser import parse_date, parse_reply
+
+TASKS = ['Fire Safety Training', 'Data Privacy Compliance', 'CPR Certification',
+         'Forklift Operation', 'First Aid Refresher', 'Hazmat Handling']
+DATE_LAYOUTS = ['%Y-%m-%d', '%m/%d/%Y', '%d-%m-%Y', '%B %d, %Y', '%b %d, %Y', '%d %B %Y', '%d %b %Y']
+
+def build_corpus(replies=2000, seed=1):
+    """Return reply bodies mixing completions, chatter, bad dates and quotes."""
+    rng = random.Random(seed)
+    start = datetime.date(2023, 1, 1)
+    bodies = []
+    for _ in range(replies):
+        lines = [rng.choice(['Hi,', 'Hello team,', ''])]
+        for _ in range(rng.randint(1, 6)):
+            task = rng.choice(TASKS)
+            day = start + datetime.timedelta(days=rng.randrange(365))
+            if rng.random() < 0.05:
+                lines.append(f"Completed: {task} on sometime last week")
+            else:
+                lines.append(f"Completed: {task} on {day.strftime(rng.choice(DATE_LAYOUTS))}")
+        lines += ['', 'Thanks,', 'Sam', '', 'On Mon, Oct 2, 2023 at 9:00 AM Tasks <tasks@example.com> wrote:']
+        lines += ['> Dear Sam,', '> This is a reminder that you have the following tasks due:']
+        bodies.append('\n'.join(lines))
+    return bodies
+
+def legacy_parse(body):
+    # The original process_email_content loop, minus the printing
+    formats = ['%Y-%m-%d', '%m/%d/%Y', '%d-%m-%Y', '%B %d, %Y', '%b %d, %Y', '%d %B %Y', '%d %b %Y']
+    results = []
+    for line in body.strip().split('\n'):
+        line = line.strip()
+        if line.startswith('>') or line.lower().startswith('on ') or line.lower().startswith('from:'):
+            break
+        match = re.match(r'Completed:\s*(.+?)\s+on\s+(.+)', line, re.IGNORECASE)
+        if not match:
+            results.append(None)
+            continue
+        date_str = match.group(2).strip()
+        parsed = None
+        for fmt in formats:
+            try:
+                parsed = datetime.datetime.strptime(date_str, fmt).date()
+                break
+            except ValueError:
+                continue
+        if parsed is None:
+            try:
+                parsed = date_parser.parse(date_str, fuzzy=True).date()
+            except (ValueError, TypeError, OverflowError):
+                pass
+        results.append(parsed)
+    return results
+
+def measure(parse, corpus):
+    started = time.perf_counter()
+    for body in corpus:
+        parse(body)
+    return time.perf_counter() - started
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmark reply parsing throughput.")
+    arg_parser.add_argument('--replies', type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    corpus = build_corpus(args.replies)
+    # Throughput is over every line of every body, quoted text included
+    lines = sum(body.count('\n') + 1 for body in corpus)
+    for label, parse in [('legacy', legacy_parse), ('reply_parser', parse_reply)]:
+        parse_date.cache_clear()
+        elapsed = measure(parse, corpus)
+        print(f"{label:>12}: {lines} lines in {elapsed:.3f}s ({lines / elapsed:,.0f} lines/s)")
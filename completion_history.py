@@ -0,0 +1,114 @@
+# completion_history.py
+#
+# Append-only completion history. Every completion line that reply
+# processing resolves is appended to completion_history, which is range
+# partitioned by completion month so date-range queries only touch the
+# months they cover; task_completion stays the latest-state projection the
+# reminders and reports read.
+
+import threading
+
+from psycopg2.extras import execute_values
+
+COMPLETION_HISTORY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS completion_history (
+        history_id bigserial,
+        person_id integer NOT NULL,
+        task_id integer NOT NULL,
+        completion_date date NOT NULL,
+        next_due_date date NOT NULL,
+        recorded_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (history_id, completion_date)
+    ) PARTITION BY RANGE (completion_date);
+    CREATE INDEX IF NOT EXISTS completion_history_person_task_idx
+        ON completion_history (person_id, task_id, completion_date);
+
+    CREATE OR REPLACE FUNCTION completion_history_ensure_partition(day date) RETURNS void AS $$
+    DECLARE
+        month date := date_trunc('month', day)::date;
+    BEGIN
+        -- Serialize concurrent writers creating the same month
+        PERFORM pg_advisory_xact_lock(hashtext('completion_history_partitions'));
+        IF to_regclass('completion_history_' || to_char(month, 'YYYY_MM')) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF completion_history FOR VALUES FROM (%L) TO (%L)',
+                'completion_history_' || to_char(month, 'YYYY_MM'), month, (month + interval '1 month')::date
+            );
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    -- Seed the history with the current state
+    SELECT completion_history_ensure_partition(month)
+    FROM (SELECT DISTINCT date_trunc('month', completion_date)::date AS month FROM task_completion) months;
+    INSERT INTO completion_history (person_id, task_id, completion_date, next_due_date)
+    SELECT person_id, task_id, completion_date, next_due_date FROM task_completion;
+"""
+
+# Completions per task and month over [start, end); prunes to those months
+COMPLETIONS_BY_MONTH_QUERY = """
+SELECT
+    task_id,
+    date_trunc('month', completion_date)::date AS month,
+    count(*) AS completions,
+    count(DISTINCT person_id) AS people
+FROM completion_history
+WHERE completion_date >= %s AND completion_date < %s
+GROUP BY task_id, month
+ORDER BY month, task_id;
+"""
+
+# Months whose partition is known to exist in this process
+_partitions = set()
+_partitions_lock = threading.Lock()
+_installed = False
+
+def history_installed(connection):
+    """Whether the schema migration adding completion_history has been run.
+
+    Only a positive answer is remembered, so a long-running process starts
+    recording history as soon as the migration is applied.
+    """
+    global _installed
+    if not _installed:
+        cursor = connection.cursor()
+        cursor.execute("SELECT to_regclass('completion_history') IS NOT NULL AS installed")
+        _installed = cursor.fetchone()['installed']
+        if not _installed:
+            print("completion_history is missing; run 'schema.py migrate' to record completion history.")
+    return _installed
+
+def ensure_partitions(connection, dates):
+    """Create the monthly partitions covering ``dates`` that are missing.
+
+    Commits, so call it before writing anything in the transaction.
+    """
+    months = {date.replace(day=1) for date in dates}
+    with _partitions_lock:
+        missing = sorted(months - _partitions)
+    if not missing:
+        return
+    cursor = connection.cursor()
+    for month in missing:
+        cursor.execute("SELECT completion_history_ensure_partition(%s)", (month,))
+    connection.commit()
+    with _partitions_lock:
+        _partitions.update(missing)
+
+def append_history(connection, rows):
+    """Append ``(person_id, task_id, completion_date, next_due_date)`` rows.
+
+    Does not commit; the caller writes the projection in the same transaction.
+    """
+    if not rows:
+        return
+    cursor = connection.cursor()
+    execute_values(cursor, """
+        INSERT INTO completion_history (person_id, task_id, completion_date, next_due_date)
+        VALUES %s
+    """, rows, page_size=1000)
+
+def completions_by_month(connection, start, end):
+    cursor = connection.cursor()
+    cursor.execute(COMPLETIONS_BY_MONTH_QUERY, (start, end))
+    return cursor.fetchall()
@@ -1,25 +1,252 @@
 # db_connection.py
 
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
-from dotenv import load_dotenv
-import os
+from psycopg2.pool import PoolError
+
+import metrics
+import settings
+
+settings.load_env()
+
+class _CountingMixin:
+    """Count statements and server round trips in the run metrics.
+
+    Server-side (named) cursors also count each FETCH they issue.
+    """
+
+    def execute(self, query, vars=None):
+        metrics.count('db_queries')
+        metrics.count('db_round_trips')
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        # psycopg2 sends one statement per parameter set
+        vars_list = list(vars_list)
+        metrics.count('db_queries', len(vars_list))
+        metrics.count('db_round_trips', len(vars_list))
+        return super().executemany(query, vars_list)
+
+    def _fetched(self):
+        if self.name is not None:
+            metrics.count('db_round_trips')
 
-# Load environment variables from the .env file
-load_dotenv(/home/llama/llama_tasks/.env)
+    def fetchone(self):
+        self._fetched()
+        return super().fetchone()
+
+    def fetchmany(self, size=None):
+        self._fetched()
+        return super().fetchmany(size) if size is not None else super().fetchmany()
+
+    def fetchall(self):
+        self._fetched()
+        return super().fetchall()
+
+    def __iter__(self):
+        for number, row in enumerate(super().__iter__()):
+            if self.name is not None and number % self.itersize == 0:
+                metrics.count('db_round_trips')
+            yield row
+
+class CountingCursor(_CountingMixin, RealDictCursor):
+    pass
+
+class CountingTupleCursor(_CountingMixin, extensions.cursor):
+    pass
+
+class CountingConnection(extensions.connection):
+    def commit(self):
+        metrics.count('db_round_trips')
+        return super().commit()
+
+    def rollback(self):
+        metrics.count('db_round_trips')
+        return super().rollback()
+
+def _connect():
+    # All callers index rows by column name, so hand out dict cursors by default
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        connection_factory=CountingConnection,
+        cursor_factory=CountingCursor
+    )
 
 def get_db_connection():
     try:
-        connection = psycopg2.connect(
-            host=os.getenv('DB_HOST'),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
-        return connection
+        return _connect()
     except Exception as e:
         print(f"Error connecting to the database: {e}")
         return None
 
 def get_db_cursor(connection):
-    return connection.cursor(cursor_factory=RealDictCursor)
+    return connection.cursor(cursor_factory=CountingCursor)
+
+class ConnectionPool:
+    """Thread-safe pool of reusable database connections.
+
+    Connections are handed out most-recently-used first so that idle ones
+    age out; a connection that sat idle longer than ``max_idle`` seconds is
+    pinged before reuse and replaced if the server dropped it.
+    """
+
+    def __init__(self, minconn=1, maxconn=10, max_idle=300, timeout=30, connect=_connect):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Pool sizes must satisfy 0 <= minconn <= maxconn and maxconn >= 1")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._connect = connect
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stats = {'checkouts': 0, 'waits': 0, 'creations': 0, 'discarded': 0}
+        for _ in range(minconn):
+            self._size += 1
+            self._idle.append((self._create(), time.monotonic()))
+
+    def _create(self):
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats['creations'] += 1
+        return connection
+
+    def _is_healthy(self, connection, idle_for):
+        if connection.closed:
+            return False
+        if idle_for < self.max_idle:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.stats['discarded'] += 1
+            self._cond.notify()
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                elif self._size < self.maxconn:
+                    self._size += 1
+                    connection = None
+                else:
+                    self.stats['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        raise PoolError(f"no connection available within {self.timeout}s")
+                    continue
+
+            if connection is None:
+                connection = self._create()
+            elif not self._is_healthy(connection, time.monotonic() - returned_at):
+                self._discard(connection)
+                continue
+
+            with self._cond:
+                self.stats['checkouts'] += 1
+            return connection
+
+    def putconn(self, connection, discard=False):
+        if not discard and not connection.closed:
+            try:
+                # Never hand out a connection with an open or aborted transaction
+                status = connection.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            keep = not (discard or connection.closed or self._closed)
+            if keep:
+                self._idle.append((connection, time.monotonic()))
+                self._cond.notify()
+        if not keep:
+            self._discard(connection)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._discard(connection)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                minconn=int(os.getenv('DB_POOL_MIN', '1')),
+                maxconn=int(os.getenv('DB_POOL_MAX', '10')),
+                max_idle=float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+                timeout=float(os.getenv('DB_POOL_TIMEOUT', '30'))
+            )
+            atexit.register(_pool.closeall)
+        return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+@contextmanager
+def pooled_connection(pool=None):
+    """Check a connection out of the pool and return it when the block exits.
+
+    Uncommitted work is rolled back on return; connections that failed at
+    the transport level are dropped instead of being reused.
+    """
+    pool = pool or get_pool()
+    connection = pool.getconn()
+    discard = False
+    try:
+        yield connection
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        pool.putconn(connection, discard=discard)
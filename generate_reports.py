@@ -4,139 +4,64 @@
 
 import os
 import datetime
-from db_connection import get_db_connection
-from dotenv import load_dotenv
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, Alignment
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email.mime.text import MIMEText
-from email import encoders
+import metrics
+import settings
+from db_connection import pooled_connection
+from report_cache import DEFAULT_CACHE_FILE, ReportCache, iter_cached_rows, refresh_report_cache
+from report_data import begin_report_snapshot, fetch_people_summary, fetch_report_tasks
+from report_writer import report_column_widths, write_streaming_report
 import logging
 
-# Configure logging
-logging.basicConfig(
-    filename='/path/to/your/logfile.log',
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s:%(message)s'
-)
+settings.load_env()
 
-# Load environment variables
-load_dotenv('/path/to/your/.env')  # Update the path to your .env file
-
-def fetch_people():
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        query = "SELECT person_id, name FROM people ORDER BY name;"
-        cursor.execute(query)
-        people = cursor.fetchall()
-        connection.close()
-        return people
-    except Exception as e:
-        logging.error("Error fetching people data", exc_info=True)
-        return []
-
-def fetch_tasks():
+def generate_excel_report(rows, tasks, name_width, report_file):
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        query = "SELECT task_id, task_name FROM tasks ORDER BY task_name;"
-        cursor.execute(query)
-        tasks = cursor.fetchall()
-        connection.close()
-        return tasks
+        task_names = [task['task_name'] for task in tasks]
+        write_streaming_report(
+            report_file,
+            task_names,
+            rows,
+            report_column_widths(task_names, name_width)
+        )
+        logging.info(f"Report generated: {report_file}")
+        print(f"Report generated: {report_file}")
+        return True
     except Exception as e:
-        logging.error("Error fetching tasks data", exc_info=True)
-        return []
+        logging.error("Error generating Excel report", exc_info=True)
+        print("An error occurred while generating the report.")
+        return False
 
-def fetch_task_completions():
+def generate_frame_report(connection, report_file, report_format):
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        query = """
-        SELECT
-            tc.person_id,
-            tc.task_id,
-            tc.completion_date
-        FROM
-            task_completion tc;
-        """
-        cursor.execute(query)
-        completions = cursor.fetchall()
-        connection.close()
-        return completions
-    except Exception as e:
-        logging.error("Error fetching task completions data", exc_info=True)
-        return []
+        # pandas is only imported when this backend is used
+        from report_frame import load_report_frame, write_report_frame
 
-def generate_excel_report(people, tasks, completions, report_file):
-    try:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Task Completion Report"
-
-        # Bold font for headers
-        bold_font = Font(bold=True)
-        center_alignment = Alignment(horizontal='center', vertical='center')
-
-        # Write task names in the first row starting from column B
-        for col_num, task in enumerate(tasks, start=2):
-            col_letter = get_column_letter(col_num)
-            ws[f"{col_letter}1"] = task['task_name']
-            ws[f"{col_letter}1"].font = bold_font
-            ws[f"{col_letter}1"].alignment = center_alignment
-
-        # Write people names in the first column starting from row 2
-        for row_num, person in enumerate(people, start=2):
-            ws[f"A{row_num}"] = person['name']
-            ws[f"A{row_num}"].font = bold_font
-            ws[f"A{row_num}"].alignment = Alignment(horizontal='left', vertical='center')
-
-        # Create a dictionary for quick lookup of completion dates
-        completion_dict = {}
-        for completion in completions:
-            key = (completion['person_id'], completion['task_id'])
-            completion_dict[key] = completion['completion_date']
-
-        # Fill in the completion dates
-        person_id_to_row = {person['person_id']: row_num for row_num, person in enumerate(people, start=2)}
-        task_id_to_col = {task['task_id']: col_num for col_num, task in enumerate(tasks, start=2)}
-
-        date_format = 'YYYY-MM-DD'
-
-        for (person_id, task_id), completion_date in completion_dict.items():
-            row_num = person_id_to_row.get(person_id)
-            col_num = task_id_to_col.get(task_id)
-            if row_num and col_num:
-                col_letter = get_column_letter(col_num)
-                cell = ws[f"{col_letter}{row_num}"]
-                cell.value = completion_date.strftime('%Y-%m-%d')
-                cell.alignment = center_alignment
-
-        # Adjust column widths
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            adjusted_width = (max_length + 2)
-            ws.column_dimensions[column].width = adjusted_width
-
-        # Save the workbook
-        wb.save(report_file)
+        write_report_frame(load_report_frame(connection), report_file, report_format)
         logging.info(f"Report generated: {report_file}")
         print(f"Report generated: {report_file}")
+        return True
     except Exception as e:
-        logging.error("Error generating Excel report", exc_info=True)
-        print("An error occurred while generating the report.")
+        logging.error("Error generating report with the pandas backend", exc_info=True)
+        print(f"An error occurred while generating the report: {e}")
+        return False
+
+# MIME types for the report attachment, by format
+REPORT_MIME_TYPES = {
+    'xlsx': ('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('text', 'csv'),
+    'parquet': ('application', 'vnd.apache.parquet'),
+}
+
+def send_report(report_file, pool=None):
+    """Email the report to ADMIN_EMAILS, through ``pool`` when one is given."""
+    import smtplib
+    from email import encoders
+    from email.mime.base import MIMEBase
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
 
-def send_report(report_file):
     smtp_server = os.getenv('SMTP_SERVER')
-    smtp_port = int(os.getenv('SMTP_PORT'))
+    smtp_port = os.getenv('SMTP_PORT')
     email_address = os.getenv('EMAIL_ADDRESS')
     email_password = os.getenv('EMAIL_PASSWORD')
     admin_emails = os.getenv('ADMIN_EMAILS')  # Comma-separated list of admin emails
@@ -144,19 +69,10 @@ def send_report(report_file):
     if not all([smtp_server, smtp_port, email_address, email_password, admin_emails]):
         logging.error("SMTP or admin email configuration is incomplete.")
         print("SMTP or admin email configuration is incomplete in the .env file.")
-        return
+        return False
 
     admin_email_list = [email.strip() for email in admin_emails.split(',')]
 
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(email_address, email_password)
-    except Exception as e:
-        logging.error("Failed to connect to the SMTP server", exc_info=True)
-        print(f"Failed to connect to the SMTP server: {e}")
-        return
-
     msg = MIMEMultipart()
     msg['From'] = email_address
     msg['To'] = ', '.join(admin_email_list)
@@ -167,7 +83,8 @@ def send_report(report_file):
     msg.attach(MIMEText(body, 'plain'))
 
     # Attach the report file
-    attachment = MIMEBase('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    report_format = os.path.splitext(report_file)[1].lstrip('.').lower()
+    attachment = MIMEBase(*REPORT_MIME_TYPES.get(report_format, ('application', 'octet-stream')))
     try:
         with open(report_file, 'rb') as file:
             attachment.set_payload(file.read())
@@ -177,35 +94,105 @@ def send_report(report_file):
     except Exception as e:
         logging.error("Failed to read the report file", exc_info=True)
         print("Failed to read the report file.")
-        return
+        return False
+
+    if pool is not None:
+        result = pool.send(msg)
+        if result['status'] != 'sent':
+            logging.error(f"Failed to send report email: {result['error']}")
+            print(f"Failed to send report email: {result['error']}")
+            return False
+        logging.info(f"Report emailed to administrators: {admin_email_list}")
+        print(f"Report emailed to administrators: {admin_email_list}")
+        return True
+
+    try:
+        server = smtplib.SMTP(smtp_server, int(smtp_port))
+        server.starttls()
+        server.login(email_address, email_password)
+    except Exception as e:
+        logging.error("Failed to connect to the SMTP server", exc_info=True)
+        print(f"Failed to connect to the SMTP server: {e}")
+        return False
 
     try:
-        server.send_message(msg)
+        with metrics.span('smtp_send'):
+            server.send_message(msg)
         logging.info(f"Report emailed to administrators: {admin_email_list}")
         print(f"Report emailed to administrators: {admin_email_list}")
+        return True
     except Exception as e:
         logging.error("Failed to send report email", exc_info=True)
         print(f"Failed to send report email: {e}")
+        return False
     finally:
         server.quit()
 
-if __name__ == '__main__':
+@metrics.job('report')
+def run_report(force=False, report_format='xlsx', backend=None, pool=None):
+    """Generate the report if anything changed (or ``force``) and email it.
+
+    Returns 'delivered', 'skipped' when nothing changed since the last
+    delivered report, or 'failed'.
+    """
+    backend = backend or ('stream' if report_format == 'xlsx' else 'pandas')
     try:
-        # Fetch data
-        people = fetch_people()
-        tasks = fetch_tasks()
-        completions = fetch_task_completions()
-
-        if not people or not tasks:
-            logging.error("No people or tasks data to generate report.")
-            print("No data available to generate the report.")
-        else:
-            # Generate report
-            report_file = 'task_report.xlsx'
-            generate_excel_report(people, tasks, completions, report_file)
+        report_file = f'task_report.{report_format}'
+        generated = False
+        outcome = 'failed'
+        cache = ReportCache(os.getenv('REPORT_CACHE_FILE', DEFAULT_CACHE_FILE))
+
+        try:
+            with pooled_connection() as connection:
+                # Read everything from one connection and one consistent snapshot
+                with metrics.span('db_read'):
+                    begin_report_snapshot(connection)
+                    tasks = fetch_report_tasks(connection)
+                    people = fetch_people_summary(connection)
+                    changed = bool(people['people'] and tasks) and refresh_report_cache(connection, cache)
+
+                if not people['people'] or not tasks:
+                    logging.error("No people or tasks data to generate report.")
+                    print("No data available to generate the report.")
+                elif not changed and not force:
+                    logging.info("No changes since the last delivered report.")
+                    print("No changes since the last delivered report; skipping.")
+                    outcome = 'skipped'
+                elif backend == 'pandas':
+                    with metrics.span('render'):
+                        generated = generate_frame_report(connection, report_file, report_format)
+                else:
+                    # Generate report
+                    rows = iter_cached_rows(connection, cache, len(tasks))
+                    with metrics.span('render'):
+                        generated = generate_excel_report(rows, tasks, people['name_width'], report_file)
 
             # Send the report via email
-            send_report(report_file)
+            if generated and send_report(report_file, pool):
+                cache.mark_delivered()
+                outcome = 'delivered'
+            return outcome
+        finally:
+            cache.close()
     except Exception as e:
         logging.error("An error occurred in the main execution block", exc_info=True)
         print("An error occurred while running the report generation.")
+        return 'failed'
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Generate and email the task completion report.")
+    arg_parser.add_argument('--force', action='store_true',
+                            help="regenerate and send even if nothing changed since the last report")
+    arg_parser.add_argument('--format', choices=('xlsx', 'csv', 'parquet'), default='xlsx',
+                            help="report file format (csv and parquet use the pandas backend)")
+    arg_parser.add_argument('--backend', choices=('stream', 'pandas'),
+                            help="report engine; defaults to stream for xlsx and pandas otherwise")
+    args = arg_parser.parse_args()
+    if args.backend == 'stream' and args.format != 'xlsx':
+        arg_parser.error("the stream backend only writes xlsx")
+
+    settings.configure_logging()
+    if run_report(args.force, args.format, args.backend) == 'failed':
+        raise SystemExit(1)
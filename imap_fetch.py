@@ -0,0 +1,243 @@
+# imap_fetch.py
+
+import email
+import json
+import os
+import re
+
+import metrics
+
+# Only the headers process_replies looks at are downloaded
+HEADER_FIELDS = 'FROM SUBJECT'
+
+class _Literal(bytes):
+    pass
+
+def uid_message_set(uids):
+    """Compress UIDs into an IMAP message set such as ``1:4,7,9:12``."""
+    ranges = []
+    for uid in sorted(set(int(uid) for uid in uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ','.join(str(start) if start == end else f"{start}:{end}" for start, end in ranges)
+
+def _segments(data):
+    # imaplib returns literals as (text ending in {n}, literal) tuples and the
+    # text that follows a literal as a separate bytes item
+    for item in data:
+        if isinstance(item, tuple):
+            yield re.sub(rb'\{\d+\}$', b'', item[0])
+            yield _Literal(item[1])
+        elif item:
+            yield item
+
+def _tokens(data):
+    for segment in _segments(data):
+        if isinstance(segment, _Literal):
+            yield segment
+            continue
+        pos = 0
+        length = len(segment)
+        while pos < length:
+            char = segment[pos:pos + 1]
+            if char in (b' ', b'\r', b'\n'):
+                pos += 1
+            elif char in (b'(', b')'):
+                yield char.decode()
+                pos += 1
+            elif char == b'"':
+                value = bytearray()
+                pos += 1
+                while pos < length and segment[pos:pos + 1] != b'"':
+                    if segment[pos:pos + 1] == b'\\':
+                        pos += 1
+                    value += segment[pos:pos + 1]
+                    pos += 1
+                yield bytes(value)
+                pos += 1
+            else:
+                start = pos
+                while pos < length and segment[pos:pos + 1] not in (b' ', b'(', b')', b'\r', b'\n'):
+                    if segment[pos:pos + 1] == b'[':
+                        # Section specs like BODY[HEADER.FIELDS (FROM)] contain spaces
+                        pos = segment.index(b']', pos)
+                    pos += 1
+                atom = segment[start:pos]
+                yield None if atom.upper() == b'NIL' else atom
+
+def _parse_list(tokens):
+    items = []
+    for token in tokens:
+        if token == '(':
+            items.append(_parse_list(tokens))
+        elif token == ')':
+            return items
+        else:
+            items.append(token)
+    return items
+
+def parse_fetch_response(data):
+    """Parse ``UID FETCH`` response data into ``{uid: {item: value}}``.
+
+    Item names are upper-cased (``BODYSTRUCTURE``, ``BODY[1]``); unsolicited
+    FETCH responses that carry no UID are ignored.
+    """
+    messages = {}
+    tokens = _tokens(data)
+    for token in tokens:
+        if token != '(':
+            continue
+        values = _parse_list(tokens)
+        items = {}
+        for key, value in zip(values[::2], values[1::2]):
+            items[key.decode().upper()] = value
+        if 'UID' in items:
+            messages[int(items['UID'])] = items
+    return messages
+
+def _text(value):
+    return value.decode(errors='replace') if isinstance(value, bytes) else ''
+
+def find_text_parts(structure, prefix=''):
+    """Return ``(section, charset, encoding)`` for each inline text/plain part."""
+    if structure and isinstance(structure[0], list):
+        # Multipart: child parts come first, then the subtype and extensions
+        parts = []
+        for number, child in enumerate(structure, start=1):
+            if not isinstance(child, list):
+                break
+            parts.extend(find_text_parts(child, f"{prefix}{number}."))
+        return parts
+
+    if len(structure) < 7:
+        return []
+    if _text(structure[0]).lower() != 'text' or _text(structure[1]).lower() != 'plain':
+        return []
+    # Extension data for text parts: lines, md5, disposition
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and disposition and _text(disposition[0]).lower() == 'attachment':
+        return []
+
+    params = structure[2] if isinstance(structure[2], list) else []
+    charset = None
+    for key, value in zip(params[::2], params[1::2]):
+        if _text(key).lower() == 'charset':
+            charset = _text(value)
+    encoding = _text(structure[5]) or '7bit'
+    return [(prefix.rstrip('.') or '1', charset, encoding)]
+
+def build_message(header_bytes, parts):
+    """Rebuild a parseable message from fetched headers and text sections."""
+    def part_bytes(charset, encoding, body):
+        content_type = f'text/plain; charset="{charset}"' if charset else 'text/plain'
+        return (f"Content-Type: {content_type}\r\n"
+                f"Content-Transfer-Encoding: {encoding}\r\n\r\n").encode() + body
+
+    header_bytes = header_bytes.rstrip(b'\r\n') + b'\r\nMIME-Version: 1.0\r\n'
+    if len(parts) == 1:
+        raw = header_bytes + part_bytes(*parts[0])
+    else:
+        boundary = '=_llama_tasks_text_parts'
+        raw = header_bytes + f'Content-Type: multipart/mixed; boundary="{boundary}"\r\n\r\n'.encode()
+        for part in parts:
+            raw += f"--{boundary}\r\n".encode() + part_bytes(*part) + b"\r\n"
+        raw += f"--{boundary}--\r\n".encode()
+    return email.message_from_bytes(raw)
+
+def _uid_fetch(mail, uids, items):
+    status, data = mail.uid('FETCH', uid_message_set(uids), items)
+    if status != 'OK':
+        raise RuntimeError(f"UID FETCH failed: {data}")
+    return parse_fetch_response(data)
+
+def fetch_messages(mail, uids, max_bytes=None):
+    """Fetch headers and text/plain parts for ``uids`` in a few round trips.
+
+    One FETCH returns structure and headers for the whole batch, then one
+    FETCH per distinct set of text sections downloads the bodies, each
+    capped at ``max_bytes`` with a partial fetch when given. Nothing is
+    marked seen (BODY.PEEK). Returns a list of ``(uid, message)`` in UID
+    order; messages without a text/plain part get an empty body.
+    """
+    if not uids:
+        return []
+    with metrics.span('imap_fetch'):
+        messages = _fetch_messages(mail, uids, max_bytes)
+    metrics.count('messages_fetched', len(messages))
+    return messages
+
+def _fetch_messages(mail, uids, max_bytes):
+    overview = _uid_fetch(mail, uids, f'(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])')
+
+    headers = {}
+    text_parts = {}
+    by_sections = {}
+    for uid, items in overview.items():
+        headers[uid] = next((value for key, value in items.items() if key.startswith('BODY[HEADER')), b'') or b''
+        text_parts[uid] = find_text_parts(items.get('BODYSTRUCTURE') or [])
+        sections = tuple(section for section, _, _ in text_parts[uid])
+        if sections:
+            by_sections.setdefault(sections, []).append(uid)
+
+    bodies = {}
+    for sections, section_uids in by_sections.items():
+        partial = f'<0.{max_bytes}>' if max_bytes else ''
+        items = ' '.join(f'BODY.PEEK[{section}]{partial}' for section in sections)
+        for uid, values in _uid_fetch(mail, section_uids, f'(UID {items})').items():
+            bodies[uid] = {key: value for key, value in values.items() if key.startswith('BODY[')}
+
+    messages = []
+    for uid in sorted(overview):
+        parts = []
+        for section, charset, encoding in text_parts[uid]:
+            key = f'BODY[{section}]<0>' if max_bytes else f'BODY[{section}]'
+            body = bodies.get(uid, {}).get(key) or b''
+            if max_bytes and len(body) >= max_bytes:
+                # Truncated by the partial fetch; drop the cut-off last line
+                body = body[:body.rfind(b'\n') + 1]
+            parts.append((charset, encoding, body))
+        messages.append((uid, build_message(headers[uid], parts or [(None, '7bit', b'')])))
+    return messages
+
+def mark_seen(mail, uids):
+    if uids:
+        with metrics.span('imap_store'):
+            mail.uid('STORE', uid_message_set(uids), '+FLAGS.SILENT', '(\\Seen)')
+
+def select_mailbox(mail, folder):
+    """Select ``folder`` and return its UIDVALIDITY."""
+    status, data = mail.select(folder)
+    if status != 'OK':
+        raise RuntimeError(f"Cannot select mailbox {folder}: {data}")
+    _, values = mail.response('UIDVALIDITY')
+    if not values or values[0] is None:
+        _, values = mail.status(folder, '(UIDVALIDITY)')
+        values = re.findall(rb'UIDVALIDITY (\d+)', values[0])
+    return int(values[0])
+
+def search_unseen(mail, after_uid=0):
+    """Return UIDs of unseen messages with a UID greater than ``after_uid``."""
+    status, data = mail.uid('SEARCH', None, f'UID {after_uid + 1}:*', 'UNSEEN')
+    if status != 'OK':
+        raise RuntimeError(f"UID SEARCH failed: {data}")
+    # "n:*" always matches the highest UID, even when it is below n
+    return sorted(uid for uid in (int(value) for value in data[0].split()) if uid > after_uid)
+
+def load_checkpoint(path, uidvalidity):
+    """Return the last processed UID, or 0 if none or the mailbox was rebuilt."""
+    try:
+        with open(path) as file:
+            checkpoint = json.load(file)
+    except (OSError, ValueError):
+        return 0
+    if checkpoint.get('uidvalidity') != uidvalidity:
+        return 0
+    return int(checkpoint.get('last_uid', 0))
+
+def save_checkpoint(path, uidvalidity, last_uid):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump({'uidvalidity': uidvalidity, 'last_uid': last_uid}, file)
+    os.replace(temp_path, path)
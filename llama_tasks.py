@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# llama_tasks.py
+#
+# Single entry point for the jobs: llama_tasks.py remind|ingest|report|check-db.
+# Only argparse is imported up front and each subcommand imports just the
+# modules it runs; those defer openpyxl, pandas, dateutil, smtplib and
+# imaplib until they are actually used, so a subcommand that fails early
+# or has nothing to do starts quickly. The .env file is read once, by
+# settings.load_env().
+
+import argparse
+import importlib
+import sys
+
+# Modules each subcommand needs before it starts working
+COMMAND_MODULES = {
+    'remind': ['send_reminders'],
+    'ingest': ['process_replies'],
+    'report': ['generate_reports'],
+    'check-db': ['db_connection', 'schema'],
+}
+
+def remind(args):
+    from send_reminders import run_reminders
+
+    if run_reminders(enqueue_only=args.enqueue_only, worker_only=args.worker) is None:
+        return 1
+
+def ingest(args):
+    if not args.listen:
+        from process_replies import process_emails
+
+        return 0 if process_emails() else 1
+
+    import signal
+    import threading
+
+    from reply_listener import listen
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    listen(stop=stop)
+
+def report(args):
+    import settings
+    from generate_reports import run_report
+
+    settings.configure_logging()
+    if run_report(args.force, args.format, args.backend) == 'failed':
+        return 1
+
+def check_db(args):
+    from db_connection import get_db_connection
+    from schema import MIGRATIONS, applied_version
+
+    connection = get_db_connection()
+    if connection is None:
+        return 1
+    try:
+        version = applied_version(connection)
+    finally:
+        connection.close()
+    latest = MIGRATIONS[-1][0]
+    print(f"Database connection successful; schema is at version {version} of {latest}.")
+    if version < latest:
+        print("Run 'schema.py migrate' to apply the pending migrations.")
+
+HANDLERS = {'remind': remind, 'ingest': ingest, 'report': report, 'check-db': check_db}
+
+def load_command(name):
+    """Import the modules ``name`` runs and return its handler."""
+    for module in COMMAND_MODULES[name]:
+        importlib.import_module(module)
+    return HANDLERS[name]
+
+def build_parser():
+    arg_parser = argparse.ArgumentParser(prog='llama_tasks', description="Task reminder, reply and report jobs.")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    remind_parser = commands.add_parser('remind', help="queue and send task reminder emails")
+    mode = remind_parser.add_mutually_exclusive_group()
+    mode.add_argument('--enqueue-only', action='store_true',
+                      help="queue today's reminders without sending them")
+    mode.add_argument('--worker', action='store_true',
+                      help="only send already-queued reminders (run several to share the work)")
+
+    ingest_parser = commands.add_parser('ingest', help="record task completions from email replies")
+    ingest_parser.add_argument('--listen', action='store_true',
+                               help="keep running and process replies as they arrive (IMAP IDLE)")
+
+    report_parser = commands.add_parser('report', help="generate and email the task completion report")
+    report_parser.add_argument('--force', action='store_true',
+                               help="regenerate and send even if nothing changed since the last report")
+    report_parser.add_argument('--format', choices=('xlsx', 'csv', 'parquet'), default='xlsx',
+                               help="report file format (csv and parquet use the pandas backend)")
+    report_parser.add_argument('--backend', choices=('stream', 'pandas'),
+                               help="report engine; defaults to stream for xlsx and pandas otherwise")
+
+    commands.add_parser('check-db', help="check the database connection and schema version")
+    return arg_parser
+
+def main(argv=None):
+    arg_parser = build_parser()
+    args = arg_parser.parse_args(argv)
+    if args.command == 'report' and args.backend == 'stream' and args.format != 'xlsx':
+        arg_parser.error("the stream backend only writes xlsx")
+    return load_command(args.command)(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
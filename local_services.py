@@ -0,0 +1,476 @@
+# local_services.py
+#
+# Small in-process stand-ins for the mail servers the scripts talk to, so
+# reply processing and reminder delivery can be exercised and timed without
+# a real mail provider.
+
+import base64
+import email
+import re
+import socketserver
+import threading
+
+_FETCH_ITEM = re.compile(r'BODY(?:\.PEEK)?\[[^\]]*\](?:<\d+\.\d+>)?|[A-Z0-9.]+', re.IGNORECASE)
+
+def _quote(value):
+    if value is None:
+        return 'NIL'
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _payload_bytes(part):
+    payload = part.get_payload()
+    if isinstance(payload, bytes):
+        return payload
+    try:
+        return payload.encode('ascii', 'surrogateescape')
+    except UnicodeEncodeError:
+        return payload.encode('utf-8')
+
+def _mailbox_name(name):
+    name = name.strip('"')
+    return 'INBOX' if name.upper() == 'INBOX' else name
+
+def _split_raw(raw):
+    for separator in (b'\r\n\r\n', b'\n\n'):
+        index = raw.find(separator)
+        if index != -1:
+            return raw[:index + len(separator)], raw[index + len(separator):]
+    return raw, b''
+
+def _bodystructure(part):
+    if part.is_multipart():
+        children = ''.join(_bodystructure(child) for child in part.get_payload())
+        boundary = part.get_boundary()
+        params = f'("BOUNDARY" {_quote(boundary)})' if boundary else 'NIL'
+        return f'({children} {_quote(part.get_content_subtype().upper())} {params} NIL NIL NIL)'
+
+    maintype = part.get_content_maintype().upper()
+    subtype = part.get_content_subtype().upper()
+    params = [(key, value) for key, value in part.get_params(header='content-type')[1:] or []]
+    params = '(' + ' '.join(f'{_quote(key.upper())} {_quote(value)}' for key, value in params) + ')' if params else 'NIL'
+    encoding = (part.get('Content-Transfer-Encoding') or '7bit').upper()
+    body = _payload_bytes(part)
+    fields = f'{_quote(maintype)} {_quote(subtype)} {params} NIL NIL {_quote(encoding)} {len(body)}'
+    if maintype == 'TEXT':
+        lines = body.count(b'\n')
+        fields += f' {lines}'
+
+    disposition = part.get_content_disposition()
+    if disposition:
+        filename = part.get_filename()
+        disposition_params = f'("FILENAME" {_quote(filename)})' if filename else 'NIL'
+        disposition = f'({_quote(disposition.upper())} {disposition_params})'
+    else:
+        disposition = 'NIL'
+    return f'({fields} NIL {disposition} NIL NIL)'
+
+class LocalIMAPServer(socketserver.ThreadingTCPServer):
+    """A minimal IMAP4rev1 server holding messages in memory.
+
+    Supports LOGIN, SELECT/EXAMINE, STATUS, (UID) SEARCH, (UID) FETCH with
+    BODYSTRUCTURE and BODY[section]<partial> items, (UID) STORE, NOOP, IDLE
+    and LOGOUT, which is what the reply-processing code uses. Every command
+    received is appended to ``commands`` so tests can count round trips.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), user=None, password=None, capabilities=('IDLE',)):
+        super().__init__(address, _IMAPHandler)
+        self.user = user
+        self.password = password
+        self.capabilities = capabilities
+        self.uidvalidity = 1
+        self.mailboxes = {'INBOX': []}
+        self.uidnext = {'INBOX': 1}
+        self.commands = []
+        self.lock = threading.Condition()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def add_message(self, raw, folder='INBOX', flags=()):
+        if isinstance(raw, str):
+            raw = raw.encode()
+        folder = _mailbox_name(folder)
+        with self.lock:
+            messages = self.mailboxes.setdefault(folder, [])
+            uid = self.uidnext.get(folder, 1)
+            self.uidnext[folder] = uid + 1
+            messages.append({'uid': uid, 'raw': raw, 'flags': set(flags)})
+            self.lock.notify_all()
+            return uid
+
+    def flags(self, uid, folder='INBOX'):
+        with self.lock:
+            for message in self.mailboxes[folder]:
+                if message['uid'] == uid:
+                    return set(message['flags'])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    def send(self, line):
+        if isinstance(line, str):
+            line = line.encode()
+        self.wfile.write(line + b'\r\n')
+
+    def handle(self):
+        self.folder = None
+        self.exists = 0
+        capabilities = ' '.join(('IMAP4rev1',) + tuple(self.server.capabilities))
+        self.send(f'* OK [CAPABILITY {capabilities}] local IMAP stand-in ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.rstrip(b'\r\n').decode(errors='replace')
+            tag, _, rest = line.partition(' ')
+            command, _, args = rest.partition(' ')
+            command = command.upper()
+            uid = False
+            if command == 'UID':
+                uid = True
+                command, _, args = args.partition(' ')
+                command = command.upper()
+            with self.server.lock:
+                self.server.commands.append(('UID ' if uid else '') + command)
+            handler = getattr(self, f'do_{command}', None)
+            if handler is None:
+                self.send(f'{tag} BAD unknown command {command}')
+                continue
+            try:
+                if handler(tag, args, uid) is False:
+                    return
+            except Exception as e:
+                self.send(f'{tag} BAD {e}')
+
+    def do_CAPABILITY(self, tag, args, uid):
+        self.send('* CAPABILITY ' + ' '.join(('IMAP4rev1',) + tuple(self.server.capabilities)))
+        self.send(f'{tag} OK CAPABILITY completed')
+
+    def do_LOGIN(self, tag, args, uid):
+        user, _, password = args.partition(' ')
+        expected = (self.server.user, self.server.password)
+        if expected != (None, None) and (user.strip('"'), password.strip('"')) != expected:
+            self.send(f'{tag} NO [AUTHENTICATIONFAILED] invalid credentials')
+            return
+        self.send(f'{tag} OK LOGIN completed')
+
+    def do_NOOP(self, tag, args, uid):
+        self.send(f'{tag} OK NOOP completed')
+
+    def do_LOGOUT(self, tag, args, uid):
+        self.send('* BYE logging out')
+        self.send(f'{tag} OK LOGOUT completed')
+        return False
+
+    def do_SELECT(self, tag, args, uid):
+        name = _mailbox_name(args)
+        with self.server.lock:
+            if name not in self.server.mailboxes:
+                self.send(f'{tag} NO mailbox does not exist')
+                return
+            self.folder = name
+            exists = self.exists = len(self.server.mailboxes[name])
+            uidnext = self.server.uidnext.get(name, 1)
+        self.send(f'* {exists} EXISTS')
+        self.send(f'* OK [UIDVALIDITY {self.server.uidvalidity}] UIDs valid')
+        self.send(f'* OK [UIDNEXT {uidnext}] next UID')
+        self.send(f'{tag} OK [READ-WRITE] SELECT completed')
+
+    do_EXAMINE = do_SELECT
+
+    def do_STATUS(self, tag, args, uid):
+        name = _mailbox_name(args.split(' ')[0])
+        with self.server.lock:
+            messages = self.server.mailboxes.get(name, [])
+            unseen = sum(1 for message in messages if '\\Seen' not in message['flags'])
+        self.send(f'* STATUS {name} (MESSAGES {len(messages)} UIDVALIDITY {self.server.uidvalidity} UNSEEN {unseen})')
+        self.send(f'{tag} OK STATUS completed')
+
+    def _messages(self):
+        return self.server.mailboxes[self.folder]
+
+    def _resolve(self, message_set, uid):
+        # Returns [(sequence_number, message)] matching the set
+        messages = self._messages()
+        if not messages:
+            return []
+        keys = [message['uid'] for message in messages] if uid else list(range(1, len(messages) + 1))
+        highest = keys[-1]
+        wanted = set()
+        for item in message_set.split(','):
+            start, _, end = item.partition(':')
+            start = highest if start == '*' else int(start)
+            end = start if not end else (highest if end == '*' else int(end))
+            low, high = min(start, end), max(start, end)
+            wanted.update(key for key in keys if low <= key <= high)
+        return [(number, message) for number, (key, message) in enumerate(zip(keys, messages), start=1) if key in wanted]
+
+    def do_SEARCH(self, tag, args, uid):
+        tokens = args.split()
+        with self.server.lock:
+            matches = list(enumerate(self._messages(), start=1))
+            index = 0
+            while index < len(tokens):
+                token = tokens[index].upper().strip('()')
+                if token == 'UNSEEN':
+                    matches = [(n, m) for n, m in matches if '\\Seen' not in m['flags']]
+                elif token == 'SEEN':
+                    matches = [(n, m) for n, m in matches if '\\Seen' in m['flags']]
+                elif token == 'UID':
+                    index += 1
+                    selected = {id(m) for _, m in self._resolve(tokens[index], True)}
+                    matches = [(n, m) for n, m in matches if id(m) in selected]
+                elif token and token[0].isdigit() or token.startswith('*'):
+                    selected = {id(m) for _, m in self._resolve(token, False)}
+                    matches = [(n, m) for n, m in matches if id(m) in selected]
+                index += 1
+            found = [str(m['uid'] if uid else n) for n, m in matches]
+        self.send('* SEARCH' + ''.join(' ' + value for value in found))
+        self.send(f'{tag} OK SEARCH completed')
+
+    def _section(self, raw, section):
+        header, body = _split_raw(raw)
+        spec = section.upper()
+        if spec == '':
+            return raw
+        if spec == 'HEADER':
+            return header
+        if spec == 'TEXT':
+            return body
+        if spec.startswith('HEADER.FIELDS'):
+            names = {name.strip('"').lower() for name in re.findall(r'[^\s()]+', spec[len('HEADER.FIELDS'):])}
+            msg = email.message_from_bytes(raw)
+            lines = ''.join(f'{key}: {value}\r\n' for key, value in msg.items() if key.lower() in names)
+            return (lines + '\r\n').encode('utf-8', 'surrogateescape')
+
+        part = email.message_from_bytes(raw)
+        for number in spec.split('.'):
+            number = int(number)
+            if part.is_multipart():
+                part = part.get_payload()[number - 1]
+            elif number != 1:
+                return b''
+        return _payload_bytes(part)
+
+    def do_FETCH(self, tag, args, uid):
+        message_set, _, items = args.partition(' ')
+        items = _FETCH_ITEM.findall(items)
+        with self.server.lock:
+            for number, message in self._resolve(message_set, uid):
+                parts = [f'UID {message["uid"]}']
+                literals = []
+                for item in items:
+                    name = item.upper()
+                    if name == 'UID':
+                        continue
+                    if name == 'FLAGS':
+                        parts.append(f'FLAGS ({" ".join(sorted(message["flags"]))})')
+                    elif name == 'BODYSTRUCTURE':
+                        parts.append('BODYSTRUCTURE ' + _bodystructure(email.message_from_bytes(message['raw'])))
+                    elif name in ('RFC822', 'BODY[]', 'BODY.PEEK[]'):
+                        literals.append(('RFC822' if name == 'RFC822' else 'BODY[]', message['raw']))
+                        if '.PEEK' not in name:
+                            message['flags'].add('\\Seen')
+                    elif name.startswith('BODY'):
+                        match = re.match(r'BODY(\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?', item, re.IGNORECASE)
+                        data = self._section(message['raw'], match.group(2))
+                        key = f'BODY[{match.group(2)}]'
+                        if match.group(3) is not None:
+                            origin, count = int(match.group(3)), int(match.group(4))
+                            data = data[origin:origin + count]
+                            key += f'<{origin}>'
+                        literals.append((key, data))
+                        if not match.group(1):
+                            message['flags'].add('\\Seen')
+                response = f'* {number} FETCH (' + ' '.join(parts)
+                for key, data in literals:
+                    self.wfile.write(f'{response} {key} {{{len(data)}}}\r\n'.encode() + data)
+                    response = ''
+                self.send(response + ')')
+        self.send(f'{tag} OK FETCH completed')
+
+    def do_STORE(self, tag, args, uid):
+        message_set, action, flags = args.split(' ', 2)
+        flags = set(re.findall(r'\\?\w+', flags))
+        action = action.upper()
+        with self.server.lock:
+            for number, message in self._resolve(message_set, uid):
+                if action.startswith('+'):
+                    message['flags'] |= flags
+                elif action.startswith('-'):
+                    message['flags'] -= flags
+                else:
+                    message['flags'] = set(flags)
+                if not action.endswith('.SILENT'):
+                    self.send(f'* {number} FETCH (UID {message["uid"]} FLAGS ({" ".join(sorted(message["flags"]))}))')
+        self.send(f'{tag} OK STORE completed')
+
+    def do_IDLE(self, tag, args, uid):
+        if 'IDLE' not in self.server.capabilities:
+            self.send(f'{tag} BAD IDLE not supported')
+            return
+        stop = threading.Event()
+
+        def announce():
+            # Like real servers, report anything that arrived since the
+            # session last saw the mailbox in the same write as the
+            # continuation, then each new arrival
+            with self.server.lock:
+                count = len(self._messages())
+                if count != self.exists:
+                    self.exists = count
+                    self.send(f'+ idling\r\n* {count} EXISTS')
+                else:
+                    self.send('+ idling')
+                while not stop.is_set():
+                    count = len(self._messages())
+                    if count != self.exists:
+                        self.exists = count
+                        self.send(f'* {count} EXISTS')
+                    self.server.lock.wait(0.05)
+
+        announcer = threading.Thread(target=announce, daemon=True)
+        announcer.start()
+        line = self.rfile.readline()
+        stop.set()
+        announcer.join()
+        if not line:
+            return False
+        self.send(f'{tag} OK IDLE terminated')
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """A minimal SMTP server that keeps delivered messages in ``messages``.
+
+    Speaks EHLO, AUTH PLAIN, MAIL, RCPT, DATA, RSET, NOOP and QUIT (no
+    STARTTLS). For failure testing, ``fail_codes`` is a list of reply codes
+    to return to the next MAIL commands, ``reject`` holds recipients that
+    get a 550, and ``drop_after`` closes each connection abruptly after
+    that many messages.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), user=None, password=None):
+        super().__init__(address, _SMTPHandler)
+        self.user = user
+        self.password = password
+        self.messages = []
+        self.fail_codes = []
+        self.reject = set()
+        self.drop_after = None
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def send(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        delivered = 0
+        sender, recipients = None, []
+        self.send('220 local SMTP stand-in ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb, _, argument = command.partition(' ')
+            verb = verb.upper()
+
+            if verb == 'EHLO':
+                self.send('250-localhost')
+                self.send('250-AUTH PLAIN')
+                self.send('250 8BITMIME')
+            elif verb == 'HELO':
+                self.send('250 localhost')
+            elif verb == 'AUTH':
+                mechanism, _, response = argument.partition(' ')
+                credentials = base64.b64decode(response).split(b'\0') if mechanism.upper() == 'PLAIN' else []
+                if server.user is None or credentials[1:] == [server.user.encode(), server.password.encode()]:
+                    self.send('235 authentication successful')
+                else:
+                    self.send('535 authentication failed')
+            elif verb == 'MAIL':
+                if server.drop_after is not None and delivered >= server.drop_after:
+                    return
+                with server.lock:
+                    code = server.fail_codes.pop(0) if server.fail_codes else None
+                if code:
+                    self.send(f'{code} injected failure')
+                    if code == 421:
+                        return
+                    continue
+                sender, recipients = argument.partition(':')[2].strip('<> '), []
+                self.send('250 OK')
+            elif verb == 'RCPT':
+                recipient = argument.partition(':')[2].strip('<> ')
+                if recipient in server.reject:
+                    self.send('550 no such user')
+                else:
+                    recipients.append(recipient)
+                    self.send('250 OK')
+            elif verb == 'DATA':
+                self.send('354 end data with <CR><LF>.<CR><LF>')
+                data = bytearray()
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line == b'.\r\n':
+                        break
+                    data += line[1:] if line.startswith(b'..') else line
+                with server.lock:
+                    server.messages.append({'from': sender, 'to': recipients, 'data': bytes(data)})
+                delivered += 1
+                self.send('250 OK queued')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.send('250 OK')
+            elif verb == 'NOOP':
+                self.send('250 OK')
+            elif verb == 'QUIT':
+                self.send('221 bye')
+                return
+            else:
+                self.send('502 command not implemented')
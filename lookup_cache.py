@@ -0,0 +1,126 @@
+# lookup_cache.py
+#
+# In-process cache of the people and tasks lookups. Both tables are small
+# and rarely change, so each is loaded whole with one query and resolved
+# from memory. The maps are reloaded when they reach their TTL or when a
+# cheap row-count/max-id probe, run at most every few seconds, shows that
+# either table changed.
+
+import os
+import threading
+import time
+
+from task_matcher import TaskMatcher
+
+LOAD_PEOPLE_QUERY = "SELECT person_id, email FROM people ORDER BY person_id"
+LOAD_TASKS_QUERY = "SELECT task_id, task_name, recurrence_period FROM tasks ORDER BY task_id"
+PROBE_QUERY = """
+    SELECT
+        (SELECT count(*) FROM people) AS people,
+        (SELECT max(person_id) FROM people) AS max_person_id,
+        (SELECT count(*) FROM tasks) AS tasks,
+        (SELECT max(task_id) FROM tasks) AS max_task_id
+"""
+
+def normalize(value):
+    return value.strip().lower()
+
+class LookupCache:
+    """Resolve sender emails to person_ids and task names to task rows.
+
+    Keys are normalized (stripped, lower-cased). ``stats`` counts hits,
+    misses, loads and probes.
+    """
+
+    def __init__(self, ttl=600, probe_interval=30, clock=time.monotonic):
+        self.ttl = ttl
+        self.probe_interval = probe_interval
+        self.clock = clock
+        self.people = {}
+        self.tasks = {}
+        self.matcher = None
+        self.version = None
+        self.loaded_at = None
+        self.probed_at = None
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'loads': 0, 'probes': 0}
+
+    def _probe(self, connection):
+        cursor = connection.cursor()
+        cursor.execute(PROBE_QUERY)
+        self.stats['probes'] += 1
+        return tuple(cursor.fetchone().values())
+
+    def load(self, connection):
+        cursor = connection.cursor()
+        version = self._probe(connection)
+        cursor.execute(LOAD_PEOPLE_QUERY)
+        people = {}
+        for row in cursor.fetchall():
+            # Duplicate addresses resolve to the lowest person_id
+            people.setdefault(normalize(row['email']), row['person_id'])
+        cursor.execute(LOAD_TASKS_QUERY)
+        tasks = {}
+        for row in cursor.fetchall():
+            tasks.setdefault(normalize(row['task_name']), dict(row))
+        self.people, self.tasks, self.version = people, tasks, version
+        self.matcher = None
+        self.loaded_at = self.probed_at = self.clock()
+        self.stats['loads'] += 1
+
+    def ensure_fresh(self, connection):
+        now = self.clock()
+        if self.loaded_at is None or now - self.loaded_at >= self.ttl:
+            self.load(connection)
+        elif now - self.probed_at >= self.probe_interval:
+            self.probed_at = now
+            if self._probe(connection) != self.version:
+                self.load(connection)
+
+    def _get(self, mapping, key):
+        value = mapping.get(normalize(key))
+        self.stats['hits' if value is not None else 'misses'] += 1
+        return value
+
+    def resolve(self, connection, emails, task_names):
+        """Return ``({email: person_id}, {task_name: task row})`` for the known ones.
+
+        The returned maps are keyed by the values as given.
+        """
+        with self.lock:
+            self.ensure_fresh(connection)
+            person_ids = {}
+            for address in emails:
+                person_id = self._get(self.people, address)
+                if person_id is not None:
+                    person_ids[address] = person_id
+            tasks = {}
+            for name in task_names:
+                task = self._get(self.tasks, name)
+                if task is not None:
+                    tasks[name] = task
+            return person_ids, tasks
+
+    def match_tasks(self, task_names, threshold=0.6):
+        """Fuzzy-match names with no exact task; returns ``{name: (task, score)}``.
+
+        Uses the maps loaded by the last ``resolve``.
+        """
+        with self.lock:
+            if self.matcher is None:
+                self.matcher = TaskMatcher(self.tasks.values())
+            return self.matcher.match_many(task_names, threshold)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_lookup_cache():
+    """Return the process-wide cache, or None when LOOKUP_CACHE_TTL is 0."""
+    global _cache
+    ttl = float(os.getenv('LOOKUP_CACHE_TTL', '600'))
+    if ttl <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LookupCache(ttl, float(os.getenv('LOOKUP_CACHE_PROBE_INTERVAL', '30')))
+        return _cache
@@ -0,0 +1,110 @@
+# mailbox_shards.py
+#
+# Reply ingestion across several mailboxes. IMAP_MAILBOXES_FILE names a JSON
+# list of mailboxes (or folders of one mailbox); each entry overrides the
+# IMAP settings from .env. A coordinator hands the mailboxes to a pool of
+# worker processes, each with its own IMAP session, database pool and
+# checkpoint file, so a slow or failing mailbox only holds up itself.
+
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import metrics
+
+SHARD_KEYS = {'name', 'server', 'port', 'address', 'password', 'password_env', 'folder', 'ssl',
+              'batch_size', 'checkpoint_file', 'fetchers', 'parsers', 'writers', 'body_max_bytes'}
+
+def load_mailboxes(path, base):
+    """Return one IMAP config per entry of the mailbox file at ``path``.
+
+    Entries inherit every setting from ``base``. ``password_env`` names an
+    environment variable holding the password, and each mailbox gets its
+    own checkpoint file next to the base one unless it sets one.
+    """
+    with open(path) as file:
+        entries = json.load(file)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected a non-empty list of mailboxes")
+
+    shards = []
+    names = set()
+    root, ext = os.path.splitext(base['checkpoint_file'])
+    for entry in entries:
+        unknown = set(entry) - SHARD_KEYS
+        if unknown:
+            raise ValueError(f"{path}: unknown mailbox settings {', '.join(sorted(unknown))}")
+        config = dict(base, mailboxes=None)
+        config.update(entry)
+        if 'password_env' in entry:
+            config['password'] = os.getenv(config.pop('password_env'))
+        config.setdefault('name', f"{config['address']}/{config['folder']}")
+        if config['name'] in names:
+            raise ValueError(f"{path}: mailbox {config['name']!r} is listed twice")
+        names.add(config['name'])
+        if 'checkpoint_file' not in entry:
+            slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', config['name'])
+            config['checkpoint_file'] = f"{root}.{slug}{ext}"
+        shards.append(config)
+    return shards
+
+def ingest_shard(config):
+    """Worker: process one mailbox and report how it went.
+
+    Runs in a pool process, so errors are returned rather than raised and
+    the run metrics are handed back for the coordinator to merge.
+    """
+    from process_replies import connect_imap, process_mailbox
+
+    before = metrics.snapshot()
+    started = time.perf_counter()
+    result = {'name': config['name'], 'messages': 0, 'error': None}
+    try:
+        mail = connect_imap(config)
+        try:
+            result['messages'] = process_mailbox(mail, config)
+        finally:
+            mail.logout()
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    result['spans'], result['counters'] = metrics._since(before, metrics.snapshot())
+    return result
+
+def ingest_mailboxes(shards, workers=None, worker=ingest_shard):
+    """Process every mailbox in ``shards`` on a pool of worker processes.
+
+    Mailboxes are picked up as workers free up, so one large backlog does
+    not hold back the others. Errors are reported per mailbox; a worker
+    process that dies outright breaks the pool, failing the mailboxes not
+    yet finished, which resume from their checkpoints on the next run.
+    Returns the per-mailbox results in completion order.
+    """
+    workers = workers or min(len(shards), os.cpu_count() or 1)
+    results = []
+    # Fresh interpreters: forked workers would share the parent's pooled connections
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(worker, shard): shard['name'] for shard in shards}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died
+                result = {'name': futures[future], 'messages': 0, 'seconds': None,
+                          'error': f"{type(e).__name__}: {e}", 'spans': {}, 'counters': {}}
+            metrics.merge(result.pop('spans'), result.pop('counters'))
+            if result['error']:
+                metrics.count('mailboxes_failed')
+                print(f"[{result['name']}] failed: {result['error']}")
+            else:
+                print(f"[{result['name']}] {result['messages']} messages in {result['seconds']:.1f}s")
+            results.append(result)
+
+    failed = sum(1 for result in results if result['error'])
+    print(f"Processed {sum(result['messages'] for result in results)} messages from "
+          f"{len(results) - failed} of {len(results)} mailboxes.")
+    return results
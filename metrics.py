@@ -0,0 +1,150 @@
+# metrics.py
+#
+# Lightweight run instrumentation. Code wraps its stages in span() and bumps
+# counters with count(); each job run (remind, ingest, report) is wrapped
+# with @job and emits what it added, either as a JSON line or as a
+# Prometheus textfile, to METRICS_FILE. Totals are process-wide, so jobs
+# that overlap in the scheduler daemon see each other's activity.
+
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+
+def count(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def record(name, seconds):
+    with _lock:
+        total = _spans.setdefault(name, [0, 0.0])
+        total[0] += 1
+        total[1] += seconds
+
+@contextmanager
+def span(name):
+    """Time the enclosed block under ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+def merge(spans, counters):
+    """Add totals measured elsewhere, such as in a worker process."""
+    with _lock:
+        for name, total in spans.items():
+            merged = _spans.setdefault(name, [0, 0.0])
+            merged[0] += total['count']
+            merged[1] += total['seconds']
+        for name, value in counters.items():
+            _counters[name] = _counters.get(name, 0) + value
+
+def snapshot():
+    with _lock:
+        return {
+            'spans': {name: {'count': total[0], 'seconds': total[1]} for name, total in _spans.items()},
+            'counters': dict(_counters),
+        }
+
+def _since(before, after):
+    spans = {}
+    for name, total in after['spans'].items():
+        previous = before['spans'].get(name, {'count': 0, 'seconds': 0.0})
+        if total['count'] > previous['count']:
+            spans[name] = {'count': total['count'] - previous['count'],
+                           'seconds': round(total['seconds'] - previous['seconds'], 6)}
+    counters = {name: value - before['counters'].get(name, 0)
+                for name, value in after['counters'].items()
+                if value != before['counters'].get(name, 0)}
+    return spans, counters
+
+def prometheus_text(summary):
+    labels = f'job="{summary["job"]}"'
+    lines = [
+        '# TYPE llama_tasks_run_duration_seconds gauge',
+        f'llama_tasks_run_duration_seconds{{{labels}}} {summary["duration"]}',
+        '# TYPE llama_tasks_run_success gauge',
+        f'llama_tasks_run_success{{{labels}}} {int(summary["status"] == "ok")}',
+        '# TYPE llama_tasks_last_run_timestamp_seconds gauge',
+        f'llama_tasks_last_run_timestamp_seconds{{{labels}}} {summary["finished_at_epoch"]}',
+        '# TYPE llama_tasks_span_seconds gauge',
+    ]
+    for name, total in sorted(summary['spans'].items()):
+        lines.append(f'llama_tasks_span_seconds{{{labels},span="{name}"}} {total["seconds"]}')
+    lines.append('# TYPE llama_tasks_span_count gauge')
+    for name, total in sorted(summary['spans'].items()):
+        lines.append(f'llama_tasks_span_count{{{labels},span="{name}"}} {total["count"]}')
+    lines.append('# TYPE llama_tasks_events gauge')
+    for name, value in sorted(summary['counters'].items()):
+        lines.append(f'llama_tasks_events{{{labels},name="{name}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+def write_summary(summary, path=None, output_format=None):
+    """Append a JSON line, or replace the job's Prometheus textfile.
+
+    Without METRICS_FILE the JSON line is printed instead.
+    """
+    path = path or os.getenv('METRICS_FILE')
+    output_format = output_format or os.getenv('METRICS_FORMAT', 'jsonl')
+    if not path:
+        print(f"Run metrics: {json.dumps(summary)}")
+        return
+    if output_format == 'prometheus':
+        # The textfile collector reads whole files, so each job gets its own
+        if '{job}' in path:
+            path = path.format(job=summary['job'])
+        else:
+            root, ext = os.path.splitext(path)
+            path = f"{root}_{summary['job']}{ext or '.prom'}"
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as file:
+            file.write(prometheus_text(summary))
+        os.replace(temp_path, path)
+    else:
+        with open(path, 'a') as file:
+            file.write(json.dumps(summary) + '\n')
+
+@contextmanager
+def job_run(name):
+    before = snapshot()
+    started_at = datetime.datetime.now().astimezone()
+    started = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        spans, counters = _since(before, snapshot())
+        summary = {
+            'job': name,
+            'status': status,
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'finished_at_epoch': round(time.time(), 3),
+            'duration': round(time.perf_counter() - started, 6),
+            'spans': spans,
+            'counters': counters,
+        }
+        try:
+            write_summary(summary)
+        except OSError as e:
+            print(f"Failed to write run metrics: {e}")
+
+def job(name):
+    """Decorator: run the function as one instrumented job run."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with job_run(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
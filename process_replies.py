@@ -2,216 +2,366 @@
 
 # process_replies.py
 
-import imaplib
 import email
 from email.header import decode_header
 import os
 import re
 import datetime
-from dateutil import parser as date_parser  # Requires the python-dateutil package
-from db_connection import get_db_connection
-from dotenv import load_dotenv
+import metrics
+import settings
+from completion_history import append_history, ensure_partitions, history_installed
+from db_connection import pooled_connection
+from imap_fetch import fetch_messages, load_checkpoint, mark_seen, save_checkpoint, search_unseen, select_mailbox
+from lookup_cache import get_lookup_cache, normalize
+from mailbox_shards import ingest_mailboxes, load_mailboxes
+from reply_body import DEFAULT_MAX_BYTES, reply_text
+from reply_parser import parse_reply
+from reply_pipeline import run_pipeline
+from psycopg2.extras import execute_values
 
-# Load environment variables
-load_dotenv(/home/llama/llama_tasks/.env)
+settings.load_env()
 
-def process_emails():
-    imap_server = os.getenv('IMAP_SERVER')
-    imap_port = int(os.getenv('IMAP_PORT'))
-    email_address = os.getenv('EMAIL_ADDRESS')
-    email_password = os.getenv('EMAIL_PASSWORD')
+DEFAULT_CHECKPOINT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.imap_checkpoint.json')
 
-    if not all([imap_server, imap_port, email_address, email_password]):
+def load_imap_config():
+    config = {
+        'server': os.getenv('IMAP_SERVER'),
+        'port': os.getenv('IMAP_PORT'),
+        'address': os.getenv('EMAIL_ADDRESS'),
+        'password': os.getenv('EMAIL_PASSWORD'),
+        'folder': os.getenv('IMAP_FOLDER', 'inbox'),
+        'ssl': os.getenv('IMAP_SSL', 'true').lower() != 'false',
+        'batch_size': int(os.getenv('IMAP_FETCH_BATCH', '100')),
+        'checkpoint_file': os.getenv('IMAP_CHECKPOINT_FILE', DEFAULT_CHECKPOINT_FILE),
+        # Pipeline stage sizes; all 1 keeps the serial batch loop
+        'fetchers': int(os.getenv('REPLY_FETCHERS', '2')),
+        'parsers': int(os.getenv('REPLY_PARSERS', '1')),
+        'writers': int(os.getenv('REPLY_WRITERS', '2')),
+        'queue_size': int(os.getenv('REPLY_QUEUE_SIZE', '4')),
+        # Bytes of each text part downloaded and decoded; quoted history is skipped anyway
+        'body_max_bytes': int(os.getenv('REPLY_BODY_MAX_BYTES', str(DEFAULT_MAX_BYTES))),
+        # Worker processes for IMAP_MAILBOXES_FILE; defaults to one per mailbox, up to the core count
+        'ingest_workers': int(os.getenv('INGEST_WORKERS', '0')) or None,
+    }
+    mailboxes_file = os.getenv('IMAP_MAILBOXES_FILE')
+    config['mailboxes'] = load_mailboxes(mailboxes_file, config) if mailboxes_file else None
+    return config
+
+def config_complete(config):
+    return all([config['server'], config['port'], config['address'], config['password']])
+
+def connect_imap(config):
+    import imaplib
+
+    imap_class = imaplib.IMAP4_SSL if config['ssl'] else imaplib.IMAP4
+    with metrics.span('imap_connect'):
+        mail = imap_class(config['server'], int(config['port']))
+        mail.login(config['address'], config['password'])
+    return mail
+
+def open_mailbox(config, uidvalidity):
+    # Extra sessions for pipeline fetchers must see the same UID space
+    mail = connect_imap(config)
+    try:
+        if select_mailbox(mail, config['folder']) != uidvalidity:
+            raise RuntimeError("UIDVALIDITY changed while processing")
+    except Exception:
+        mail.logout()
+        raise
+    return mail
+
+@metrics.job('ingest')
+def process_emails(config=None, mail=None):
+    """Process new replies once; an open ``mail`` session is reused and left open.
+
+    Returns False if the configuration is incomplete or processing failed.
+    """
+    config = config or load_imap_config()
+
+    if mail is None and config.get('mailboxes'):
+        shards = [shard for shard in config['mailboxes'] if config_complete(shard)]
+        for shard in config['mailboxes']:
+            if shard not in shards:
+                print(f"IMAP configuration for mailbox {shard['name']} is incomplete.")
+        if shards:
+            results = ingest_mailboxes(shards, config.get('ingest_workers'))
+            return len(shards) == len(config['mailboxes']) and not any(result['error'] for result in results)
+        return False
+
+    if not config_complete(config):
         print("IMAP configuration is incomplete in the .env file.")
-        return
+        return False
+
+    own_session = mail is None
+    if own_session:
+        try:
+            mail = connect_imap(config)
+        except Exception as e:
+            print(f"Failed to connect to the IMAP server: {e}")
+            return False
 
     try:
-        mail = imaplib.IMAP4_SSL(imap_server, imap_port)
-        mail.login(email_address, email_password)
+        if not process_mailbox(mail, config):
+            print("No new emails to process.")
+        cache = get_lookup_cache()
+        if cache is not None and cache.stats['loads']:
+            print("Lookup cache: {hits} hits, {misses} misses, {loads} loads, {probes} probes".format(**cache.stats))
+        return True
     except Exception as e:
-        print(f"Failed to connect to the IMAP server: {e}")
-        return
+        print(f"An error occurred while processing emails: {e}")
+        if not own_session:
+            raise
+        return False
+    finally:
+        if own_session:
+            mail.logout()
 
-    try:
-        mail.select("inbox")
+def process_mailbox(mail, config):
+    """Process unseen replies in batches, resuming after the last checkpoint.
 
-        # Search for unread emails
-        status, messages = mail.search(None, '(UNSEEN)')
-        email_ids = messages[0].split()
+    Each batch is fetched with a couple of UID FETCH commands, its
+    completions are committed, and only then is the batch flagged seen and
+    the checkpoint advanced, so a crash replays at most one batch. Raises
+    if any batch failed, whether or not the pipeline was used.
+    """
+    uidvalidity = select_mailbox(mail, config['folder'])
+    last_uid = load_checkpoint(config['checkpoint_file'], uidvalidity)
 
-        if not email_ids:
-            print("No new emails to process.")
-            return
+    # Search for unread emails newer than the checkpoint
+    uids = search_unseen(mail, last_uid)
+    if not uids:
+        return 0
 
-        for email_id in email_ids:
-            status, msg_data = mail.fetch(email_id, '(RFC822)')
-            for response_part in msg_data:
-                if isinstance(response_part, tuple):
-                    # Parse the email content
-                    msg = email.message_from_bytes(response_part[1])
+    batch_size = config['batch_size']
+    max_bytes = config.get('body_max_bytes', DEFAULT_MAX_BYTES)
+    batches = [uids[start:start + batch_size] for start in range(0, len(uids), batch_size)]
 
-                    # Decode email subject
-                    subject, encoding = decode_header(msg["Subject"])[0]
-                    if isinstance(subject, bytes):
-                        subject = subject.decode(encoding if encoding else 'utf-8')
+    # A single batch gains nothing from extra sessions and threads
+    stages = {key: config.get(key, 1) for key in ('fetchers', 'parsers', 'writers')}
+    if len(batches) > 1 and max(stages.values()) > 1:
+        def acknowledge(batch, checkpoint_uid):
+            mark_seen(mail, batch)
+            if checkpoint_uid is not None:
+                save_checkpoint(config['checkpoint_file'], uidvalidity, checkpoint_uid)
 
-                    # Remove common reply prefixes
-                    subject = re.sub(r'^(Re:|Fwd:)\s*', '', subject, flags=re.IGNORECASE).strip()
+        summary = run_pipeline(
+            batches,
+            lambda: open_mailbox(config, uidvalidity),
+            parse_messages,
+            write_completions,
+            acknowledge,
+            queue_size=config.get('queue_size', 4),
+            max_bytes=max_bytes,
+            **stages
+        )
+        if summary['failed']:
+            # The committed batches are already acknowledged; the rest are retried next run
+            raise RuntimeError(f"{len(summary['failed'])} of {len(batches)} batches failed and were left unread; "
+                               f"first error: {summary['failed'][0][1]}")
+        return len(uids)
 
-                    # Get sender's email
-                    from_header = msg.get("From")
-                    sender_email = email.utils.parseaddr(from_header)[1]
+    for batch in batches:
+        process_messages(fetch_messages(mail, batch, max_bytes))
+        mark_seen(mail, batch)
+        save_checkpoint(config['checkpoint_file'], uidvalidity, batch[-1])
+    return len(uids)
 
-                    # Get the email body
-                    body = get_email_body(msg)
+def message_sender_and_subject(msg):
+    # Decode email subject
+    subject, encoding = decode_header(msg["Subject"] or '')[0]
+    if isinstance(subject, bytes):
+        subject = subject.decode(encoding if encoding else 'utf-8')
 
-                    # Process the email content
-                    process_email_content(sender_email, subject, body)
+    # Remove common reply prefixes
+    subject = re.sub(r'^(Re:|Fwd:)\s*', '', subject, flags=re.IGNORECASE).strip()
 
-            # Mark email as seen
-            mail.store(email_id, '+FLAGS', '\\Seen')
+    # Get sender's email
+    from_header = msg.get("From")
+    sender_email = email.utils.parseaddr(from_header)[1]
+    return sender_email, subject
 
-    except Exception as e:
-        print(f"An error occurred while processing emails: {e}")
-    finally:
-        mail.logout()
+def parse_messages(messages, max_bytes=None):
+    # Fetched parts are already capped by the partial FETCH
+    completions = []
+    with metrics.span('parse'):
+        for uid, msg in messages:
+            sender_email, subject = message_sender_and_subject(msg)
+            body = reply_text(msg, max_bytes)
+            completions.extend(process_email_content(sender_email, subject, body))
+    metrics.count('completion_lines', len(completions))
+    return completions
 
-def get_email_body(msg):
-    body = ""
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_type = part.get_content_type()
-            content_disposition = str(part.get("Content-Disposition"))
-            if content_type == "text/plain" and "attachment" not in content_disposition:
-                charset = part.get_content_charset()
-                payload = part.get_payload(decode=True)
-                if payload:
-                    if charset:
-                        body += payload.decode(charset, errors='replace')
-                    else:
-                        body += payload.decode(errors='replace')
-    else:
-        charset = msg.get_content_charset()
-        payload = msg.get_payload(decode=True)
-        if payload:
-            if charset:
-                body = payload.decode(charset, errors='replace')
-            else:
-                body = payload.decode(errors='replace')
-    return body
+def write_completions(completions):
+    with metrics.span('db_write'):
+        results = update_task_completions(completions)
+    print_completion_report(results)
+
+def process_messages(messages):
+    # Collect completions from every message, then apply them in one transaction
+    completions = parse_messages(messages)
+    if completions:
+        write_completions(completions)
 
 def process_email_content(sender_email, subject, body):
     # Assuming the subject line is 'Task Reminder - Tasks Due'
     if subject.lower() != 'task reminder - tasks due':
         print(f"Email from {sender_email} has an unexpected subject: {subject}")
-        return
-
-    # Extract completion lines from the email body
-    # Only consider the first part to avoid quoted content
-    lines = body.strip().split('\n')
-    new_content_lines = []
-    for line in lines:
-        line = line.strip()
-        # Stop processing if we hit a quoted line
-        if line.startswith('>') or line.lower().startswith('on ') or line.lower().startswith('from:'):
-            break
-        new_content_lines.append(line)
-
-    # Process each completion line
-    for line in new_content_lines:
-        # Adjusted regex to handle extra whitespace and case-insensitive matching
-        match = re.match(r'Completed:\s*(.+?)\s+on\s+(.+)', line, re.IGNORECASE)
-        if match:
-            task_name = match.group(1).strip()
-            completion_date_str = match.group(2).strip()
-
-            # Try parsing the date with multiple formats
-            completion_date = parse_date(completion_date_str)
-            if completion_date:
-                update_task_completion(sender_email, task_name, completion_date)
-            else:
-                print(f"Invalid date format in line: {line}")
+        return []
+
+    completions = []
+    for result in parse_reply(body):
+        if result['status'] == 'matched':
+            completions.append((sender_email, result['task_name'], result['completion_date']))
+        elif result['status'] == 'bad_date':
+            print(f"Invalid date format in line: {result['line']}")
         else:
-            print(f"Unrecognized line format: {line}")
-
-def parse_date(date_str):
-    # List of date formats to try
-    date_formats = [
-        '%Y-%m-%d',      # 2023-10-24
-        '%m/%d/%Y',      # 10/24/2023
-        '%d-%m-%Y',      # 24-10-2023
-        '%B %d, %Y',     # October 24, 2023
-        '%b %d, %Y',     # Oct 24, 2023
-        '%d %B %Y',      # 24 October 2023
-        '%d %b %Y',      # 24 Oct 2023
+            print(f"Unrecognized line format: {result['line']}")
+    return completions
+
+# Matches the lookup cache: case-insensitive, lowest person_id for a shared
+# address, and served by the people (lower(email)) index
+PEOPLE_LOOKUP_QUERY = """
+    SELECT person_id, lower(email) AS email
+    FROM people
+    WHERE lower(email) = ANY(%s)
+    ORDER BY person_id
+"""
+
+# lower() = lower() rather than ILIKE so the tasks (lower(task_name)) index applies
+TASK_LOOKUP_QUERY = """
+    SELECT v.task_name AS lookup_name, t.task_id, t.recurrence_period
+    FROM unnest(%s::text[]) AS v(task_name)
+    JOIN LATERAL (
+        SELECT task_id, recurrence_period
+        FROM tasks
+        WHERE lower(task_name) = lower(v.task_name)
+        LIMIT 1
+    ) t ON true
+"""
+
+def recurrence_days(recurrence_period):
+    # Ensure recurrence_period is an integer number of days
+    if isinstance(recurrence_period, datetime.timedelta):
+        return recurrence_period.days
+    # If recurrence_period is stored as an interval or integer
+    return int(recurrence_period)
+
+def update_task_completions(completions, connection=None, cache=None):
+    """Apply a batch of (sender_email, task_name, completion_date) tuples.
+
+    Senders and task names are resolved from the shared lookup cache (or,
+    with the cache disabled, with one query each). Every resolved line is
+    appended to completion_history and the latest per person and task is
+    upserted into task_completion, all in one transaction. A reply that
+    arrives late never moves a recorded completion date backwards.
+
+    Returns one result dict per input tuple, in input order, with a status
+    of 'updated', 'superseded' (a later line in the same batch set the
+    same person and task), 'no_person' or 'no_task'. Database errors
+    propagate so callers can leave the messages unseen.
+    """
+    if connection is None:
+        with pooled_connection() as connection:
+            return update_task_completions(completions, connection, cache)
+
+    results = [
+        {'sender_email': sender_email, 'task_name': task_name, 'completion_date': completion_date}
+        for sender_email, task_name, completion_date in completions
     ]
-    for fmt in date_formats:
-        try:
-            return datetime.datetime.strptime(date_str, fmt).date()
-        except ValueError:
-            continue
-    # If none of the formats match, try using dateutil.parser
-    try:
-        return date_parser.parse(date_str, fuzzy=True).date()
-    except (ValueError, TypeError):
-        return None
-
-def update_task_completion(sender_email, task_name, completion_date):
-    connection = get_db_connection()
-    if not connection:
-        print("Cannot proceed without a database connection.")
-        return
+    if not results:
+        return results
+
     cursor = connection.cursor()
-    try:
-        # Get person_id from email
-        cursor.execute("SELECT person_id FROM people WHERE email = %s", (sender_email,))
-        person = cursor.fetchone()
-        if not person:
-            print(f"No person found with email {sender_email}")
-            return
-        person_id = person['person_id']
-
-        # Get task_id and recurrence_period
-        cursor.execute("SELECT task_id, recurrence_period FROM tasks WHERE task_name ILIKE %s", (task_name,))
-        task = cursor.fetchone()
-        if not task:
-            print(f"No task found with name '{task_name}'")
-            return
-        task_id = task['task_id']
-        recurrence_period = task['recurrence_period']
-
-        # Ensure recurrence_period is an integer number of days
-        if isinstance(recurrence_period, datetime.timedelta):
-            recurrence_days = recurrence_period.days
-        else:
-            # If recurrence_period is stored as an interval or integer
-            recurrence_days = int(recurrence_period)
-
-        # Calculate next due date
-        next_due_date = completion_date + datetime.timedelta(days=recurrence_days)
-
-        # Check if a record already exists
-        cursor.execute("SELECT * FROM task_completion WHERE person_id = %s AND task_id = %s", (person_id, task_id))
-        existing_record = cursor.fetchone()
-        if existing_record:
-            # Update existing record
-            cursor.execute("""
-                UPDATE task_completion
-                SET completion_date = %s, next_due_date = %s
-                WHERE person_id = %s AND task_id = %s
-            """, (completion_date, next_due_date, person_id, task_id))
-        else:
-            # Insert new record
-            cursor.execute("""
-                INSERT INTO task_completion (person_id, task_id, completion_date, next_due_date)
-                VALUES (%s, %s, %s, %s)
-            """, (person_id, task_id, completion_date, next_due_date))
-        connection.commit()
-        print(f"Updated task completion for {sender_email} - {task_name}")
-    except Exception as e:
-        print(f"Failed to update task completion: {e}")
-    finally:
-        connection.close()
+    emails = sorted({result['sender_email'] for result in results})
+    task_names = sorted({result['task_name'] for result in results})
+    cache = cache or get_lookup_cache()
+    if cache is not None:
+        person_ids, tasks = cache.resolve(connection, emails, task_names)
+        # Fall back to the closest task name for anything without an exact match
+        unmatched = [name for name in task_names if name not in tasks]
+        threshold = float(os.getenv('TASK_MATCH_THRESHOLD', '0.6'))
+        for name, (task, score) in cache.match_tasks(unmatched, threshold).items():
+            if task is not None:
+                print(f"Matched task '{name}' to '{task['task_name']}' (score {score:.2f})")
+                tasks[name] = task
+            else:
+                print(f"No close match for task '{name}' (best score {score:.2f})")
+    else:
+        # Resolve every distinct sender in one round trip
+        cursor.execute(PEOPLE_LOOKUP_QUERY, (sorted({normalize(address) for address in emails}),))
+        by_address = {}
+        for row in cursor.fetchall():
+            by_address.setdefault(row['email'], row['person_id'])
+        person_ids = {address: by_address.get(normalize(address)) for address in emails}
+
+        # Resolve every distinct task name case-insensitively
+        cursor.execute(TASK_LOOKUP_QUERY, (task_names,))
+        tasks = {row['lookup_name']: row for row in cursor.fetchall()}
+
+    # Later lines win, as they did when each line was written separately
+    rows = {}
+    history = []
+    for result in results:
+        person_id = person_ids.get(result['sender_email'])
+        task = tasks.get(result['task_name'])
+        if person_id is None:
+            result['status'] = 'no_person'
+            continue
+        if task is None:
+            result['status'] = 'no_task'
+            continue
+        key = (person_id, task['task_id'])
+        if key in rows:
+            rows[key][0]['status'] = 'superseded'
+        next_due_date = result['completion_date'] + datetime.timedelta(days=recurrence_days(task['recurrence_period']))
+        result['status'] = 'updated'
+        rows[key] = (result, (person_id, task['task_id'], result['completion_date'], next_due_date))
+        history.append(rows[key][1])
+
+    if history and history_installed(connection):
+        ensure_partitions(connection, [values[2] for values in history])
+        append_history(connection, history)
+    if rows:
+        # Key order, so concurrent writers lock overlapping rows in the same order
+        execute_values(cursor, """
+            INSERT INTO task_completion (person_id, task_id, completion_date, next_due_date)
+            VALUES %s
+            ON CONFLICT (person_id, task_id) DO UPDATE
+            SET completion_date = EXCLUDED.completion_date,
+                next_due_date = EXCLUDED.next_due_date
+            WHERE task_completion.completion_date <= EXCLUDED.completion_date
+        """, sorted(values for _, values in rows.values()), page_size=len(rows))
+    connection.commit()
+    return results
+
+def print_completion_report(results):
+    for result in results:
+        status = result['status']
+        if status == 'updated':
+            print(f"Updated task completion for {result['sender_email']} - {result['task_name']}")
+        elif status == 'superseded':
+            print(f"Superseded by a later line: {result['sender_email']} - {result['task_name']}")
+        elif status == 'no_person':
+            print(f"No person found with email {result['sender_email']}")
+        elif status == 'no_task':
+            print(f"No task found with name '{result['task_name']}'")
 
 if __name__ == '__main__':
-    process_emails()
+    import argparse
+    import signal
+    import threading
+
+    arg_parser = argparse.ArgumentParser(description="Record task completions from email replies.")
+    arg_parser.add_argument('--listen', action='store_true',
+                            help="keep running and process replies as they arrive (IMAP IDLE)")
+    args = arg_parser.parse_args()
+
+    if args.listen:
+        from reply_listener import listen
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+        listen(stop=stop)
+    elif not process_emails():
+        raise SystemExit(1)
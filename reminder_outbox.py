@@ -0,0 +1,153 @@
+# reminder_outbox.py
+#
+# Durable reminder outbox. Each run enqueues one rendered reminder per
+# person and day; any number of workers then claim batches with
+# FOR UPDATE SKIP LOCKED, send them and record the outcome, so an
+# interrupted run resumes where it stopped and workers never double-claim.
+
+import email
+import os
+import socket
+
+from psycopg2.extras import execute_values
+
+import metrics
+
+# Applied by schema.py migrate
+OUTBOX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS reminder_outbox (
+        outbox_id bigserial PRIMARY KEY,
+        person_id integer NOT NULL,
+        reminder_date date NOT NULL,
+        recipient text NOT NULL,
+        message text NOT NULL,
+        status text NOT NULL DEFAULT 'pending',
+        attempts integer NOT NULL DEFAULT 0,
+        available_at timestamptz NOT NULL DEFAULT now(),
+        claimed_by text,
+        claimed_at timestamptz,
+        sent_at timestamptz,
+        last_error text,
+        created_at timestamptz NOT NULL DEFAULT now(),
+        UNIQUE (person_id, reminder_date)
+    );
+    CREATE INDEX IF NOT EXISTS reminder_outbox_open_idx
+        ON reminder_outbox (outbox_id) WHERE status IN ('pending', 'sending');
+"""
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def enqueue_reminders(connection, messages, reminder_date):
+    """Queue ``(person_id, message)`` pairs; returns the person_ids queued.
+
+    Reminders already queued for the same person and date are left alone
+    and not returned, so enqueueing is safe to repeat after a crash.
+    """
+    cursor = connection.cursor()
+    rows = [(person_id, reminder_date, msg['To'], msg.as_string()) for person_id, msg in messages]
+    if not rows:
+        return []
+    inserted = execute_values(cursor, """
+        INSERT INTO reminder_outbox (person_id, reminder_date, recipient, message)
+        VALUES %s
+        ON CONFLICT (person_id, reminder_date) DO NOTHING
+        RETURNING person_id
+    """, rows, fetch=True)
+    connection.commit()
+    return [row['person_id'] for row in inserted]
+
+def claim_batch(connection, claimed_by, batch_size=100, lease_seconds=600, max_attempts=5):
+    """Claim up to ``batch_size`` open reminders for this worker.
+
+    Reminders claimed by a worker that has not reported back within
+    ``lease_seconds`` are considered abandoned and can be claimed again,
+    unless they have already been tried ``max_attempts`` times: those are
+    parked as 'failed' in the same statement, so a message that crashes
+    the worker is not retried forever. Returned rows carry the new
+    status, 'sending' or 'failed'. The claim is committed before anything
+    is sent.
+    """
+    cursor = connection.cursor()
+    cursor.execute("""
+        UPDATE reminder_outbox o
+        SET status = CASE WHEN o.status = 'sending' AND o.attempts >= %(max_attempts)s
+                          THEN 'failed' ELSE 'sending' END,
+            attempts = CASE WHEN o.status = 'sending' AND o.attempts >= %(max_attempts)s
+                            THEN o.attempts ELSE o.attempts + 1 END,
+            last_error = CASE WHEN o.status = 'sending' AND o.attempts >= %(max_attempts)s
+                              THEN 'lease expired on the last attempt' ELSE o.last_error END,
+            claimed_by = %(claimed_by)s,
+            claimed_at = now()
+        WHERE o.outbox_id IN (
+            SELECT outbox_id FROM reminder_outbox
+            WHERE (status = 'pending' AND available_at <= now())
+               OR (status = 'sending' AND claimed_at < now() - make_interval(secs => %(lease_seconds)s))
+            ORDER BY outbox_id
+            LIMIT %(batch_size)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING o.outbox_id, o.person_id, o.recipient, o.message, o.attempts, o.status
+    """, {'claimed_by': claimed_by, 'lease_seconds': lease_seconds,
+          'batch_size': batch_size, 'max_attempts': max_attempts})
+    claimed = cursor.fetchall()
+    connection.commit()
+    return claimed
+
+def record_results(connection, claimed_by, claimed, results, max_attempts=5):
+    """Mark sent reminders delivered and requeue failed ones with a delay.
+
+    A reminder that has failed ``max_attempts`` times is parked as 'failed'.
+    Rows another worker has since reclaimed are left alone.
+    """
+    rows = [
+        (item['outbox_id'], claimed_by, result['status'] == 'sent', result['error'], max_attempts)
+        for item, result in zip(claimed, results)
+    ]
+    if not rows:
+        return
+    cursor = connection.cursor()
+    execute_values(cursor, """
+        UPDATE reminder_outbox o
+        SET status = CASE
+                WHEN r.sent THEN 'sent'
+                WHEN o.attempts >= r.max_attempts THEN 'failed'
+                ELSE 'pending'
+            END,
+            sent_at = CASE WHEN r.sent THEN now() ELSE NULL END,
+            -- Back off failed reminders so one worker run does not spin on them
+            available_at = CASE WHEN r.sent THEN o.available_at
+                                ELSE now() + make_interval(mins => 5 * o.attempts) END,
+            last_error = r.error
+        FROM (VALUES %s) AS r(outbox_id, claimed_by, sent, error, max_attempts)
+        WHERE o.outbox_id = r.outbox_id AND o.claimed_by = r.claimed_by AND o.status = 'sending'
+    """, rows, template='(%s::bigint, %s::text, %s::boolean, %s::text, %s::integer)')
+    connection.commit()
+
+def run_worker(connection, pool, batch_size=100, lease_seconds=600, max_attempts=5):
+    """Drain the outbox through ``pool`` until nothing is left to claim."""
+    claimed_by = worker_id()
+    totals = {'sent': 0, 'failed': 0}
+    while True:
+        with metrics.span('db_write'):
+            rows = claim_batch(connection, claimed_by, batch_size, lease_seconds, max_attempts)
+        if not rows:
+            return totals
+        claimed = []
+        for item in rows:
+            if item['status'] == 'sending':
+                claimed.append(item)
+            else:
+                totals['failed'] += 1
+                print(f"Gave up on email to {item['recipient']} after {item['attempts']} attempts")
+        if not claimed:
+            continue
+        results = pool.send_many([email.message_from_string(item['message']) for item in claimed])
+        with metrics.span('db_write'):
+            record_results(connection, claimed_by, claimed, results, max_attempts)
+        for item, result in zip(claimed, results):
+            totals[result['status']] += 1
+            if result['status'] == 'sent':
+                print(f"Email sent to {item['recipient']}")
+            else:
+                print(f"Failed to send email to {item['recipient']} (attempt {item['attempts']}): {result['error']}")
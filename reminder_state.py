@@ -0,0 +1,88 @@
+# reminder_state.py
+#
+# Reminder deduplication. For each person the fingerprint of the due task
+# set last reminded about is stored with the escalation tier and time, and
+# the due-task query only returns people whose set changed, who moved up a
+# tier or whose re-notify interval has passed, so unchanged people are
+# filtered out by Postgres and never fetched.
+
+import os
+
+from psycopg2.extras import execute_values
+
+# Due tasks for people who need a reminder now, in person_id order
+DUE_REMINDERS_QUERY = """
+WITH due AS (
+    SELECT tc.person_id, t.task_id, t.task_name, tc.next_due_date
+    FROM task_completion tc
+    JOIN tasks t ON t.task_id = tc.task_id
+    WHERE tc.next_due_date <= %(today)s
+),
+summary AS (
+    SELECT
+        person_id,
+        md5(string_agg(task_id || '@' || next_due_date, ',' ORDER BY task_id)) AS fingerprint,
+        (SELECT count(*) FROM unnest(%(tier_days)s::integer[]) AS tier_days
+         WHERE %(today)s::date - min(next_due_date) >= tier_days) AS tier
+    FROM due
+    GROUP BY person_id
+),
+pending AS (
+    SELECT s.person_id, s.fingerprint, s.tier
+    FROM summary s
+    LEFT JOIN reminder_state rs ON rs.person_id = s.person_id
+    WHERE rs.person_id IS NULL
+       OR rs.fingerprint <> s.fingerprint
+       OR s.tier > rs.tier
+       OR rs.last_sent_at <= now() - make_interval(days => %(renotify_days)s)
+)
+SELECT
+    p.person_id,
+    p.name,
+    p.email,
+    d.task_id,
+    d.task_name,
+    d.next_due_date,
+    pe.fingerprint,
+    pe.tier
+FROM pending pe
+JOIN people p ON p.person_id = pe.person_id
+JOIN due d ON d.person_id = pe.person_id
+ORDER BY p.person_id, d.task_id;
+"""
+
+REMINDER_STATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS reminder_state (
+        person_id integer PRIMARY KEY,
+        fingerprint text NOT NULL,
+        tier integer NOT NULL DEFAULT 0,
+        last_sent_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+
+def load_reminder_policy():
+    """Re-notify interval and escalation tiers from the .env settings.
+
+    REMINDER_ESCALATION_DAYS lists ascending overdue thresholds; a person
+    whose oldest due task is past the n-th one is at tier n.
+    """
+    tiers = os.getenv('REMINDER_ESCALATION_DAYS', '7,30')
+    return {
+        'renotify_days': int(os.getenv('REMINDER_RENOTIFY_DAYS', '7')),
+        'tier_days': sorted(int(days) for days in tiers.split(',') if days.strip()),
+    }
+
+def record_reminders(connection, reminded):
+    """Store ``(person_id, fingerprint, tier)`` for reminders just queued."""
+    if not reminded:
+        return
+    cursor = connection.cursor()
+    execute_values(cursor, """
+        INSERT INTO reminder_state (person_id, fingerprint, tier)
+        VALUES %s
+        ON CONFLICT (person_id) DO UPDATE
+        SET fingerprint = EXCLUDED.fingerprint,
+            tier = EXCLUDED.tier,
+            last_sent_at = now()
+    """, reminded)
+    connection.commit()
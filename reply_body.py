@@ -0,0 +1,87 @@
+# reply_body.py
+#
+# Bounded extraction of the new text of a reply. Only the first bytes of
+# each text part are downloaded (see imap_fetch.fetch_messages), parts are
+# decoded line by line, and decoding stops at the first quoted line, so
+# long quoted threads and pasted logs are never decoded in full.
+
+import binascii
+import codecs
+import io
+
+from reply_parser import is_quote_boundary
+
+DEFAULT_MAX_BYTES = 64 * 1024
+
+def _text_parts(msg):
+    # walk() only visits parts; nothing is decoded until a part is chosen
+    if not msg.is_multipart():
+        if msg.get_content_maintype() == 'text':
+            yield msg
+        return
+    for part in msg.walk():
+        if part.get_content_type() != 'text/plain':
+            continue
+        if 'attachment' in str(part.get('Content-Disposition', '')).lower():
+            continue
+        yield part
+
+def _transfer_decoded(part):
+    """Yield the part's payload bytes one encoded line at a time."""
+    payload = part.get_payload()
+    if not isinstance(payload, str):
+        return
+    encoding = str(part.get('Content-Transfer-Encoding', '7bit')).strip().lower()
+    pending = b''
+    for line in io.StringIO(payload):
+        raw = line.encode('ascii', 'surrogateescape')
+        if encoding == 'base64':
+            pending += b''.join(raw.split())
+            usable = len(pending) // 4 * 4
+            try:
+                yield binascii.a2b_base64(pending[:usable])
+            except binascii.Error:
+                return
+            pending = pending[usable:]
+        elif encoding == 'quoted-printable':
+            yield binascii.a2b_qp(raw)
+        else:
+            yield raw
+
+def _decoder(part):
+    charset = part.get_content_charset() or 'utf-8'
+    try:
+        return codecs.getincrementaldecoder(charset)(errors='replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+def reply_text(msg, max_bytes=DEFAULT_MAX_BYTES):
+    """Return the reply text that precedes any quoted content.
+
+    Only inline text/plain parts (or a single-part text message) are read,
+    and at most ``max_bytes`` of decoded payload across all of them (no
+    limit when None).
+    """
+    lines = []
+    budget = float('inf') if max_bytes is None else max_bytes
+    for part in _text_parts(msg):
+        decoder = _decoder(part)
+        buffered = ''
+        for data in _transfer_decoded(part):
+            if budget < len(data):
+                data = data[:budget]
+            budget -= len(data)
+            buffered += decoder.decode(data)
+            *complete, buffered = buffered.split('\n')
+            for line in complete:
+                if is_quote_boundary(line.strip()):
+                    return '\n'.join(lines)
+                lines.append(line)
+            if budget <= 0:
+                # The cap may have cut the last line short, so it is dropped
+                return '\n'.join(lines)
+        buffered += decoder.decode(b'', final=True)
+        if is_quote_boundary(buffered.strip()):
+            return '\n'.join(lines)
+        lines.append(buffered)
+    return '\n'.join(lines)
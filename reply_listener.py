@@ -0,0 +1,142 @@
+# reply_listener.py
+#
+# Long-running listener that keeps one authenticated IMAP session open and
+# processes replies as soon as the server announces them, instead of
+# waiting for the next cron run of process_replies.py.
+
+import os
+import re
+import select
+import ssl
+import threading
+import time
+
+import process_replies
+
+_NEW_MAIL = re.compile(rb'^\* \d+ (EXISTS|RECENT)', re.IGNORECASE)
+
+def load_listener_config():
+    return {
+        # RFC 2177 servers may drop an IDLE after 30 minutes, so re-issue it sooner
+        'idle_timeout': float(os.getenv('IMAP_IDLE_TIMEOUT', '300')),
+        'poll_interval': float(os.getenv('IMAP_POLL_INTERVAL', '30')),
+        'session_max_age': float(os.getenv('IMAP_SESSION_MAX_AGE', '1500')),
+        'max_backoff': float(os.getenv('IMAP_RECONNECT_MAX_BACKOFF', '300')),
+    }
+
+def _readable(mail, timeout):
+    sock = mail.socket()
+    # Lines already read into imaplib's buffered file, or decrypted bytes
+    # held by the SSL layer, never show up in select(), so peek first
+    # without blocking
+    blocking_timeout = sock.gettimeout()
+    sock.settimeout(0)
+    try:
+        if mail.file.peek(1):
+            return True
+    except ssl.SSLWantReadError:
+        pass
+    finally:
+        sock.settimeout(blocking_timeout)
+    readable, _, _ = select.select([sock], [], [], timeout)
+    return bool(readable)
+
+def idle_wait(mail, timeout, stop=None):
+    """Hold an IDLE command open until new mail arrives or ``timeout`` passes.
+
+    Returns True when the server reported new messages. ``stop`` is checked
+    about once a second so a shutdown does not wait for the full timeout.
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b' IDLE\r\n')
+    try:
+        response = mail.readline()
+        if not response.startswith(b'+'):
+            raise mail.error(f"IDLE rejected: {response.strip().decode(errors='replace')}")
+
+        activity = False
+        deadline = time.monotonic() + timeout
+        while not activity and not (stop and stop.is_set()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if _readable(mail, min(remaining, 1.0)):
+                line = mail.readline()
+                if not line:
+                    raise mail.abort("connection closed during IDLE")
+                activity = bool(_NEW_MAIL.match(line))
+
+        mail.send(b'DONE\r\n')
+        while True:
+            line = mail.readline()
+            if not line:
+                raise mail.abort("connection closed during IDLE")
+            if line.startswith(tag):
+                if not line[len(tag):].strip().upper().startswith(b'OK'):
+                    raise mail.error(f"IDLE failed: {line.strip().decode(errors='replace')}")
+                return activity
+            activity = activity or bool(_NEW_MAIL.match(line))
+    finally:
+        mail.tagged_commands.pop(tag, None)
+
+def _process(mail, config):
+    try:
+        count = process_replies.process_mailbox(mail, config)
+    except (mail.abort, OSError):
+        raise
+    except Exception as e:
+        # A bad batch should not tear down a healthy session
+        print(f"An error occurred while processing emails: {e}")
+        return
+    if count:
+        print(f"Processed {count} new emails.")
+
+def listen(config=None, listener_config=None, stop=None):
+    """Process replies continuously until ``stop`` is set.
+
+    Uses IDLE when the server advertises it and polls otherwise. The
+    session is replaced every ``session_max_age`` seconds, and failed
+    sessions are reopened with exponential backoff.
+    """
+    config = config or process_replies.load_imap_config()
+    listener_config = listener_config or load_listener_config()
+    stop = stop or threading.Event()
+
+    if not all([config['server'], config['port'], config['address'], config['password']]):
+        print("IMAP configuration is incomplete in the .env file.")
+        return
+
+    backoff = 1
+    while not stop.is_set():
+        mail = None
+        try:
+            mail = process_replies.connect_imap(config)
+            started = time.monotonic()
+            supports_idle = 'IDLE' in mail.capabilities
+            print(f"Listening for replies ({'IDLE' if supports_idle else 'polling'}).")
+
+            # Catch up on anything that arrived while disconnected
+            _process(mail, config)
+            backoff = 1
+
+            while not stop.is_set() and time.monotonic() - started < listener_config['session_max_age']:
+                if supports_idle:
+                    if idle_wait(mail, listener_config['idle_timeout'], stop):
+                        _process(mail, config)
+                    else:
+                        # Keep NAT and server timers from expiring the session
+                        mail.noop()
+                else:
+                    if stop.wait(listener_config['poll_interval']):
+                        break
+                    _process(mail, config)
+        except Exception as e:
+            print(f"IMAP session failed: {e}. Reconnecting in {backoff:.0f}s.")
+            stop.wait(backoff)
+            backoff = min(backoff * 2, listener_config['max_backoff'])
+        finally:
+            if mail is not None:
+                try:
+                    mail.logout()
+                except Exception:
+                    pass
@@ -0,0 +1,97 @@
+# reply_parser.py
+#
+# Parsing of "Completed: <task> on <date>" reply lines. Patterns are
+# compiled once, common date layouts are recognised by shape and built
+# directly instead of trying strptime formats in turn, and parsed dates are
+# memoized since the same few dates recur across many replies.
+
+import datetime
+import functools
+import re
+
+COMPLETION_PATTERN = re.compile(r'Completed:\s*(.+?)\s+on\s+(.+)', re.IGNORECASE)
+
+# Numeric layouts: regex -> order of the (year, month, day) groups
+NUMERIC_DATES = [
+    (re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})'), (0, 1, 2)),  # 2023-10-24
+    (re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})'), (2, 0, 1)),  # 10/24/2023
+    (re.compile(r'(\d{1,2})-(\d{1,2})-(\d{4})'), (2, 1, 0)),  # 24-10-2023
+]
+MONTH_FIRST_DATE = re.compile(r'([A-Za-z]+)\s+(\d{1,2}),\s+(\d{4})')  # October 24, 2023 / Oct 24, 2023
+DAY_FIRST_DATE = re.compile(r'(\d{1,2})\s+([A-Za-z]+)\s+(\d{4})')     # 24 October 2023 / 24 Oct 2023
+
+MONTHS = {}
+for number, name in enumerate(['january', 'february', 'march', 'april', 'may', 'june', 'july',
+                               'august', 'september', 'october', 'november', 'december'], 1):
+    MONTHS[name] = MONTHS[name[:3]] = number
+
+def _fast_date(date_str):
+    for pattern, order in NUMERIC_DATES:
+        match = pattern.fullmatch(date_str)
+        if match:
+            parts = match.groups()
+            return datetime.date(int(parts[order[0]]), int(parts[order[1]]), int(parts[order[2]]))
+    match = MONTH_FIRST_DATE.fullmatch(date_str)
+    if match:
+        return datetime.date(int(match.group(3)), MONTHS[match.group(1).lower()], int(match.group(2)))
+    match = DAY_FIRST_DATE.fullmatch(date_str)
+    if match:
+        return datetime.date(int(match.group(3)), MONTHS[match.group(2).lower()], int(match.group(1)))
+    return None
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(date_str):
+    """Parse a completion date, or return None if it cannot be understood."""
+    try:
+        parsed = _fast_date(date_str)
+        if parsed:
+            return parsed
+    except (KeyError, ValueError):
+        # Unknown month name or impossible date; let dateutil have a go
+        pass
+    # Imported here: most dates take the fast path, and dateutil is slow to import
+    from dateutil import parser as date_parser  # Requires the python-dateutil package
+
+    try:
+        return date_parser.parse(date_str, fuzzy=True).date()
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+def is_quote_boundary(line):
+    lowered = line.lower()
+    return line.startswith('>') or lowered.startswith('on ') or lowered.startswith('from:')
+
+def parse_line(line):
+    """Classify one stripped reply line.
+
+    Returns a dict with the line and a status of 'matched' (with task_name
+    and completion_date), 'bad_date' or 'unrecognized'.
+    """
+    match = COMPLETION_PATTERN.match(line)
+    if not match:
+        return {'status': 'unrecognized', 'line': line}
+    completion_date = parse_date(match.group(2).strip())
+    if completion_date is None:
+        return {'status': 'bad_date', 'line': line}
+    return {
+        'status': 'matched',
+        'line': line,
+        'task_name': match.group(1).strip(),
+        'completion_date': completion_date
+    }
+
+def parse_reply(body):
+    """Parse the new (unquoted) part of a reply body, one result per line.
+
+    Parsing stops at the first quoted line or "On ... wrote:" header, and
+    blank lines are skipped.
+    """
+    results = []
+    for line in body.strip().split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if is_quote_boundary(line):
+            break
+        results.append(parse_line(line))
+    return results
@@ -0,0 +1,139 @@
+# reply_pipeline.py
+#
+# Staged fetch -> parse -> write pipeline for reply processing. Each stage
+# runs in its own bounded pool of threads and hands work to the next one
+# through a bounded queue, so IMAP and Postgres latency overlap instead of
+# adding up. A batch is acknowledged (flagged seen, checkpointed) only after
+# its completions are committed.
+
+import queue
+import threading
+
+from imap_fetch import fetch_messages
+
+_DONE = object()
+
+def _close(mail):
+    if mail is not None:
+        try:
+            mail.logout()
+        except Exception:
+            pass
+
+def run_pipeline(uid_batches, connect, parse, write, acknowledge,
+                 fetchers=2, parsers=2, writers=2, queue_size=4, max_bytes=None):
+    """Run ``uid_batches`` through the fetch, parse and write stages.
+
+    ``connect()`` opens a selected IMAP session for one fetcher thread,
+    ``parse(messages)`` turns fetched ``(uid, message)`` pairs into
+    completion tuples and ``write(completions)`` commits them. After each
+    commit ``acknowledge(batch, checkpoint_uid)`` is called from a single
+    thread; ``checkpoint_uid`` is the highest UID below which every batch
+    has been committed, or None when that has not moved. ``max_bytes``
+    caps the download of each text part, as in ``fetch_messages``.
+
+    Returns a summary dict with the number of batches committed and a list
+    of ``(batch, error)`` for batches that failed in any stage.
+    """
+    fetch_queue = queue.Queue()
+    parse_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    ack_queue = queue.Queue()
+    failures = []
+    failures_lock = threading.Lock()
+
+    def fail(batch, error):
+        print(f"Failed to process UIDs {batch[0]}-{batch[-1]}: {error}")
+        with failures_lock:
+            failures.append((batch, error))
+
+    def fetcher():
+        mail = None
+        while True:
+            item = fetch_queue.get()
+            if item is _DONE:
+                break
+            index, batch = item
+            try:
+                if mail is None:
+                    mail = connect()
+                messages = fetch_messages(mail, batch, max_bytes)
+            except Exception as e:
+                fail(batch, e)
+                # Start the next batch on a fresh session
+                _close(mail)
+                mail = None
+                continue
+            parse_queue.put((index, batch, messages))
+        _close(mail)
+
+    def parser():
+        while True:
+            item = parse_queue.get()
+            if item is _DONE:
+                break
+            index, batch, messages = item
+            try:
+                completions = parse(messages)
+            except Exception as e:
+                fail(batch, e)
+                continue
+            write_queue.put((index, batch, completions))
+
+    def writer():
+        while True:
+            item = write_queue.get()
+            if item is _DONE:
+                break
+            index, batch, completions = item
+            try:
+                if completions:
+                    write(completions)
+            except Exception as e:
+                fail(batch, e)
+                continue
+            ack_queue.put((index, batch))
+
+    committed = {}
+    summary = {'batches': len(uid_batches), 'committed': 0, 'failed': failures}
+
+    def acknowledger():
+        next_index = 0
+        while True:
+            item = ack_queue.get()
+            if item is _DONE:
+                break
+            index, batch = item
+            committed[index] = batch
+            summary['committed'] += 1
+            checkpoint_uid = None
+            while next_index in committed:
+                checkpoint_uid = committed.pop(next_index)[-1]
+                next_index += 1
+            try:
+                acknowledge(batch, checkpoint_uid)
+            except Exception as e:
+                print(f"Failed to acknowledge UIDs {batch[0]}-{batch[-1]}: {e}")
+
+    for index, batch in enumerate(uid_batches):
+        fetch_queue.put((index, batch))
+
+    # Shut each stage down only after the stage feeding it has drained
+    stages = [
+        (fetcher, fetchers, fetch_queue),
+        (parser, parsers, parse_queue),
+        (writer, writers, write_queue),
+        (acknowledger, 1, ack_queue),
+    ]
+    threads = []
+    for target, count, _ in stages:
+        threads.append([threading.Thread(target=target, daemon=True) for _ in range(max(1, count))])
+        for thread in threads[-1]:
+            thread.start()
+
+    for (_, _, inbox), workers in zip(stages, threads):
+        for _ in workers:
+            inbox.put(_DONE)
+        for thread in workers:
+            thread.join()
+    return summary
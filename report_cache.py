@@ -0,0 +1,169 @@
+# report_cache.py
+#
+# Incremental report regeneration. The last report's matrix is kept in a
+# local SQLite file, one row per person, and only people whose completions
+# changed (tracked by task_completion.updated_at and deletion tombstones)
+# are recomputed by Postgres on the next run.
+
+import datetime
+import json
+import os
+import sqlite3
+
+from report_data import fetch_report_rows_for, iter_people_order, iter_report_records
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report_cache.sqlite3')
+
+# Applied by schema.py migrate. updated_at is kept current by a trigger, and
+# deletes leave a per-person tombstone, so both show up after a watermark.
+CHANGE_TRACKING_SCHEMA = """
+    ALTER TABLE task_completion ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+    CREATE INDEX IF NOT EXISTS task_completion_updated_at_idx ON task_completion (updated_at);
+    CREATE OR REPLACE FUNCTION task_completion_touch() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at := now();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    DROP TRIGGER IF EXISTS task_completion_touch ON task_completion;
+    CREATE TRIGGER task_completion_touch BEFORE UPDATE ON task_completion
+        FOR EACH ROW EXECUTE FUNCTION task_completion_touch();
+
+    CREATE TABLE IF NOT EXISTS task_completion_deletions (
+        person_id integer PRIMARY KEY,
+        deleted_at timestamptz NOT NULL DEFAULT now()
+    );
+    CREATE INDEX IF NOT EXISTS task_completion_deletions_deleted_at_idx
+        ON task_completion_deletions (deleted_at);
+    CREATE OR REPLACE FUNCTION task_completion_record_delete() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO task_completion_deletions (person_id) VALUES (OLD.person_id)
+        ON CONFLICT (person_id) DO UPDATE SET deleted_at = now();
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+    DROP TRIGGER IF EXISTS task_completion_record_delete ON task_completion;
+    CREATE TRIGGER task_completion_record_delete AFTER DELETE ON task_completion
+        FOR EACH ROW EXECUTE FUNCTION task_completion_record_delete();
+"""
+
+# People with completions written or deleted after a point in time
+CHANGED_PEOPLE_QUERY = """
+    SELECT person_id FROM task_completion WHERE updated_at > %s
+    UNION
+    SELECT person_id FROM task_completion_deletions WHERE deleted_at > %s
+"""
+
+def fetch_report_state(connection):
+    """Cheap fingerprint of everything the report depends on."""
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT
+            (SELECT md5(COALESCE(string_agg(task_id || ':' || task_name, ',' ORDER BY task_name, task_id), ''))
+             FROM tasks) AS tasks_signature,
+            (SELECT md5(COALESCE(string_agg(person_id || ':' || name, ',' ORDER BY person_id), ''))
+             FROM people) AS people_signature,
+            greatest(
+                (SELECT max(updated_at) FROM task_completion),
+                (SELECT max(deleted_at) FROM task_completion_deletions)
+            ) AS watermark
+    """)
+    state = dict(cursor.fetchone())
+    state['watermark'] = state['watermark'].isoformat() if state['watermark'] else None
+    return state
+
+class ReportCache:
+    def __init__(self, path=DEFAULT_CACHE_FILE):
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS report_rows (person_id INTEGER PRIMARY KEY, row TEXT NOT NULL)")
+
+    def state(self):
+        found = self.db.execute("SELECT value FROM meta WHERE key = 'state'").fetchone()
+        return json.loads(found[0]) if found else None
+
+    def set_state(self, state):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('state', ?)", (json.dumps(state),))
+        self.db.commit()
+
+    def mark_delivered(self):
+        state = self.state()
+        if state is not None:
+            state['delivered'] = True
+            self.set_state(state)
+
+    def row(self, person_id):
+        found = self.db.execute("SELECT row FROM report_rows WHERE person_id = ?", (person_id,)).fetchone()
+        return json.loads(found[0]) if found else None
+
+    def put_rows(self, records):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO report_rows (person_id, row) VALUES (?, ?)",
+            ((person_id, json.dumps(row)) for person_id, row in records)
+        )
+
+    def replace_all(self, records):
+        self.db.execute("DELETE FROM report_rows")
+        self.put_rows(records)
+
+    def keep_only(self, person_ids):
+        """Drop cached rows for people no longer present; returns how many."""
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS keep_people (person_id INTEGER PRIMARY KEY)")
+        self.db.execute("DELETE FROM keep_people")
+        self.db.executemany("INSERT INTO keep_people (person_id) VALUES (?)", ((person_id,) for person_id in person_ids))
+        deleted = self.db.execute(
+            "DELETE FROM report_rows WHERE person_id NOT IN (SELECT person_id FROM keep_people)"
+        ).rowcount
+        return deleted
+
+    def close(self):
+        self.db.close()
+
+def refresh_report_cache(connection, cache, slack_seconds=300):
+    """Bring the cached matrix up to date and say whether a report is due.
+
+    Runs inside the caller's snapshot. A change to the task list rebuilds
+    everything; otherwise only people with completions written or deleted
+    since the last watermark (less ``slack_seconds``, for transactions that
+    committed late) or whose name changed are recomputed. Returns False
+    when the matrix is identical to the one last delivered.
+    """
+    state = fetch_report_state(connection)
+    previous = cache.state()
+
+    if previous is None or previous['tasks_signature'] != state['tasks_signature']:
+        cache.replace_all(iter_report_records(connection))
+        changed = True
+    else:
+        candidates = set()
+        cursor = connection.cursor()
+        if previous['watermark']:
+            since = datetime.datetime.fromisoformat(previous['watermark']) - datetime.timedelta(seconds=slack_seconds)
+            cursor.execute(CHANGED_PEOPLE_QUERY, (since, since))
+        else:
+            cursor.execute("SELECT DISTINCT person_id FROM task_completion")
+        candidates.update(row['person_id'] for row in cursor.fetchall())
+
+        removed = 0
+        if previous['people_signature'] != state['people_signature']:
+            present = []
+            for person_id, name in iter_people_order(connection):
+                present.append(person_id)
+                cached = cache.row(person_id)
+                if cached is None or cached[0] != name:
+                    candidates.add(person_id)
+            removed = cache.keep_only(present)
+
+        fresh = fetch_report_rows_for(connection, candidates) if candidates else {}
+        updated = [(person_id, row) for person_id, row in fresh.items() if cache.row(person_id) != row]
+        cache.put_rows(updated)
+        changed = bool(updated or removed)
+
+    state['delivered'] = bool(previous and previous.get('delivered')) and not changed
+    cache.set_state(state)
+    return not state['delivered']
+
+def iter_cached_rows(connection, cache, task_count):
+    """Yield report rows in report order from the refreshed cache."""
+    for person_id, name in iter_people_order(connection):
+        yield cache.row(person_id) or [name] + [None] * task_count
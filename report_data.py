@@ -0,0 +1,73 @@
+# report_data.py
+#
+# Report data source. The people x tasks pivot is done by Postgres and the
+# per-person rows are streamed through a named (server-side) cursor, all on
+# one connection inside one read-only snapshot.
+
+# Completion dates for every task, in report column order, one row per person
+REPORT_ROWS_QUERY = """
+SELECT
+    p.person_id,
+    p.name,
+    array_agg(to_char(tc.completion_date, 'YYYY-MM-DD') ORDER BY t.task_name, t.task_id) AS completion_dates
+FROM
+    people p
+CROSS JOIN
+    tasks t
+LEFT JOIN
+    task_completion tc ON tc.person_id = p.person_id AND tc.task_id = t.task_id
+{where}
+GROUP BY
+    p.person_id, p.name
+ORDER BY
+    p.name, p.person_id;
+"""
+
+def begin_report_snapshot(connection):
+    # Must be the first statement of the transaction psycopg2 opens
+    cursor = connection.cursor()
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+
+def fetch_report_tasks(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT task_id, task_name FROM tasks ORDER BY task_name, task_id;")
+    return cursor.fetchall()
+
+def fetch_people_summary(connection):
+    """Return the number of people and the length of the longest name."""
+    cursor = connection.cursor()
+    cursor.execute("SELECT count(*) AS people, COALESCE(max(length(name)), 0) AS name_width FROM people;")
+    return cursor.fetchone()
+
+def iter_report_records(connection, itersize=2000):
+    """Yield ``(person_id, [name, 'YYYY-MM-DD' or None, ...])`` in report order.
+
+    Rows are pulled from a server-side cursor ``itersize`` at a time, so
+    only one page is held in memory. The connection must stay checked out
+    and inside the snapshot transaction until iteration finishes.
+    """
+    cursor = connection.cursor(name='report_rows')
+    cursor.itersize = itersize
+    try:
+        cursor.execute(REPORT_ROWS_QUERY.format(where=''))
+        for row in cursor:
+            yield row['person_id'], [row['name']] + row['completion_dates']
+    finally:
+        cursor.close()
+
+def iter_people_order(connection, itersize=2000):
+    """Yield ``(person_id, name)`` in report row order."""
+    cursor = connection.cursor(name='report_people')
+    cursor.itersize = itersize
+    try:
+        cursor.execute("SELECT person_id, name FROM people ORDER BY name, person_id;")
+        for row in cursor:
+            yield row['person_id'], row['name']
+    finally:
+        cursor.close()
+
+def fetch_report_rows_for(connection, person_ids):
+    """Return ``{person_id: [name, date, ...]}`` for just these people."""
+    cursor = connection.cursor()
+    cursor.execute(REPORT_ROWS_QUERY.format(where='WHERE p.person_id = ANY(%s)'), (list(person_ids),))
+    return {row['person_id']: [row['name']] + row['completion_dates'] for row in cursor.fetchall()}
@@ -0,0 +1,60 @@
+# report_frame.py
+#
+# pandas report backend. Completions are loaded into a DataFrame, pivoted
+# into the people x tasks matrix in one vectorized step and written as CSV,
+# Parquet or xlsx from the same frame.
+
+import pandas as pd
+
+from db_connection import CountingTupleCursor
+from report_writer import SHEET_TITLE
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+def _fetch_frame(connection, query, columns):
+    # Plain tuple rows are much cheaper to turn into a frame than dict rows
+    cursor = connection.cursor(cursor_factory=CountingTupleCursor)
+    cursor.execute(query)
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+
+def build_report_frame(people, tasks, completions):
+    """Pivot completions into a frame indexed by name with one column per task.
+
+    ``people`` has person_id/name, ``tasks`` task_id/task_name, and
+    ``completions`` person_id/task_id/completion_date, each already in
+    report order where it matters. Cells are 'YYYY-MM-DD' strings or NaN.
+    """
+    completions = completions.drop_duplicates(['person_id', 'task_id'], keep='last')
+    # Format every date in one vectorized pass before pivoting
+    dates = pd.to_datetime(completions['completion_date']).dt.strftime('%Y-%m-%d')
+    matrix = (
+        completions.assign(completion_date=dates)
+        .pivot(index='person_id', columns='task_id', values='completion_date')
+        .reindex(index=people['person_id'], columns=tasks['task_id'])
+    )
+    matrix.index = pd.Index(people['name'].to_numpy())
+    matrix.columns = pd.Index(tasks['task_name'].to_numpy())
+    return matrix
+
+def load_report_frame(connection):
+    people = _fetch_frame(connection, "SELECT person_id, name FROM people ORDER BY name, person_id;",
+                          ['person_id', 'name'])
+    tasks = _fetch_frame(connection, "SELECT task_id, task_name FROM tasks ORDER BY task_name, task_id;",
+                         ['task_id', 'task_name'])
+    completions = _fetch_frame(connection, "SELECT person_id, task_id, completion_date FROM task_completion;",
+                               ['person_id', 'task_id', 'completion_date'])
+    return build_report_frame(people, tasks, completions)
+
+def write_report_frame(matrix, report_file, report_format):
+    if report_format == 'csv':
+        matrix.to_csv(report_file, index_label='')
+    elif report_format == 'parquet':
+        try:
+            frame = matrix.rename_axis('name').reset_index()
+            frame.to_parquet(report_file, index=False)
+        except ImportError as e:
+            raise RuntimeError("Parquet output requires pyarrow or fastparquet to be installed") from e
+    elif report_format == 'xlsx':
+        matrix.to_excel(report_file, sheet_name=SHEET_TITLE, engine='openpyxl')
+    else:
+        raise ValueError(f"Unknown report format: {report_format}")
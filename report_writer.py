@@ -0,0 +1,78 @@
+# report_writer.py
+#
+# Streaming writer for the people x tasks completion report. Rows are
+# appended to a write-only openpyxl worksheet as they are produced, so
+# memory stays flat however large the grid gets.
+
+import metrics
+
+SHEET_TITLE = "Task Completion Report"
+
+# Completion dates are always written as YYYY-MM-DD
+DATE_WIDTH = len('YYYY-MM-DD')
+
+def format_date(value):
+    return value.isoformat() if value is not None else None
+
+def report_column_widths(task_names, name_width):
+    """Return column widths matching the original max(len(value)) + 2 sizing.
+
+    Write-only sheets emit their column definitions before the first row,
+    so widths are settled up front: every task column only ever holds its
+    header and fixed-width dates, and the name column width is the longest
+    person name, which callers get without materializing the grid.
+    """
+    widths = [name_width + 2]
+    widths.extend(max(len(str(task_name)), DATE_WIDTH) + 2 for task_name in task_names)
+    return widths
+
+def write_streaming_report(report_file, task_names, rows, column_widths):
+    """Write the report from an iterator of ``[name, date, date, ...]`` rows.
+
+    Dates may be date objects or preformatted strings; None leaves the cell
+    empty. Returns the number of person rows written.
+    """
+    # openpyxl is only imported once a report is actually written
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET_TITLE)
+
+    for col_num, width in enumerate(column_widths, start=1):
+        ws.column_dimensions[get_column_letter(col_num)].width = width
+
+    # Bold font for headers
+    bold_font = Font(bold=True)
+    center_alignment = Alignment(horizontal='center', vertical='center')
+    left_alignment = Alignment(horizontal='left', vertical='center')
+
+    def styled(value, font=None, alignment=None):
+        cell = WriteOnlyCell(ws, value=value)
+        if font:
+            cell.font = font
+        if alignment:
+            cell.alignment = alignment
+        return cell
+
+    # Task names in the first row starting from column B
+    ws.append([None] + [styled(task_name, bold_font, center_alignment) for task_name in task_names])
+
+    row_count = 0
+    for name, *dates in rows:
+        cells = [styled(name, bold_font, left_alignment)]
+        for value in dates:
+            if value is None:
+                cells.append(None)
+            else:
+                if not isinstance(value, str):
+                    value = format_date(value)
+                cells.append(styled(value, alignment=center_alignment))
+        ws.append(cells)
+        row_count += 1
+
+    with metrics.span('workbook_save'):
+        wb.save(report_file)
+    return row_count
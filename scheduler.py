@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+# scheduler.py
+#
+# Long-running daemon that runs the reminder, reply-ingest and report jobs
+# on their own schedules in one process. The jobs share the database pool,
+# one SMTP delivery pool and one IMAP session; each job runs on its own
+# thread, and a job that is still running when it comes due again is
+# skipped rather than started twice.
+
+import os
+import re
+import signal
+import threading
+import time
+
+import schedule
+
+import settings
+from db_connection import close_pool
+from process_replies import connect_imap, load_imap_config, process_emails
+from send_reminders import run_reminders
+from smtp_pool import pool_from_env
+
+DEFAULT_SCHEDULES = {
+    'remind': 'every day at 08:00',
+    'ingest': 'every 5 minutes',
+    'report': 'every monday at 07:00',
+}
+
+_SPEC = re.compile(
+    r'(?:every\s+)?(?:(\d+)\s+)?'
+    r'(second|minute|hour|day|week|monday|tuesday|wednesday|thursday|friday|saturday|sunday)s?'
+    r'(?:\s+at\s+(\S+))?'
+)
+
+def parse_schedule(scheduler, spec):
+    """Turn 'every 5 minutes', 'daily at 08:00' or 'monday at 07:00' into a job."""
+    match = _SPEC.fullmatch(spec.strip().lower().replace('daily', 'every day'))
+    if not match:
+        raise ValueError(f"Unrecognized schedule: {spec!r}")
+    interval, unit, at = match.groups()
+    job = scheduler.every(int(interval or 1))
+    if unit in ('second', 'minute', 'hour', 'day', 'week'):
+        job = getattr(job, unit + 's')
+    else:
+        job = getattr(job, unit)
+    return job.at(at) if at else job
+
+class Daemon:
+    def __init__(self, stop=None, imap_config=None):
+        self.scheduler = schedule.Scheduler()
+        self.stop = stop or threading.Event()
+        self.imap_config = imap_config or load_imap_config()
+        self.running = {}
+        self.lock = threading.Lock()
+        self.smtp_pool = None
+        self.imap = None
+
+    def add_job(self, name, spec, func):
+        parse_schedule(self.scheduler, spec).do(self.launch, name, func)
+
+    def launch(self, name, func):
+        """Start ``func`` on its own thread unless the previous run is still going."""
+        with self.lock:
+            if self.stop.is_set():
+                return None
+            thread = self.running.get(name)
+            if thread is not None and thread.is_alive():
+                print(f"{name} is still running; skipping this run.")
+                return None
+            thread = threading.Thread(target=self._run, args=(name, func), name=name)
+            self.running[name] = thread
+            thread.start()
+            return thread
+
+    def _run(self, name, func):
+        started = time.monotonic()
+        print(f"Starting {name}")
+        try:
+            func()
+        except Exception as e:
+            print(f"{name} failed: {e}")
+        else:
+            print(f"Finished {name} in {time.monotonic() - started:.1f}s")
+
+    def smtp(self):
+        # SMTPDeliveryPool is thread-safe, so reminders and reports share it
+        with self.lock:
+            if self.smtp_pool is None:
+                self.smtp_pool = pool_from_env()
+            return self.smtp_pool
+
+    def imap_session(self):
+        # Only the ingest job uses this, and it never overlaps itself
+        if self.imap is not None:
+            try:
+                if self.imap.noop()[0] == 'OK':
+                    return self.imap
+            except Exception:
+                pass
+            self.close_imap()
+        self.imap = connect_imap(self.imap_config)
+        return self.imap
+
+    def close_imap(self):
+        if self.imap is not None:
+            try:
+                self.imap.logout()
+            except Exception:
+                pass
+            self.imap = None
+
+    def remind(self):
+        run_reminders(self.smtp())
+
+    def ingest(self):
+        if self.imap_config.get('mailboxes'):
+            # Each mailbox worker opens its own session
+            process_emails(self.imap_config)
+            return
+        try:
+            process_emails(self.imap_config, self.imap_session())
+        except Exception:
+            # The session may be in an unknown state; start fresh next time
+            self.close_imap()
+            raise
+
+    def report(self):
+        from generate_reports import run_report
+
+        run_report(report_format=os.getenv('REPORT_FORMAT', 'xlsx'), pool=self.smtp())
+
+    def run(self):
+        print(f"Scheduler started with {len(self.scheduler.get_jobs())} jobs.")
+        while not self.stop.is_set():
+            self.scheduler.run_pending()
+            idle = self.scheduler.idle_seconds
+            self.stop.wait(60 if idle is None else min(max(idle, 0.5), 60))
+        self.shutdown()
+
+    def shutdown(self, timeout=None):
+        """Let running jobs finish, then release the shared connections."""
+        self.stop.set()
+        for name, thread in list(self.running.items()):
+            if thread.is_alive():
+                print(f"Waiting for {name} to finish...")
+                thread.join(timeout)
+        if self.smtp_pool is not None:
+            self.smtp_pool.close()
+        self.close_imap()
+        close_pool()
+        print("Scheduler stopped.")
+
+def build_daemon(stop=None):
+    """Schedule every job whose SCHEDULE_<JOB> setting is not empty."""
+    daemon = Daemon(stop)
+    for name, default in DEFAULT_SCHEDULES.items():
+        spec = os.getenv(f'SCHEDULE_{name.upper()}', default)
+        if spec.strip():
+            daemon.add_job(name, spec, getattr(daemon, name))
+    return daemon
+
+if __name__ == '__main__':
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    settings.configure_logging()
+    build_daemon(stop).run()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+# schema.py
+#
+# Versioned schema for the task tables. Each migration runs once, in its own
+# transaction, and is recorded in schema_migrations. The check command
+# EXPLAINs the hot queries and fails if any of them scans a large table
+# sequentially.
+
+import argparse
+import json
+import os
+import sys
+
+from completion_history import COMPLETION_HISTORY_SCHEMA
+from db_connection import pooled_connection
+from reminder_outbox import OUTBOX_SCHEMA
+from reminder_state import REMINDER_STATE_TABLE
+from report_cache import CHANGE_TRACKING_SCHEMA
+
+# (version, description, SQL); append only, never edit an applied migration
+MIGRATIONS = [
+    (1, "people, tasks and task_completion", """
+        CREATE TABLE IF NOT EXISTS people (
+            person_id serial PRIMARY KEY,
+            name text NOT NULL,
+            email text NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id serial PRIMARY KEY,
+            task_name text NOT NULL,
+            recurrence_period integer NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS task_completion (
+            person_id integer NOT NULL REFERENCES people (person_id),
+            task_id integer NOT NULL REFERENCES tasks (task_id),
+            completion_date date NOT NULL,
+            next_due_date date NOT NULL
+        );
+    """),
+    (2, "lookup indexes", """
+        CREATE INDEX IF NOT EXISTS people_email_idx ON people (email);
+        CREATE INDEX IF NOT EXISTS tasks_task_name_lower_idx ON tasks (lower(task_name));
+        CREATE INDEX IF NOT EXISTS task_completion_next_due_date_idx ON task_completion (next_due_date);
+        CREATE UNIQUE INDEX IF NOT EXISTS task_completion_person_task_key
+            ON task_completion (person_id, task_id);
+    """),
+    (3, "reminder state", REMINDER_STATE_TABLE),
+    (4, "partitioned completion history", COMPLETION_HISTORY_SCHEMA),
+    (5, "task_completion change tracking", CHANGE_TRACKING_SCHEMA),
+    (6, "reminder outbox", OUTBOX_SCHEMA),
+    (7, "case-insensitive people email index", """
+        CREATE INDEX IF NOT EXISTS people_email_lower_idx ON people (lower(email));
+        DROP INDEX IF EXISTS people_email_idx;
+    """),
+]
+
+# Arbitrary key for the advisory lock that serializes concurrent migrators
+MIGRATION_LOCK_ID = 7203114
+
+def current_version(connection):
+    cursor = connection.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version integer PRIMARY KEY,
+            description text NOT NULL,
+            applied_at timestamptz NOT NULL DEFAULT now()
+        )
+    """)
+    cursor.execute("SELECT COALESCE(max(version), 0) AS version FROM schema_migrations")
+    version = cursor.fetchone()['version']
+    connection.commit()
+    return version
+
+def applied_version(connection):
+    """Like current_version, but read-only: 0 when nothing was ever migrated."""
+    cursor = connection.cursor()
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL AS installed")
+    version = 0
+    if cursor.fetchone()['installed']:
+        cursor.execute("SELECT COALESCE(max(version), 0) AS version FROM schema_migrations")
+        version = cursor.fetchone()['version']
+    connection.rollback()
+    return version
+
+def migrate(connection, target=None):
+    """Apply pending migrations up to ``target`` and return their versions."""
+    applied = []
+    current_version(connection)
+    for version, description, sql in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        cursor = connection.cursor()
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+        cursor.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+        if cursor.fetchone():
+            connection.rollback()
+            continue
+        try:
+            cursor.execute(sql)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+def hot_queries():
+    """The lookups every run depends on, with representative parameters."""
+    import datetime
+
+    from process_replies import PEOPLE_LOOKUP_QUERY, TASK_LOOKUP_QUERY
+    from reminder_state import DUE_REMINDERS_QUERY
+
+    return {
+        'people by email': (PEOPLE_LOOKUP_QUERY, (['someone@example.com'],)),
+        'tasks by name': (TASK_LOOKUP_QUERY, (['Fire Safety Training'],)),
+        'due reminders': (DUE_REMINDERS_QUERY, {'today': datetime.date.today(), 'tier_days': [7, 30], 'renotify_days': 7}),
+        'completion upsert key': (
+            "SELECT completion_date FROM task_completion WHERE person_id = %s AND task_id = %s",
+            (1, 1)
+        ),
+    }
+
+def find_seq_scans(plan):
+    """Return the relation names of every Seq Scan node in an EXPLAIN plan."""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found.extend(find_seq_scans(child))
+    return found
+
+def check_query_plans(connection, max_rows):
+    """EXPLAIN each hot query; return ``(query, relation, rows)`` offenders.
+
+    Small tables are always scanned sequentially, so only scans of tables
+    the statistics put above ``max_rows`` rows count as regressions.
+    """
+    offenders = []
+    cursor = connection.cursor()
+    for name, (query, params) in hot_queries().items():
+        cursor.execute("EXPLAIN (FORMAT JSON) " + query.strip().rstrip(';'), params)
+        plan = cursor.fetchone()['QUERY PLAN']
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        for relation in find_seq_scans(plan[0]['Plan']):
+            cursor.execute("SELECT reltuples::bigint AS rows FROM pg_class WHERE oid = %s::regclass", (relation,))
+            rows = cursor.fetchone()['rows']
+            if rows > max_rows:
+                offenders.append((name, relation, rows))
+    connection.rollback()
+    return offenders
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Manage the task database schema.")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    migrate_parser = commands.add_parser('migrate', help="apply pending migrations")
+    migrate_parser.add_argument('--target', type=int, help="stop after this version")
+    check_parser = commands.add_parser('check', help="fail if a hot query scans a large table sequentially")
+    check_parser.add_argument('--max-rows', type=int, default=int(os.getenv('SCHEMA_CHECK_MAX_ROWS', '10000')),
+                              help="largest table a sequential scan is allowed on")
+    args = arg_parser.parse_args()
+
+    with pooled_connection() as connection:
+        if args.command == 'migrate':
+            applied = migrate(connection, args.target)
+            if applied:
+                print(f"Applied migrations: {', '.join(str(version) for version in applied)}")
+            print(f"Schema is at version {current_version(connection)}.")
+        else:
+            offenders = check_query_plans(connection, args.max_rows)
+            for name, relation, rows in offenders:
+                print(f"Sequential scan on {relation} (~{rows} rows) in query '{name}'")
+            if offenders:
+                sys.exit(1)
+            print("All hot queries use indexes.")
@@ -2,99 +2,72 @@
 
 # send_reminders.py
 
-import smtplib
+import itertools
 import os
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from db_connection import get_db_connection
+import metrics
+import settings
+from db_connection import pooled_connection
+from reminder_outbox import enqueue_reminders, run_worker
+from reminder_state import DUE_REMINDERS_QUERY, load_reminder_policy, record_reminders
 import datetime
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv(/home/llama/llama_tasks/.env)
-
-def get_due_tasks():
-    connection = get_db_connection()
-    if not connection:
-        print("Cannot proceed without a database connection.")
-        return []
-    
-    cursor = connection.cursor()
-    
-    today = datetime.date.today()
-    
-    query = """
-    SELECT
-        p.person_id,
-        p.name,
-        p.email,
-        t.task_id,
-        t.task_name,
-        tc.next_due_date
-    FROM
-        task_completion tc
-    JOIN
-        people p ON tc.person_id = p.person_id
-    JOIN
-        tasks t ON tc.task_id = t.task_id
-    WHERE
-        tc.next_due_date <= %s
-    ORDER BY
-        p.person_id;
-    """
-    
-    cursor.execute(query, (today,))
-    tasks_due = cursor.fetchall()
-    connection.close()
-    return tasks_due
-
-def group_tasks_by_person(tasks_due):
-    tasks_by_person = {}
-    for task in tasks_due:
-        person_id = task['person_id']
-        if person_id not in tasks_by_person:
-            tasks_by_person[person_id] = {
-                'name': task['name'],
-                'email': task['email'],
-                'tasks': []
-            }
-        tasks_by_person[person_id]['tasks'].append({
-            'task_id': task['task_id'],
-            'task_name': task['task_name'],
-            'next_due_date': task['next_due_date']
-        })
-    return tasks_by_person
 
-def send_emails(tasks_by_person):
-    smtp_server = os.getenv('SMTP_SERVER')
-    smtp_port = int(os.getenv('SMTP_PORT'))
-    email_address = os.getenv('EMAIL_ADDRESS')
-    email_password = os.getenv('EMAIL_PASSWORD')
+settings.load_env()
+
+def _task_entry(task):
+    return {
+        'task_id': task['task_id'],
+        'task_name': task['task_name'],
+        'next_due_date': task['next_due_date']
+    }
 
-    if not all([smtp_server, smtp_port, email_address, email_password]):
-        print("SMTP configuration is incomplete in the .env file.")
-        return
+def iter_due_task_groups(connection, today=None, itersize=500, policy=None):
+    """Yield ``(person_id, person)`` for each person due a reminder.
 
+    People whose due tasks and escalation tier are unchanged since their
+    last reminder, within the re-notify interval, are filtered out in SQL.
+    Rows come from a server-side cursor in person_id order, so only one
+    person's tasks (plus one fetch page) are in memory at a time. The
+    connection must stay checked out, and uncommitted, until iteration ends.
+    """
+    policy = policy or load_reminder_policy()
+    cursor = connection.cursor(name='due_tasks')
+    cursor.itersize = itersize
     try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(email_address, email_password)
-    except Exception as e:
-        print(f"Failed to connect to the SMTP server: {e}")
-        return
+        cursor.execute(DUE_REMINDERS_QUERY, {
+            'today': today or datetime.date.today(),
+            'tier_days': policy['tier_days'],
+            'renotify_days': policy['renotify_days'],
+        })
+        for person_id, rows in itertools.groupby(cursor, key=lambda row: row['person_id']):
+            first = next(rows)
+            tier = first['tier']
+            yield person_id, {
+                'name': first['name'],
+                'email': first['email'],
+                'fingerprint': first['fingerprint'],
+                'tier': tier,
+                'overdue_days': policy['tier_days'][tier - 1] if tier else 0,
+                'tasks': [_task_entry(first)] + [_task_entry(row) for row in rows]
+            }
+    finally:
+        cursor.close()
 
-    for person in tasks_by_person.values():
-        msg = MIMEMultipart()
-        msg['From'] = email_address
-        msg['To'] = person['email']
-        msg['Subject'] = 'Task Reminder - Tasks Due'
+def build_reminder_message(person, email_address):
+    msg = MIMEMultipart()
+    msg['From'] = email_address
+    msg['To'] = person['email']
+    msg['Subject'] = 'Task Reminder - Tasks Due'
 
-        # Build the email body with the list of tasks
-        task_list = ''
-        for task in person['tasks']:
-            task_list += f"- {task['task_name']} (Due Date: {task['next_due_date'].strftime('%Y-%m-%d')})\n"
+    # Build the email body with the list of tasks
+    task_list = ''
+    for task in person['tasks']:
+        task_list += f"- {task['task_name']} (Due Date: {task['next_due_date'].strftime('%Y-%m-%d')})\n"
+    if person.get('tier'):
+        task_list += f"\nSome of these tasks are more than {person['overdue_days']} days overdue; please complete them as soon as possible.\n"
 
-        body = f"""Dear {person['name']},
+    body = f"""Dear {person['name']},
 
 This is a reminder that you have the following tasks due:
 
@@ -117,20 +90,129 @@ Best regards,
 Task Management System
 """
 
-        msg.attach(MIMEText(body, 'plain'))
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def enqueue_due_reminders(people, reminder_date=None, after_chunk=None):
+    """Render and queue reminders for ``(person_id, person)`` pairs.
+
+    ``people`` may be a stream; it is consumed OUTBOX_BATCH_SIZE people at
+    a time and ``after_chunk()`` runs after each chunk is committed. People
+    carrying a fingerprint have it recorded as their last reminder once it
+    is actually queued; one already queued for the day keeps its old state,
+    so a same-day change is picked up again by the next day's run.
+    Returns ``(queued, seen)``: newly queued reminders and people read.
+    """
+    reminder_date = reminder_date or datetime.date.today()
+    email_address = os.getenv('EMAIL_ADDRESS')
+    chunk_size = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+    people = iter(people)
+    queued = seen = 0
+    with pooled_connection() as connection:
+        while True:
+            chunk = list(itertools.islice(people, chunk_size))
+            if not chunk:
+                break
+            with metrics.span('render'):
+                messages = [(person_id, build_reminder_message(person, email_address)) for person_id, person in chunk]
+            metrics.count('reminders_rendered', len(messages))
+            with metrics.span('db_write'):
+                inserted = set(enqueue_reminders(connection, messages, reminder_date))
+                queued += len(inserted)
+                record_reminders(connection, [
+                    (person_id, person['fingerprint'], person['tier'])
+                    for person_id, person in chunk if person_id in inserted and 'fingerprint' in person
+                ])
+            seen += len(chunk)
+            if after_chunk:
+                after_chunk()
+    return queued, seen
+
+def deliver_outbox(pool):
+    with pooled_connection() as connection:
+        return run_worker(
+            connection,
+            pool,
+            batch_size=int(os.getenv('OUTBOX_BATCH_SIZE', '100')),
+            lease_seconds=int(os.getenv('OUTBOX_LEASE_SECONDS', '600')),
+            max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+        )
+
+def send_due_reminders(pool=None, today=None):
+    """Stream today's due tasks into the outbox and, given a pool, send them.
+
+    Each chunk of people is delivered as soon as it is queued, so the first
+    reminders go out while later people are still being read. Returns
+    None if the database cannot be read.
+    """
+    totals = {'queued': 0, 'sent': 0, 'failed': 0}
+
+    def deliver():
+        for key, count in deliver_outbox(pool).items():
+            totals[key] += count
+
+    try:
+        # The streaming read holds its own connection; queueing and
+        # delivery commit on others so the server-side cursor stays open
+        with pooled_connection() as connection:
+            people = iter_due_task_groups(connection, today)
+            totals['queued'], seen = enqueue_due_reminders(people, today, deliver if pool else None)
+    except Exception as e:
+        print(f"Cannot proceed without a database connection: {e}")
+        return None
+
+    if not seen:
+        print("No new or changed reminders due at this time.")
+    else:
+        print(f"Queued {totals['queued']} new reminders for {seen} people.")
+    return totals
+
+@metrics.job('remind')
+def run_reminders(pool=None, enqueue_only=False, worker_only=False):
+    """Queue today's reminders and deliver the outbox; returns the totals.
 
-        try:
-            server.send_message(msg)
-            print(f"Email sent to {person['name']} at {person['email']}")
-        except Exception as e:
-            print(f"Failed to send email to {person['email']}: {e}")
+    A ``pool`` passed in is left open; otherwise one is built from the
+    .env settings for this run. Returns None if SMTP is not configured
+    or the due reminders could not be queued.
+    """
+    own_pool = False
+    if enqueue_only:
+        pool = None
+    elif pool is None:
+        from smtp_pool import pool_from_env
+
+        pool = pool_from_env()
+        if pool is None:
+            print("SMTP configuration is incomplete in the .env file.")
+            return None
+        own_pool = True
 
-    server.quit()
+    try:
+        totals = {'sent': 0, 'failed': 0}
+        if not worker_only:
+            totals = send_due_reminders(pool)
+            if totals is None:
+                return None
+        if pool is not None:
+            # Pick up anything left by earlier runs or requeued after a failure
+            for key, count in deliver_outbox(pool).items():
+                totals[key] += count
+            print(f"Outbox drained: {totals['sent']} sent, {totals['failed']} failed.")
+        return totals
+    finally:
+        if own_pool:
+            pool.close()
 
 if __name__ == '__main__':
-    tasks_due = get_due_tasks()
-    if tasks_due:
-        tasks_by_person = group_tasks_by_person(tasks_due)
-        send_emails(tasks_by_person)
-    else:
-        print("No tasks due at this time.")
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Queue and send task reminder emails.")
+    mode = arg_parser.add_mutually_exclusive_group()
+    mode.add_argument('--enqueue-only', action='store_true',
+                      help="queue today's reminders without sending them")
+    mode.add_argument('--worker', action='store_true',
+                      help="only send already-queued reminders (run several to share the work)")
+    args = arg_parser.parse_args()
+
+    if run_reminders(enqueue_only=args.enqueue_only, worker_only=args.worker) is None:
+        raise SystemExit(1)
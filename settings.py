@@ -0,0 +1,32 @@
+# settings.py
+#
+# Configuration shared by every entry point. The .env file is read once per
+# process, from LLAMA_TASKS_ENV_FILE or the .env next to these scripts;
+# variables already set in the environment take precedence.
+
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ENV_FILE = os.path.join(BASE_DIR, '.env')
+DEFAULT_LOG_FILE = os.path.join(BASE_DIR, 'llama_tasks.log')
+
+_env_loaded = False
+
+def load_env():
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv(os.getenv('LLAMA_TASKS_ENV_FILE', DEFAULT_ENV_FILE))
+        _env_loaded = True
+
+def configure_logging():
+    """Send the report log to LOG_FILE (default llama_tasks.log next to the scripts)."""
+    import logging
+
+    load_env()
+    logging.basicConfig(
+        filename=os.getenv('LOG_FILE', DEFAULT_LOG_FILE),
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s:%(message)s'
+    )
@@ -0,0 +1,190 @@
+# smtp_pool.py
+#
+# Parallel SMTP delivery: a pool of authenticated SMTP sessions shared by a
+# thread pool, with a global rate limit and reconnect/retry on transient
+# failures.
+
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` sends per second across all threads."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or 1
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def _needs_reconnect(error):
+    # SMTPException subclasses OSError, so plain socket errors are told apart explicitly
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+def _is_transient(error):
+    if _needs_reconnect(error):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return False
+
+class SMTPDeliveryPool:
+    """Send messages over up to ``size`` concurrent SMTP sessions.
+
+    Sessions are opened lazily and reused. A send that fails with a
+    dropped connection or a 4xx reply is retried up to ``max_retries``
+    times with exponential backoff, on a fresh session where needed; 5xx
+    replies fail immediately. Every send returns a result dict with the
+    recipient, status ('sent' or 'failed'), attempts and error.
+    """
+
+    def __init__(self, host, port, username=None, password=None, size=4, rate_limit=0,
+                 max_retries=3, backoff=1.0, starttls=True, timeout=30):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.size = size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.starttls = starttls
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self._sessions = queue.LifoQueue()
+        for _ in range(size):
+            self._sessions.put(None)
+        self.stats = {'connections': 0, 'reconnects': 0, 'retries': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _connect(self):
+        with metrics.span('smtp_connect'):
+            session = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    session.starttls()
+                if self.username and self.password:
+                    session.login(self.username, self.password)
+            except Exception:
+                session.close()
+                raise
+        self._count('connections')
+        return session
+
+    @staticmethod
+    def _close(session):
+        if session is None:
+            return
+        try:
+            session.quit()
+        except Exception:
+            session.close()
+
+    def send(self, msg):
+        recipient = msg['To']
+        attempts = 0
+        session = self._sessions.get()
+        try:
+            while True:
+                attempts += 1
+                try:
+                    if session is None:
+                        session = self._connect()
+                    if self.limiter:
+                        self.limiter.acquire()
+                    with metrics.span('smtp_send'):
+                        session.send_message(msg)
+                    metrics.count('emails_sent')
+                    return {'recipient': recipient, 'status': 'sent', 'attempts': attempts, 'error': None}
+                except Exception as e:
+                    if not _is_transient(e) or attempts > self.max_retries:
+                        if _needs_reconnect(e):
+                            self._close(session)
+                            session = None
+                        else:
+                            session = self._reset(session)
+                        metrics.count('emails_failed')
+                        return {'recipient': recipient, 'status': 'failed', 'attempts': attempts, 'error': str(e)}
+                    self._count('retries')
+                    if _needs_reconnect(e):
+                        self._close(session)
+                        session = None
+                        self._count('reconnects')
+                    else:
+                        session = self._reset(session)
+                    time.sleep(self.backoff * 2 ** (attempts - 1))
+        finally:
+            self._sessions.put(session)
+
+    def _reset(self, session):
+        # Clear the half-finished transaction, or drop the session if it died
+        if session is None:
+            return None
+        try:
+            session.rset()
+            return session
+        except Exception:
+            self._close(session)
+            return None
+
+    def send_many(self, messages):
+        """Send ``messages`` in parallel; results come back in input order."""
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(self.send, messages))
+
+    def close(self):
+        for _ in range(self.size):
+            self._close(self._sessions.get())
+        for _ in range(self.size):
+            self._sessions.put(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def pool_from_env():
+    """Build a delivery pool from the SMTP_* settings in the .env file, or None."""
+    smtp_server = os.getenv('SMTP_SERVER')
+    smtp_port = os.getenv('SMTP_PORT')
+    email_address = os.getenv('EMAIL_ADDRESS')
+    email_password = os.getenv('EMAIL_PASSWORD')
+    if not all([smtp_server, smtp_port, email_address, email_password]):
+        return None
+    return SMTPDeliveryPool(
+        smtp_server,
+        smtp_port,
+        email_address,
+        email_password,
+        size=int(os.getenv('SMTP_POOL_SIZE', '4')),
+        rate_limit=float(os.getenv('SMTP_RATE_LIMIT', '0')),
+        max_retries=int(os.getenv('SMTP_MAX_RETRIES', '3')),
+        backoff=float(os.getenv('SMTP_RETRY_BACKOFF', '1')),
+        starttls=os.getenv('SMTP_STARTTLS', 'true').lower() != 'false'
+    )
@@ -0,0 +1,63 @@
+# task_matcher.py
+#
+# Approximate task-name matching for completion lines whose task name has
+# no exact match, e.g. "Fire safety trainng". Names are indexed in memory by
+# word trigrams (padded the way pg_trgm pads them) and scored by trigram and
+# whole-token overlap, so a lookup only touches tasks sharing a trigram.
+
+import re
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+def tokens(name):
+    return _WORD.findall(name.lower())
+
+def trigrams(words):
+    grams = set()
+    for word in words:
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class TaskMatcher:
+    """Index of task rows (dicts with task_name) for fuzzy lookup."""
+
+    def __init__(self, tasks):
+        self.tasks = []
+        self.by_trigram = {}
+        for task in tasks:
+            words = tokens(task['task_name'])
+            grams = trigrams(words)
+            index = len(self.tasks)
+            self.tasks.append((task, set(words), grams))
+            for gram in grams:
+                self.by_trigram.setdefault(gram, []).append(index)
+
+    def score(self, words, grams, index):
+        _, task_words, task_grams = self.tasks[index]
+        shared = len(grams & task_grams)
+        trigram_score = shared / (len(grams) + len(task_grams) - shared)
+        token_score = 2 * len(words & task_words) / (len(words) + len(task_words))
+        return (trigram_score + token_score) / 2
+
+    def best_match(self, name, threshold=0.6):
+        """Return ``(task, score)``; task is None if nothing reaches ``threshold``."""
+        words = set(tokens(name))
+        grams = trigrams(words)
+        if not grams:
+            return None, 0.0
+        candidates = set()
+        for gram in grams:
+            candidates.update(self.by_trigram.get(gram, ()))
+        best_task, best_score = None, 0.0
+        for index in candidates:
+            score = self.score(words, grams, index)
+            if score > best_score:
+                best_task, best_score = self.tasks[index][0], score
+        if best_score < threshold:
+            return None, best_score
+        return best_task, best_score
+
+    def match_many(self, names, threshold=0.6):
+        """Match each distinct name once; returns ``{name: (task, score)}``."""
+        return {name: self.best_match(name, threshold) for name in set(names)}
@@ -0,0 +1,29 @@
+# test_benchmark.py
+
+import datetime
+import email
+
+from benchmark import build_reply_corpus, generate_dataset, parse_scale
+from reply_body import reply_text
+from reply_parser import parse_reply
+
+TODAY = datetime.date(2024, 3, 1)
+
+def test_parse_scale():
+    assert parse_scale('10x5x20x3') == {'people': 10, 'tasks': 5, 'completions': 20, 'replies': 3}
+
+def test_dataset_has_unique_pairs_and_due_tasks():
+    dataset = generate_dataset(50, 8, 300, today=TODAY)
+    pairs = {(person_id, task_id) for person_id, task_id, _, _ in dataset['task_completion']}
+    assert len(pairs) == 300
+    assert {person_id for person_id, _ in pairs} <= {row[0] for row in dataset['people']}
+    assert any(next_due <= TODAY for _, _, _, next_due in dataset['task_completion'])
+
+def test_reply_corpus_parses():
+    dataset = generate_dataset(5, 4, 10, today=TODAY)
+    task_names = {row[1] for row in dataset['tasks']}
+    for raw in build_reply_corpus(dataset, 10, today=TODAY):
+        results = parse_reply(reply_text(email.message_from_bytes(raw)))
+        matched = [result for result in results if result['status'] == 'matched']
+        assert len(matched) == 3
+        assert {result['task_name'] for result in matched} <= task_names
@@ -0,0 +1,110 @@
+# test_completion_history.py
+
+import datetime
+
+import completion_history
+import process_replies
+from benchmark_history import add_months, scanned_relations
+from completion_history import append_history, ensure_partitions, history_installed
+from process_replies import PEOPLE_LOOKUP_QUERY, TASK_LOOKUP_QUERY, update_task_completions
+from schema import MIGRATIONS
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        self.connection.queries.append((query, params))
+        if query == PEOPLE_LOOKUP_QUERY:
+            self.rows = [{'email': 'alice@example.com', 'person_id': 1}]
+        elif query == TASK_LOOKUP_QUERY:
+            self.rows = [{'lookup_name': 'CPR', 'task_id': 10, 'recurrence_period': 365}]
+        elif 'to_regclass' in query:
+            self.rows = [{'installed': self.connection.installed}]
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+class FakeConnection:
+    def __init__(self, installed=True):
+        self.installed = installed
+        self.queries = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+def test_history_migration_follows_base_schema():
+    assert {version: description for version, description, _ in MIGRATIONS}[4] == "partitioned completion history"
+
+def test_add_months_rolls_over_years():
+    assert add_months(datetime.date(2015, 11, 1), 3) == datetime.date(2016, 2, 1)
+
+def test_scanned_relations_counts_partitions_once():
+    plan = {'Node Type': 'Append', 'Plans': [
+        {'Node Type': 'Index Scan', 'Relation Name': 'completion_history_2019_12'},
+        {'Node Type': 'Bitmap Heap Scan', 'Relation Name': 'completion_history_2019_12',
+         'Plans': [{'Node Type': 'Bitmap Index Scan'}]},
+    ]}
+    assert scanned_relations(plan) == {'completion_history_2019_12'}
+
+def test_missing_history_table_is_probed_again(monkeypatch):
+    monkeypatch.setattr(completion_history, '_installed', False)
+    connection = FakeConnection(installed=False)
+    assert not history_installed(connection)
+    # 'schema.py migrate' runs while the daemon keeps going
+    connection.installed = True
+    assert history_installed(connection)
+    assert history_installed(connection)
+    assert len(connection.queries) == 2
+
+def test_partitions_are_created_once_per_month(monkeypatch):
+    monkeypatch.setattr(completion_history, '_partitions', set())
+    connection = FakeConnection()
+    ensure_partitions(connection, [datetime.date(2024, 3, 5), datetime.date(2024, 3, 20), datetime.date(2024, 4, 1)])
+    assert [params for _, params in connection.queries] == [(datetime.date(2024, 3, 1),), (datetime.date(2024, 4, 1),)]
+    assert connection.commits == 1
+    ensure_partitions(connection, [datetime.date(2024, 3, 9)])
+    assert len(connection.queries) == 2 and connection.commits == 1
+
+def test_append_history_leaves_the_transaction_open(monkeypatch):
+    calls = []
+    monkeypatch.setattr(completion_history, 'execute_values',
+                        lambda cursor, sql, rows, page_size: calls.append((sql, rows)))
+    connection = FakeConnection()
+    append_history(connection, [])
+    assert calls == []
+    row = (1, 10, datetime.date(2024, 3, 1), datetime.date(2025, 3, 1))
+    append_history(connection, [row])
+    assert 'INSERT INTO completion_history' in calls[0][0] and calls[0][1] == [row]
+    assert connection.commits == 0
+
+def test_every_line_is_appended_and_the_latest_is_upserted(monkeypatch):
+    history, upserts, partitions = [], [], []
+    monkeypatch.setattr(process_replies, 'get_lookup_cache', lambda: None)
+    monkeypatch.setattr(process_replies, 'history_installed', lambda connection: True)
+    monkeypatch.setattr(process_replies, 'ensure_partitions', lambda connection, dates: partitions.extend(dates))
+    monkeypatch.setattr(completion_history, 'execute_values',
+                        lambda cursor, sql, rows, page_size: history.extend(rows))
+    monkeypatch.setattr(process_replies, 'execute_values', lambda cursor, sql, rows, page_size: upserts.extend(rows[:page_size]))
+
+    first, second = datetime.date(2024, 2, 28), datetime.date(2024, 3, 2)
+    connection = FakeConnection()
+    results = update_task_completions([
+        ('alice@example.com', 'CPR', first),
+        ('alice@example.com', 'CPR', second),
+    ], connection)
+
+    assert [result['status'] for result in results] == ['superseded', 'updated']
+    assert history == [(1, 10, first, first + datetime.timedelta(days=365)),
+                       (1, 10, second, second + datetime.timedelta(days=365))]
+    assert upserts == [(1, 10, second, second + datetime.timedelta(days=365))]
+    assert partitions == [first, second]
+    # History and projection are committed together
+    assert connection.commits == 1
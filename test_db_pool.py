@@ -0,0 +1,99 @@
+# test_db_pool.py
+
+import threading
+
+import pytest
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from db_connection import ConnectionPool, pooled_connection
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        if self.connection.broken:
+            raise Exception("server closed the connection unexpectedly")
+
+    def fetchone(self):
+        return (1,)
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.rollbacks = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+def make_pool(**kwargs):
+    kwargs.setdefault('minconn', 0)
+    kwargs.setdefault('maxconn', 2)
+    return ConnectionPool(connect=FakeConnection, **kwargs)
+
+def test_connections_are_reused():
+    pool = make_pool()
+    with pooled_connection(pool) as first:
+        pass
+    with pooled_connection(pool) as second:
+        pass
+    assert first is second
+    assert pool.stats['creations'] == 1
+    assert pool.stats['checkouts'] == 2
+
+def test_min_size_is_created_up_front():
+    pool = make_pool(minconn=2, maxconn=3)
+    assert pool.stats['creations'] == 2
+
+def test_open_transaction_is_rolled_back_on_return():
+    pool = make_pool()
+    with pooled_connection(pool) as connection:
+        connection.status = extensions.TRANSACTION_STATUS_INTRANS
+    assert connection.rollbacks == 1
+
+def test_stale_connection_is_replaced():
+    pool = make_pool(max_idle=0)
+    with pooled_connection(pool) as first:
+        first.broken = True
+    with pooled_connection(pool) as second:
+        pass
+    assert second is not first
+    assert first.closed
+    assert pool.stats['discarded'] == 1
+
+def test_checkout_waits_for_a_returned_connection():
+    pool = make_pool(maxconn=1, timeout=5)
+    held = pool.getconn()
+    result = {}
+
+    def worker():
+        with pooled_connection(pool) as connection:
+            result['connection'] = connection
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    while pool.stats['waits'] == 0:
+        pass
+    pool.putconn(held)
+    thread.join()
+    assert result['connection'] is held
+    assert pool.stats['creations'] == 1
+
+def test_checkout_times_out_when_exhausted():
+    pool = make_pool(maxconn=1, timeout=0.05)
+    pool.getconn()
+    with pytest.raises(PoolError):
+        pool.getconn()
@@ -0,0 +1,200 @@
+# test_imap_fetch.py
+
+import imaplib
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import pytest
+
+import mailbox_shards
+import process_replies
+from imap_fetch import load_checkpoint, parse_fetch_response, uid_message_set
+from local_services import LocalIMAPServer
+
+SUBJECT = 'Re: Task Reminder - Tasks Due'
+
+def plain_reply(sender, body, charset='utf-8'):
+    msg = MIMEText(body, 'plain', charset)
+    msg['From'] = sender
+    msg['Subject'] = SUBJECT
+    return msg.as_bytes()
+
+def reply_with_attachment(sender, body):
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['Subject'] = SUBJECT
+    msg.attach(MIMEText(body, 'plain'))
+    attachment = MIMEApplication(b'\x00' * 4096, Name='log.bin')
+    attachment['Content-Disposition'] = 'attachment; filename="log.bin"'
+    msg.attach(attachment)
+    msg.attach(MIMEText('Completed: Attached notes on 2024-01-01', 'plain'))
+    msg.get_payload()[2]['Content-Disposition'] = 'attachment; filename="notes.txt"'
+    return msg.as_bytes()
+
+@pytest.fixture
+def server():
+    with LocalIMAPServer(user='bot@example.com', password='secret') as server:
+        yield server
+
+@pytest.fixture
+def config(server, tmp_path):
+    return {
+        'server': '127.0.0.1',
+        'port': server.port,
+        'address': 'bot@example.com',
+        'password': 'secret',
+        'folder': 'inbox',
+        'ssl': False,
+        'batch_size': 2,
+        'checkpoint_file': str(tmp_path / 'checkpoint.json'),
+    }
+
+@pytest.fixture
+def written(monkeypatch):
+    batches = []
+
+    def record(completions):
+        batches.append(list(completions))
+        return [
+            {'sender_email': sender, 'task_name': task, 'completion_date': date, 'status': 'updated'}
+            for sender, task, date in completions
+        ]
+
+    monkeypatch.setattr(process_replies, 'update_task_completions', record)
+    return batches
+
+def test_uid_message_set_compresses_ranges():
+    assert uid_message_set([9, 1, 2, 3, 7, 10, 3]) == '1:3,7,9:10'
+
+def test_parse_fetch_response_handles_literals():
+    data = [
+        (b'1 (UID 5 BODYSTRUCTURE ("TEXT" "PLAIN" NIL NIL NIL "7BIT" 3 1 NIL NIL NIL NIL) BODY[HEADER.FIELDS (FROM)] {11}',
+         b'From: a@b\r\n'),
+        b')',
+        b'2 (UID 6 FLAGS (\\Seen))',
+    ]
+    parsed = parse_fetch_response(data)
+    assert parsed[5]['BODY[HEADER.FIELDS (FROM)]'] == b'From: a@b\r\n'
+    assert parsed[5]['BODYSTRUCTURE'][:2] == [b'TEXT', b'PLAIN']
+    assert parsed[6]['FLAGS'] == [b'\\Seen']
+
+def test_batches_are_fetched_and_flagged_in_bulk(server, config, written):
+    for number in range(5):
+        server.add_message(plain_reply(f'person{number}@example.com', f'Completed: Task {number} on 2024-03-0{number + 1}'))
+
+    mail = process_replies.connect_imap(config)
+    try:
+        assert process_replies.process_mailbox(mail, config) == 5
+    finally:
+        mail.logout()
+
+    assert [len(batch) for batch in written] == [2, 2, 1]
+    assert written[0][0][:2] == ('person0@example.com', 'Task 0')
+    assert all('\\Seen' in server.flags(uid) for uid in range(1, 6))
+    # Three batches: one overview FETCH, one body FETCH and one STORE each
+    assert server.commands.count('UID FETCH') == 6
+    assert server.commands.count('UID STORE') == 3
+    assert 'FETCH' not in server.commands
+
+def test_only_inline_text_parts_are_downloaded(server, config, written):
+    server.add_message(reply_with_attachment('person@example.com', 'Completed: Fire Safety on 2024-02-01'))
+    server.add_message(plain_reply('other@example.com', 'Completed: Data Privacy on 2024-02-02', charset='iso-8859-1'))
+
+    mail = process_replies.connect_imap(config)
+    try:
+        process_replies.process_mailbox(mail, config)
+    finally:
+        mail.logout()
+
+    assert [task for batch in written for _, task, _ in batch] == ['Fire Safety', 'Data Privacy']
+
+def test_long_bodies_are_fetched_partially(server, config, written):
+    body = 'Completed: CPR on 2024-02-01\nCompleted: First Aid on 2024-02-02\n' + 'pasted log line\n' * 5000
+    server.add_message(plain_reply('person@example.com', body, charset='us-ascii'))
+    config['body_max_bytes'] = 50
+
+    mail = process_replies.connect_imap(config)
+    try:
+        process_replies.process_mailbox(mail, config)
+    finally:
+        mail.logout()
+
+    # The second completion line straddles the cap and is dropped, not misread
+    assert [task for batch in written for _, task, _ in batch] == ['CPR']
+
+def test_checkpoint_resumes_after_last_committed_batch(server, config, written, monkeypatch):
+    for number in range(4):
+        server.add_message(plain_reply('person@example.com', f'Completed: Task {number} on 2024-03-01'))
+
+    calls = []
+
+    def fail_on_second_batch(messages):
+        calls.append(messages)
+        if len(calls) == 2:
+            raise RuntimeError("database went away")
+
+    monkeypatch.setattr(process_replies, 'process_messages', fail_on_second_batch)
+    mail = process_replies.connect_imap(config)
+    try:
+        with pytest.raises(RuntimeError):
+            process_replies.process_mailbox(mail, config)
+    finally:
+        mail.logout()
+
+    assert '\\Seen' in server.flags(2)
+    assert '\\Seen' not in server.flags(3)
+
+    # A message marked unread again below the checkpoint is not rescanned
+    mail = imaplib.IMAP4('127.0.0.1', server.port)
+    mail.login('bot@example.com', 'secret')
+    mail.select('inbox')
+    mail.uid('STORE', '1', '-FLAGS', '(\\Seen)')
+    mail.logout()
+
+    monkeypatch.undo()
+    monkeypatch.setattr(process_replies, 'update_task_completions', lambda completions: [])
+    mail = process_replies.connect_imap(config)
+    try:
+        assert process_replies.process_mailbox(mail, config) == 2
+    finally:
+        mail.logout()
+
+def test_pipeline_only_acknowledges_committed_batches(server, config, monkeypatch):
+    for number in range(7):
+        server.add_message(plain_reply('person@example.com', f'Completed: Task {number} on 2024-03-01'))
+
+    def write(completions):
+        if completions[0][1] == 'Task 2':
+            raise RuntimeError("deadlock detected")
+        return []
+
+    monkeypatch.setattr(process_replies, 'update_task_completions', write)
+    config.update(fetchers=2, parsers=2, writers=2, queue_size=1)
+    mail = process_replies.connect_imap(config)
+    try:
+        with pytest.raises(RuntimeError, match='1 of 4 batches failed'):
+            process_replies.process_mailbox(mail, config)
+    finally:
+        mail.logout()
+
+    seen = {uid for uid in range(1, 8) if '\\Seen' in server.flags(uid)}
+    assert seen == {1, 2, 5, 6, 7}
+    # The checkpoint stops below the failed batch so it is retried next run
+    assert load_checkpoint(config['checkpoint_file'], server.uidvalidity) == 2
+
+@pytest.mark.parametrize('messages', [2, 10])
+def test_failed_batches_fail_the_run_whatever_the_backlog(server, config, monkeypatch, messages):
+    for number in range(messages):
+        server.add_message(plain_reply('person@example.com', f'Completed: Task {number} on 2024-03-01'))
+
+    def write(completions):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(process_replies, 'update_task_completions', write)
+    config.update(fetchers=2, parsers=2, writers=2, name='bot@example.com/inbox')
+    assert process_replies.process_emails(config) is False
+
+    result = mailbox_shards.ingest_shard(config)
+    assert 'database went away' in result['error']
+    assert not any('\\Seen' in server.flags(uid) for uid in range(1, messages + 1))
@@ -0,0 +1,113 @@
+# test_llama_tasks.py
+
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+from llama_tasks import COMMAND_MODULES, main
+
+# Cumulative import time allowed before a subcommand starts working
+IMPORT_BUDGET_SECONDS = float(os.getenv('LLAMA_TASKS_IMPORT_BUDGET', '0.5'))
+HEAVY_MODULES = {'openpyxl', 'pandas', 'dateutil', 'smtplib', 'imaplib'}
+
+_IMPORT_LINE = re.compile(r'import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)')
+
+def cold_start(command):
+    """Import a subcommand in a fresh interpreter; return (seconds, modules)."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import llama_tasks; llama_tasks.load_command({command!r})"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    seconds = 0.0
+    modules = set()
+    for match in _IMPORT_LINE.finditer(result.stderr):
+        cumulative, indent, module = match.groups()
+        modules.add(module.split('.')[0])
+        if not indent:
+            seconds += int(cumulative) / 1e6
+    return seconds, modules
+
+@pytest.mark.parametrize('command', sorted(COMMAND_MODULES))
+def test_subcommand_cold_start_within_budget(command):
+    seconds, modules = cold_start(command)
+    assert not modules & HEAVY_MODULES
+    assert seconds <= IMPORT_BUDGET_SECONDS, f"{command} imports took {seconds:.3f}s"
+
+def test_invalid_options_are_rejected_before_loading():
+    with pytest.raises(SystemExit):
+        main(['report', '--format', 'csv', '--backend', 'stream'])
+    with pytest.raises(SystemExit):
+        main(['remind', '--enqueue-only', '--worker'])
+
+def test_failed_jobs_exit_non_zero(monkeypatch):
+    import process_replies
+    import send_reminders
+
+    # What the jobs return when SMTP or IMAP is not configured
+    monkeypatch.setattr(send_reminders, 'run_reminders', lambda **kwargs: None)
+    monkeypatch.setattr(process_replies, 'process_emails', lambda: False)
+    assert main(['remind']) == 1
+    assert main(['ingest']) == 1
+    monkeypatch.setattr(process_replies, 'process_emails', lambda: True)
+    assert not main(['ingest'])
+
+def test_enqueue_only_fails_without_a_database(monkeypatch):
+    from contextlib import contextmanager
+
+    import send_reminders
+
+    @contextmanager
+    def unreachable():
+        raise ConnectionError("could not connect to server")
+        yield
+
+    monkeypatch.delenv('METRICS_FILE', raising=False)
+    monkeypatch.setattr(send_reminders, 'pooled_connection', unreachable)
+    assert main(['remind', '--enqueue-only']) == 1
+
+@pytest.mark.parametrize('outcome, status', [('delivered', None), ('skipped', None), ('failed', 1)])
+def test_only_a_failed_report_exits_non_zero(monkeypatch, outcome, status):
+    import generate_reports
+
+    monkeypatch.setattr(generate_reports, 'run_report', lambda force, report_format, backend: outcome)
+    assert main(['report']) == status
+
+class ProbeCursor:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+        self.row = {'installed': True} if 'to_regclass' in query else {'version': 3}
+
+    def fetchone(self):
+        return self.row
+
+class ProbeConnection:
+    def __init__(self):
+        self.statements = []
+        self.closed = False
+
+    def cursor(self):
+        return ProbeCursor(self.statements)
+
+    def commit(self):
+        raise AssertionError("check-db must not commit")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+def test_check_db_only_reads(monkeypatch, capsys):
+    import db_connection
+
+    connection = ProbeConnection()
+    monkeypatch.setattr(db_connection, 'get_db_connection', lambda: connection)
+    assert not main(['check-db'])
+    assert not any('CREATE' in statement.upper() for statement in connection.statements)
+    assert connection.closed
+    assert 'schema is at version 3 of' in capsys.readouterr().out
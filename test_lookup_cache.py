@@ -0,0 +1,64 @@
+# test_lookup_cache.py
+
+from lookup_cache import LookupCache
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, query, params=None):
+        self.db.queries.append(query)
+        if 'count(*)' in query:
+            self.rows = [{'people': len(self.db.people), 'max_person_id': len(self.db.people),
+                          'tasks': len(self.db.tasks), 'max_task_id': len(self.db.tasks)}]
+        elif 'FROM people' in query:
+            self.rows = [{'person_id': n, 'email': email} for n, email in enumerate(self.db.people, 1)]
+        else:
+            self.rows = [{'task_id': n, 'task_name': name, 'recurrence_period': 30}
+                         for n, name in enumerate(self.db.tasks, 1)]
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+class FakeDB:
+    def __init__(self):
+        self.people = ['Alice@Example.com']
+        self.tasks = ['Fire Safety']
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_lookups_are_normalized_and_counted():
+    db = FakeDB()
+    cache = LookupCache(clock=Clock())
+    person_ids, tasks = cache.resolve(db, ['alice@example.com', 'bob@example.com'], ['FIRE SAFETY '])
+    assert person_ids == {'alice@example.com': 1}
+    assert tasks['FIRE SAFETY ']['task_id'] == 1
+    assert cache.stats == {'hits': 2, 'misses': 1, 'loads': 1, 'probes': 1}
+
+def test_reloads_on_probe_change_and_ttl():
+    db = FakeDB()
+    clock = Clock()
+    cache = LookupCache(ttl=600, probe_interval=30, clock=clock)
+    cache.resolve(db, [], [])
+    db.tasks.append('CPR')
+
+    clock.now = 10
+    assert cache.resolve(db, [], ['CPR'])[1] == {}
+    clock.now = 40
+    assert 'CPR' in cache.resolve(db, [], ['CPR'])[1]
+    assert cache.stats['loads'] == 2
+
+    clock.now = 700
+    cache.resolve(db, [], [])
+    assert cache.stats['loads'] == 3
@@ -0,0 +1,59 @@
+# test_mailbox_shards.py
+
+import json
+import os
+
+import pytest
+
+import metrics
+from mailbox_shards import ingest_mailboxes, load_mailboxes
+
+BASE = {'server': 'imap.example.com', 'port': '993', 'address': 'tasks@example.com', 'password': 'secret',
+        'folder': 'inbox', 'checkpoint_file': '/var/lib/llama/.imap_checkpoint.json'}
+
+def fake_worker(config):
+    # Runs in a pool process
+    if config['name'] == 'broken':
+        raise RuntimeError("mailbox unavailable")
+    if config['name'] == 'crash':
+        os._exit(1)
+    return {'name': config['name'], 'messages': 3, 'seconds': 0.1, 'error': None,
+            'spans': {'parse': {'count': 1, 'seconds': 0.01}}, 'counters': {'messages_fetched': 3}}
+
+def test_mailboxes_inherit_base_settings(tmp_path, monkeypatch):
+    monkeypatch.setenv('LAB_PASSWORD', 'lab-secret')
+    path = tmp_path / 'mailboxes.json'
+    path.write_text(json.dumps([
+        {'name': 'facilities', 'folder': 'Facilities'},
+        {'name': 'lab replies', 'address': 'lab@example.com', 'password_env': 'LAB_PASSWORD'},
+    ]))
+    facilities, lab = load_mailboxes(str(path), BASE)
+    assert (facilities['address'], facilities['folder']) == ('tasks@example.com', 'Facilities')
+    assert facilities['checkpoint_file'] == '/var/lib/llama/.imap_checkpoint.facilities.json'
+    assert (lab['address'], lab['password'], lab['folder']) == ('lab@example.com', 'lab-secret', 'inbox')
+    assert lab['checkpoint_file'] == '/var/lib/llama/.imap_checkpoint.lab_replies.json'
+    assert 'password_env' not in lab
+
+def test_duplicate_and_unknown_mailbox_settings_are_rejected(tmp_path):
+    path = tmp_path / 'mailboxes.json'
+    path.write_text(json.dumps([{'folder': 'A'}, {'folder': 'A'}]))
+    with pytest.raises(ValueError, match='listed twice'):
+        load_mailboxes(str(path), BASE)
+    path.write_text(json.dumps([{'folder': 'A', 'fodler': 'B'}]))
+    with pytest.raises(ValueError, match='fodler'):
+        load_mailboxes(str(path), BASE)
+
+def test_failing_mailboxes_do_not_stop_the_others():
+    before = metrics.snapshot()
+    shards = [dict(BASE, name=name) for name in ('a', 'broken', 'b')]
+    results = {result['name']: result for result in ingest_mailboxes(shards, workers=2, worker=fake_worker)}
+    assert results['a'] == {'name': 'a', 'messages': 3, 'seconds': 0.1, 'error': None}
+    assert results['b']['messages'] == 3
+    assert 'mailbox unavailable' in results['broken']['error']
+    spans, counters = metrics._since(before, metrics.snapshot())
+    assert counters == {'messages_fetched': 6, 'mailboxes_failed': 1}
+    assert spans['parse']['count'] == 2
+
+def test_crashed_worker_is_reported():
+    results = ingest_mailboxes([dict(BASE, name='crash')], worker=fake_worker)
+    assert results[0]['name'] == 'crash' and results[0]['error']
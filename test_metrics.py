@@ -0,0 +1,40 @@
+# test_metrics.py
+
+import json
+
+import pytest
+
+import metrics
+
+def test_job_summary_covers_only_its_run(tmp_path, monkeypatch):
+    path = tmp_path / 'metrics.jsonl'
+    monkeypatch.setenv('METRICS_FILE', str(path))
+    monkeypatch.setenv('METRICS_FORMAT', 'jsonl')
+    metrics.count('db_queries', 5)
+
+    @metrics.job('remind')
+    def run():
+        with metrics.span('render'):
+            metrics.count('db_queries', 2)
+        with metrics.span('render'):
+            pass
+
+    run()
+    summary = json.loads(path.read_text())
+    assert summary['job'] == 'remind'
+    assert summary['status'] == 'ok'
+    assert summary['counters'] == {'db_queries': 2}
+    assert summary['spans']['render']['count'] == 2
+
+def test_prometheus_textfile_per_job(tmp_path, monkeypatch):
+    monkeypatch.setenv('METRICS_FILE', str(tmp_path / 'llama_tasks.prom'))
+    monkeypatch.setenv('METRICS_FORMAT', 'prometheus')
+
+    with pytest.raises(RuntimeError):
+        with metrics.job_run('report'):
+            metrics.count('emails_sent')
+            raise RuntimeError("boom")
+
+    text = (tmp_path / 'llama_tasks_report.prom').read_text()
+    assert 'llama_tasks_run_success{job="report"} 0' in text
+    assert 'llama_tasks_events{job="report",name="emails_sent"} 1' in text
@@ -0,0 +1,71 @@
+# test_process_replies.py
+
+import datetime
+
+import process_replies
+from process_replies import PEOPLE_LOOKUP_QUERY, TASK_LOOKUP_QUERY, update_task_completions
+
+PEOPLE = {'alice@example.com': 1, 'bob@example.com': 2}
+TASKS = {'CPR': {'lookup_name': 'CPR', 'task_id': 10, 'recurrence_period': 365},
+         'Fire Safety': {'lookup_name': 'Fire Safety', 'task_id': 11, 'recurrence_period': 30}}
+
+class FakeCursor:
+    def execute(self, query, params):
+        if query == PEOPLE_LOOKUP_QUERY:
+            assert all(email == email.lower() for email in params[0])
+            self.rows = [{'email': email, 'person_id': PEOPLE[email]} for email in params[0] if email in PEOPLE]
+        elif query == TASK_LOOKUP_QUERY:
+            self.rows = [TASKS[name] for name in params[0] if name in TASKS]
+        else:
+            raise AssertionError(f"unexpected query: {query}")
+
+    def fetchall(self):
+        return self.rows
+
+class FakeConnection:
+    def __init__(self):
+        self.committed = False
+
+    def cursor(self):
+        return FakeCursor()
+
+    def commit(self):
+        self.committed = True
+
+def run(monkeypatch, completions):
+    upserts = []
+    monkeypatch.setattr(process_replies, 'get_lookup_cache', lambda: None)
+    monkeypatch.setattr(process_replies, 'history_installed', lambda connection: False)
+    monkeypatch.setattr(process_replies, 'execute_values', lambda cursor, sql, rows, page_size: upserts.extend(rows[:page_size]))
+    connection = FakeConnection()
+    results = update_task_completions(completions, connection)
+    assert connection.committed
+    return [result['status'] for result in results], upserts
+
+def test_unknown_sender_and_task_are_reported(monkeypatch):
+    day = datetime.date(2024, 3, 1)
+    statuses, upserts = run(monkeypatch, [
+        ('carol@example.com', 'CPR', day),
+        ('alice@example.com', 'Juggling', day),
+        ('alice@example.com', 'CPR', day),
+    ])
+    assert statuses == ['no_person', 'no_task', 'updated']
+    assert upserts == [(1, 10, day, day + datetime.timedelta(days=365))]
+
+def test_later_line_supersedes_earlier_one(monkeypatch):
+    first, second = datetime.date(2024, 3, 1), datetime.date(2024, 3, 5)
+    statuses, upserts = run(monkeypatch, [
+        ('bob@example.com', 'Fire Safety', first),
+        ('alice@example.com', 'CPR', first),
+        ('bob@example.com', 'Fire Safety', second),
+    ])
+    assert statuses == ['superseded', 'updated', 'updated']
+    # One row per key, in key order
+    assert upserts == [(1, 10, first, first + datetime.timedelta(days=365)),
+                       (2, 11, second, second + datetime.timedelta(days=30))]
+
+def test_senders_match_case_insensitively(monkeypatch):
+    day = datetime.date(2024, 3, 1)
+    statuses, upserts = run(monkeypatch, [('Alice@Example.COM', 'CPR', day)])
+    assert statuses == ['updated']
+    assert upserts == [(1, 10, day, day + datetime.timedelta(days=365))]
@@ -0,0 +1,84 @@
+# test_reminder_outbox.py
+
+from email.mime.text import MIMEText
+
+import reminder_outbox
+from reminder_outbox import run_worker
+
+def outbox_row(outbox_id, recipient, attempts=1, status='sending'):
+    msg = MIMEText('Reminder')
+    msg['To'] = recipient
+    return {'outbox_id': outbox_id, 'person_id': outbox_id, 'recipient': recipient,
+            'message': msg.as_string(), 'attempts': attempts, 'status': status}
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params):
+        self.connection.claims.append(params)
+        self.rows = self.connection.batches.pop(0) if self.connection.batches else []
+
+    def fetchall(self):
+        return self.rows
+
+class FakeConnection:
+    def __init__(self, batches):
+        self.batches = batches
+        self.claims = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+class FakePool:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+
+    def send_many(self, messages):
+        results = []
+        for msg in messages:
+            self.sent.append(msg['To'])
+            if msg['To'] in self.failing:
+                results.append({'status': 'failed', 'error': 'mailbox full', 'attempts': 1})
+            else:
+                results.append({'status': 'sent', 'error': None, 'attempts': 1})
+        return results
+
+def run(monkeypatch, batches, pool, max_attempts=3):
+    recorded = []
+    monkeypatch.setattr(reminder_outbox, 'worker_id', lambda: 'host:1')
+    monkeypatch.setattr(reminder_outbox, 'execute_values',
+                        lambda cursor, sql, rows, template: recorded.append((sql, rows)))
+    connection = FakeConnection(batches)
+    totals = run_worker(connection, pool, batch_size=2, lease_seconds=60, max_attempts=max_attempts)
+    return connection, recorded, totals
+
+def test_claimed_reminders_are_sent_and_recorded(monkeypatch):
+    pool = FakePool(failing={'bob@example.com'})
+    connection, recorded, totals = run(monkeypatch, [
+        [outbox_row(1, 'alice@example.com'), outbox_row(2, 'bob@example.com', attempts=2)],
+    ], pool)
+    assert totals == {'sent': 1, 'failed': 1}
+    assert connection.claims[0] == {'claimed_by': 'host:1', 'lease_seconds': 60, 'batch_size': 2, 'max_attempts': 3}
+    # The claim is committed before sending, and the outcome after
+    assert connection.commits == 3
+    sql, rows = recorded[0]
+    assert rows == [(1, 'host:1', True, None, 3), (2, 'host:1', False, 'mailbox full', 3)]
+
+def test_reclaimed_reminders_over_the_limit_are_parked_not_sent(monkeypatch):
+    pool = FakePool()
+    connection, recorded, totals = run(monkeypatch, [
+        [outbox_row(1, 'crash@example.com', attempts=3, status='failed'),
+         outbox_row(2, 'crash2@example.com', attempts=3, status='failed')],
+        [outbox_row(3, 'alice@example.com')],
+    ], pool)
+    # A batch of only parked rows does not end the run
+    assert pool.sent == ['alice@example.com']
+    assert totals == {'sent': 1, 'failed': 2}
+    assert [rows for _, rows in recorded] == [[(3, 'host:1', True, None, 3)]]
+    assert len(connection.claims) == 3
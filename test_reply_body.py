@@ -0,0 +1,23 @@
+# test_reply_body.py
+
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from reply_body import reply_text
+
+def test_stops_at_quoted_history():
+    body = "Completed: CPR on 2023-10-24\n\nOn Mon, Oct 2, 2023 Tasks wrote:\n> Dear Sam,\n" + "> old\n" * 1000
+    msg = MIMEText(body, 'plain', 'utf-8')
+    assert reply_text(msg).strip() == 'Completed: CPR on 2023-10-24'
+
+def test_skips_non_text_parts():
+    msg = MIMEMultipart()
+    msg.attach(MIMEApplication(b'\x00' * 4096, Name='log.bin'))
+    msg.attach(MIMEText('Completed: CPR on 2023-10-24', 'plain'))
+    assert reply_text(msg) == 'Completed: CPR on 2023-10-24'
+
+def test_cap_drops_partial_last_line():
+    msg = MIMEText('Completed: CPR on 2023-10-24\n' * 100, 'plain', 'utf-8')
+    text = reply_text(msg, max_bytes=100)
+    assert text.split('\n') == ['Completed: CPR on 2023-10-24'] * 3
@@ -0,0 +1,85 @@
+# test_reply_listener.py
+
+import imaplib
+import threading
+import time
+from email.mime.text import MIMEText
+
+import pytest
+
+import process_replies
+from local_services import LocalIMAPServer
+from reply_listener import idle_wait, listen
+
+def reply(task):
+    msg = MIMEText(f'Completed: {task} on 2024-05-01')
+    msg['From'] = 'person@example.com'
+    msg['Subject'] = 'Re: Task Reminder - Tasks Due'
+    return msg.as_bytes()
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+@pytest.fixture
+def written(monkeypatch):
+    tasks = []
+    monkeypatch.setattr(process_replies, 'update_task_completions',
+                        lambda completions: tasks.extend(task for _, task, _ in completions) or [])
+    return tasks
+
+def run_listener(server, tmp_path, **listener_config):
+    config = {
+        'server': '127.0.0.1', 'port': server.port, 'address': 'bot@example.com', 'password': 'secret',
+        'folder': 'inbox', 'ssl': False, 'batch_size': 50,
+        'checkpoint_file': str(tmp_path / 'checkpoint.json'),
+    }
+    settings = {'idle_timeout': 30, 'poll_interval': 0.1, 'session_max_age': 60, 'max_backoff': 1}
+    settings.update(listener_config)
+    stop = threading.Event()
+    thread = threading.Thread(target=listen, args=(config, settings, stop), daemon=True)
+    thread.start()
+    return stop, thread
+
+@pytest.mark.parametrize('capabilities', [('IDLE',), ()], ids=['idle', 'polling'])
+def test_new_replies_are_processed_while_running(tmp_path, written, capabilities):
+    with LocalIMAPServer(capabilities=capabilities) as server:
+        server.add_message(reply('Backlog Task'))
+        stop, thread = run_listener(server, tmp_path)
+        try:
+            assert wait_for(lambda: written == ['Backlog Task'])
+            server.add_message(reply('Fire Safety'))
+            assert wait_for(lambda: written == ['Backlog Task', 'Fire Safety'], timeout=2)
+            # Flagged seen just after the completions are written
+            assert wait_for(lambda: '\\Seen' in server.flags(2), timeout=2)
+        finally:
+            stop.set()
+            thread.join(5)
+        assert not thread.is_alive()
+
+def test_session_is_refreshed(tmp_path, written):
+    with LocalIMAPServer() as server:
+        stop, thread = run_listener(server, tmp_path, idle_timeout=0.2, session_max_age=0.3)
+        try:
+            assert wait_for(lambda: server.commands.count('LOGIN') >= 2)
+        finally:
+            stop.set()
+            thread.join(5)
+
+def test_new_mail_sent_with_the_idle_continuation_is_noticed():
+    with LocalIMAPServer() as server:
+        mail = imaplib.IMAP4('127.0.0.1', server.port)
+        mail.login('bot@example.com', 'secret')
+        mail.select('inbox')
+        # Arrives before IDLE, so the server sends '+ idling' and '* 1 EXISTS' in one write
+        server.add_message(reply('Fire Safety'))
+        started = time.monotonic()
+        try:
+            assert idle_wait(mail, timeout=5)
+        finally:
+            mail.logout()
+        assert time.monotonic() - started < 1
@@ -0,0 +1,33 @@
+# test_reply_parser.py
+
+import datetime
+
+import pytest
+
+from benchmark_reply_parser import build_corpus, legacy_parse
+from reply_parser import parse_date, parse_reply
+
+@pytest.mark.parametrize('date_str', [
+    '2023-10-24', '10/24/2023', '24-10-2023', 'October 24, 2023',
+    'Oct 24, 2023', '24 October 2023', '24 oct 2023',
+])
+def test_fast_path_formats(date_str):
+    assert parse_date(date_str) == datetime.date(2023, 10, 24)
+
+def test_falls_back_to_dateutil():
+    assert parse_date('24/10/2023') == datetime.date(2023, 10, 24)
+    assert parse_date('Sept 5, 2023') == datetime.date(2023, 9, 5)
+    assert parse_date('sometime soon') is None
+
+def test_parse_reply_classifies_lines_and_stops_at_quote():
+    body = "Hi,\n\nCompleted: CPR on 2023-10-24\nCompleted: CPR on whenever\n\nOn Mon, Tasks wrote:\n> Completed: X on 2023-01-01"
+    results = parse_reply(body)
+    assert [result['status'] for result in results] == ['unrecognized', 'matched', 'bad_date']
+    assert results[1]['task_name'] == 'CPR'
+    assert results[1]['completion_date'] == datetime.date(2023, 10, 24)
+
+def test_matches_legacy_parser_on_corpus():
+    for body in build_corpus(200):
+        legacy = [parsed for parsed in legacy_parse(body) if parsed]
+        dates = [result['completion_date'] for result in parse_reply(body) if result['status'] == 'matched']
+        assert dates == legacy
@@ -0,0 +1,117 @@
+# test_report_cache.py
+
+import datetime
+
+from report_cache import CHANGED_PEOPLE_QUERY, ReportCache, iter_cached_rows, refresh_report_cache
+
+class FakeReportDatabase:
+    """people, tasks and completions with the timestamps the triggers keep."""
+
+    def __init__(self):
+        self.now = datetime.datetime(2024, 3, 1, 12, 0)
+        self.people = {1: 'Alice', 2: 'Bob'}
+        self.tasks = [(10, 'CPR'), (11, 'Fire Safety')]
+        self.completions = {}
+        self.deletions = {}
+
+    def tick(self, minutes=30):
+        self.now += datetime.timedelta(minutes=minutes)
+
+    def complete(self, person_id, task_id, day):
+        self.completions[(person_id, task_id)] = (day, self.now)
+
+    def delete(self, person_id, task_id):
+        del self.completions[(person_id, task_id)]
+        self.deletions[person_id] = self.now
+
+    def report_rows(self, person_ids=None):
+        rows = []
+        for person_id, name in sorted(self.people.items(), key=lambda item: (item[1], item[0])):
+            if person_ids is None or person_id in person_ids:
+                dates = [self.completions.get((person_id, task_id)) for task_id, _ in self.tasks]
+                rows.append({'person_id': person_id, 'name': name,
+                             'completion_dates': [found and found[0].isoformat() for found in dates]})
+        return rows
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.itersize = None
+
+    def execute(self, query, params=None):
+        database = self.database
+        if 'tasks_signature' in query:
+            stamps = [stamp for _, stamp in database.completions.values()] + list(database.deletions.values())
+            self.rows = [{'tasks_signature': repr(database.tasks),
+                          'people_signature': repr(sorted(database.people.items())),
+                          'watermark': max(stamps, default=None)}]
+        elif query == CHANGED_PEOPLE_QUERY:
+            since = params[0]
+            changed = {person_id for (person_id, _), (_, stamp) in database.completions.items() if stamp > since}
+            changed |= {person_id for person_id, stamp in database.deletions.items() if stamp > since}
+            self.rows = [{'person_id': person_id} for person_id in changed]
+        elif 'completion_dates' in query:
+            self.rows = database.report_rows(set(params[0]) if params else None)
+        elif 'FROM people ORDER BY name' in query:
+            self.rows = [{'person_id': row['person_id'], 'name': row['name']} for row in database.report_rows()]
+        else:
+            raise AssertionError(f"unexpected query: {query}")
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def close(self):
+        pass
+
+def cached_report(database, cache):
+    return list(iter_cached_rows(database, cache, len(database.tasks)))
+
+def test_unchanged_report_is_skipped_once_delivered(tmp_path):
+    database = FakeReportDatabase()
+    database.complete(1, 10, datetime.date(2024, 2, 1))
+    cache = ReportCache(str(tmp_path / 'cache.sqlite3'))
+
+    assert refresh_report_cache(database, cache)
+    assert cached_report(database, cache) == [['Alice', '2024-02-01', None], ['Bob', None, None]]
+    # Not delivered yet, so the next run still sends it
+    assert refresh_report_cache(database, cache)
+    cache.mark_delivered()
+    database.tick()
+    assert not refresh_report_cache(database, cache)
+
+def test_only_changed_people_are_recomputed(tmp_path):
+    database = FakeReportDatabase()
+    database.complete(1, 10, datetime.date(2024, 2, 1))
+    cache = ReportCache(str(tmp_path / 'cache.sqlite3'))
+    refresh_report_cache(database, cache)
+    cache.mark_delivered()
+
+    database.tick()
+    database.complete(2, 11, datetime.date(2024, 3, 1))
+    cache.db.execute("UPDATE report_rows SET row = '[\"stale\"]' WHERE person_id = 1")
+    # Without slack, Alice's completion is older than the watermark and is not looked at again
+    assert refresh_report_cache(database, cache, slack_seconds=0)
+    assert cached_report(database, cache) == [['stale'], ['Bob', None, '2024-03-01']]
+
+def test_deleted_completion_is_not_reported_from_the_cache(tmp_path):
+    database = FakeReportDatabase()
+    database.complete(1, 10, datetime.date(2024, 2, 1))
+    cache = ReportCache(str(tmp_path / 'cache.sqlite3'))
+    refresh_report_cache(database, cache)
+    cache.mark_delivered()
+
+    # Same number of completions as before, but Alice's is gone
+    database.tick()
+    database.delete(1, 10)
+    database.complete(2, 11, datetime.date(2024, 3, 1))
+    assert refresh_report_cache(database, cache)
+    assert cached_report(database, cache) == [['Alice', None, None], ['Bob', None, '2024-03-01']]
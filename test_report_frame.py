@@ -0,0 +1,51 @@
+# test_report_frame.py
+
+import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from report_frame import build_report_frame, write_report_frame
+from report_writer import SHEET_TITLE
+
+@pytest.fixture
+def matrix():
+    people = pd.DataFrame({'person_id': [2, 1], 'name': ['Alice', 'Bob']})
+    tasks = pd.DataFrame({'task_id': [20, 10], 'task_name': ['CPR', 'Fire Safety']})
+    completions = pd.DataFrame({
+        'person_id': [1, 2, 2, 3],
+        'task_id': [10, 20, 10, 10],
+        'completion_date': [datetime.date(2023, 10, 24), datetime.date(2023, 1, 2),
+                            datetime.date(2023, 5, 6), datetime.date(2023, 7, 8)],
+    })
+    return build_report_frame(people, tasks, completions)
+
+def test_matrix_follows_report_order(matrix):
+    assert list(matrix.index) == ['Alice', 'Bob']
+    assert list(matrix.columns) == ['CPR', 'Fire Safety']
+    assert matrix.loc['Alice', 'CPR'] == '2023-01-02'
+    assert matrix.loc['Bob', 'Fire Safety'] == '2023-10-24'
+    assert pd.isna(matrix.loc['Bob', 'CPR'])
+
+def test_csv_output(matrix, tmp_path):
+    report_file = tmp_path / 'report.csv'
+    write_report_frame(matrix, report_file, 'csv')
+    assert report_file.read_text().splitlines() == [
+        ',CPR,Fire Safety',
+        'Alice,2023-01-02,2023-05-06',
+        'Bob,,2023-10-24',
+    ]
+
+def test_xlsx_output(matrix, tmp_path):
+    report_file = tmp_path / 'report.xlsx'
+    write_report_frame(matrix, report_file, 'xlsx')
+    rows = list(load_workbook(report_file)[SHEET_TITLE].iter_rows(values_only=True))
+    assert rows[0] == (None, 'CPR', 'Fire Safety')
+    assert rows[2] == ('Bob', None, '2023-10-24')
+
+def test_parquet_output(matrix, tmp_path):
+    pytest.importorskip('pyarrow')
+    report_file = tmp_path / 'report.parquet'
+    write_report_frame(matrix, report_file, 'parquet')
+    assert pd.read_parquet(report_file)['name'].tolist() == ['Alice', 'Bob']
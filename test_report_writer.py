@@ -0,0 +1,52 @@
+# test_report_writer.py
+
+import datetime
+
+from openpyxl import load_workbook
+
+from report_writer import SHEET_TITLE, report_column_widths, write_streaming_report
+
+def test_report_layout_matches_original(tmp_path):
+    report_file = tmp_path / 'report.xlsx'
+    task_names = ['Data Privacy Compliance', 'CPR']
+    rows = iter([
+        ['Alice Example', datetime.date(2023, 10, 24), None],
+        ['Bob', None, '2023-10-25'],
+    ])
+    widths = report_column_widths(task_names, len('Alice Example'))
+
+    assert write_streaming_report(report_file, task_names, rows, widths) == 2
+
+    ws = load_workbook(report_file)[SHEET_TITLE]
+    assert [[cell.value for cell in row] for row in ws.iter_rows()] == [
+        [None, 'Data Privacy Compliance', 'CPR'],
+        ['Alice Example', '2023-10-24', None],
+        ['Bob', None, '2023-10-25'],
+    ]
+    assert ws['B1'].font.bold and ws['A2'].font.bold
+    assert ws['B2'].alignment.horizontal == 'center'
+    assert [ws.column_dimensions[letter].width for letter in 'ABC'] == [15, 25, 12]
+
+def test_rows_are_consumed_lazily(tmp_path, monkeypatch):
+    from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+
+    produced = []
+    produced_at_append = []
+    append = WriteOnlyWorksheet.append
+
+    def recording_append(self, row):
+        produced_at_append.append(len(produced))
+        return append(self, row)
+
+    monkeypatch.setattr(WriteOnlyWorksheet, 'append', recording_append)
+
+    def rows():
+        for number in range(500):
+            produced.append(number)
+            yield [f'Person {number}'] + [datetime.date(2024, 1, 1)] * 20
+
+    task_names = [f'Task {number}' for number in range(20)]
+    count = write_streaming_report(tmp_path / 'big.xlsx', task_names, rows(), report_column_widths(task_names, 10))
+    assert count == len(produced) == 500
+    # Header, then each person row is written as soon as it is produced
+    assert produced_at_append[:3] == [0, 1, 2]
@@ -0,0 +1,39 @@
+# test_scheduler.py
+
+import datetime
+import threading
+
+import pytest
+import schedule
+
+from scheduler import Daemon, parse_schedule
+
+def test_parse_schedule():
+    scheduler = schedule.Scheduler()
+    job = parse_schedule(scheduler, 'every 5 minutes')
+    assert (job.interval, job.unit) == (5, 'minutes')
+    job = parse_schedule(scheduler, 'daily at 08:00')
+    assert (job.unit, job.at_time) == ('days', datetime.time(8, 0))
+    job = parse_schedule(scheduler, 'Monday at 07:30')
+    assert (job.start_day, job.at_time) == ('monday', datetime.time(7, 30))
+    with pytest.raises(ValueError):
+        parse_schedule(scheduler, 'now and then')
+
+def test_overlapping_runs_are_skipped_and_shutdown_waits():
+    daemon = Daemon(imap_config={})
+    release = threading.Event()
+    runs = []
+
+    def job():
+        runs.append(1)
+        release.wait(5)
+
+    first = daemon.launch('ingest', job)
+    assert daemon.launch('ingest', job) is None
+    release.set()
+    first.join(5)
+    assert daemon.launch('ingest', job).join(5) is None
+    assert len(runs) == 2
+
+    daemon.shutdown()
+    assert daemon.launch('ingest', job) is None
@@ -0,0 +1,72 @@
+# test_schema.py
+
+import json
+
+from schema import MIGRATIONS, check_query_plans, find_seq_scans, hot_queries
+
+def test_migration_versions_are_increasing():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+def test_migrations_create_every_table_the_jobs_use():
+    sql = ' '.join(sql for _, _, sql in MIGRATIONS)
+    for table in ('people', 'tasks', 'task_completion', 'reminder_state', 'completion_history',
+                  'task_completion_deletions', 'reminder_outbox'):
+        assert f'CREATE TABLE IF NOT EXISTS {table} (' in sql
+    assert 'ADD COLUMN IF NOT EXISTS updated_at' in sql
+
+def test_find_seq_scans_walks_nested_plans():
+    plan = {
+        'Node Type': 'Nested Loop',
+        'Plans': [
+            {'Node Type': 'Index Scan', 'Relation Name': 'people'},
+            {'Node Type': 'Hash Join', 'Plans': [
+                {'Node Type': 'Seq Scan', 'Relation Name': 'task_completion'},
+                {'Node Type': 'Hash', 'Plans': [{'Node Type': 'Seq Scan', 'Relation Name': 'tasks'}]},
+            ]},
+        ],
+    }
+    assert find_seq_scans(plan) == ['task_completion', 'tasks']
+
+class FakePlanCursor:
+    """Answers EXPLAIN with a canned plan and reltuples from ``table_rows``."""
+
+    def __init__(self, plan, table_rows):
+        self.plan = plan
+        self.table_rows = table_rows
+
+    def execute(self, query, params=None):
+        if query.startswith('EXPLAIN'):
+            self.row = {'QUERY PLAN': json.dumps([{'Plan': self.plan}])}
+        else:
+            self.row = {'rows': self.table_rows[params[0]]}
+
+    def fetchone(self):
+        return self.row
+
+class FakePlanConnection:
+    def __init__(self, plan, table_rows):
+        self.plan_cursor = FakePlanCursor(plan, table_rows)
+
+    def cursor(self):
+        return self.plan_cursor
+
+    def rollback(self):
+        pass
+
+def test_large_sequential_scan_fails_the_check():
+    plan = {'Node Type': 'Hash Join', 'Plans': [
+        {'Node Type': 'Seq Scan', 'Relation Name': 'task_completion'},
+        {'Node Type': 'Seq Scan', 'Relation Name': 'tasks'},
+    ]}
+    connection = FakePlanConnection(plan, {'task_completion': 250000, 'tasks': 40})
+    offenders = check_query_plans(connection, max_rows=10000)
+    assert offenders and {relation for _, relation, _ in offenders} == {'task_completion'}
+    assert {name for name, _, _ in offenders} == set(hot_queries())
+
+def test_index_scans_and_small_tables_pass_the_check():
+    plan = {'Node Type': 'Nested Loop', 'Plans': [
+        {'Node Type': 'Index Scan', 'Relation Name': 'task_completion'},
+        {'Node Type': 'Seq Scan', 'Relation Name': 'tasks'},
+    ]}
+    assert check_query_plans(FakePlanConnection(plan, {'tasks': 40}), max_rows=10000) == []
@@ -0,0 +1,95 @@
+# test_send_reminders.py
+
+import datetime
+from contextlib import contextmanager
+
+import send_reminders
+from send_reminders import build_reminder_message, enqueue_due_reminders, iter_due_task_groups
+
+class FakeNamedCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def execute(self, query, params):
+        self.params = params
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def close(self):
+        self.closed = True
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.named_cursor = FakeNamedCursor(rows)
+
+    def cursor(self, name=None):
+        assert name is not None
+        return self.named_cursor
+
+def due_row(person_id, name, task_id, task_name):
+    return {'person_id': person_id, 'name': name, 'email': f'{name.lower()}@example.com',
+            'task_id': task_id, 'task_name': task_name, 'next_due_date': datetime.date(2023, 10, 1),
+            'fingerprint': f'fp{person_id}', 'tier': person_id - 1}
+
+def test_due_tasks_grouped_one_person_at_a_time():
+    connection = FakeConnection([
+        due_row(1, 'Alice', 10, 'CPR'),
+        due_row(1, 'Alice', 11, 'Fire Safety'),
+        due_row(2, 'Bob', 10, 'CPR'),
+    ])
+    policy = {'tier_days': [7, 30], 'renotify_days': 7}
+    groups = iter_due_task_groups(connection, datetime.date(2023, 10, 2), policy=policy)
+    person_id, person = next(groups)
+    assert person_id == 1
+    assert person['email'] == 'alice@example.com'
+    assert (person['fingerprint'], person['tier']) == ('fp1', 0)
+    assert [task['task_name'] for task in person['tasks']] == ['CPR', 'Fire Safety']
+    assert connection.named_cursor.params['tier_days'] == [7, 30]
+    person_id, person = next(groups)
+    assert (person_id, person['tier'], person['overdue_days']) == (2, 1, 7)
+    assert next(groups, None) is None
+    assert connection.named_cursor.closed
+
+def test_escalated_reminders_say_how_overdue():
+    person = {'name': 'Bob', 'email': 'bob@example.com', 'tier': 2, 'overdue_days': 30,
+              'tasks': [{'task_id': 1, 'task_name': 'CPR', 'next_due_date': datetime.date(2023, 8, 1)}]}
+    body = build_reminder_message(person, 'tasks@example.com').get_payload()[0].get_payload()
+    assert 'more than 30 days overdue' in body
+
+def test_same_day_change_is_not_recorded_until_it_is_queued(monkeypatch):
+    outbox = set()
+    state = {}
+
+    def enqueue(connection, messages, reminder_date):
+        # ON CONFLICT (person_id, reminder_date) DO NOTHING ... RETURNING person_id
+        inserted = [person_id for person_id, _ in messages if (person_id, reminder_date) not in outbox]
+        outbox.update((person_id, reminder_date) for person_id in inserted)
+        return inserted
+
+    def record(connection, reminded):
+        state.update((person_id, fingerprint) for person_id, fingerprint, _ in reminded)
+
+    @contextmanager
+    def connection():
+        yield None
+
+    monkeypatch.setattr(send_reminders, 'pooled_connection', connection)
+    monkeypatch.setattr(send_reminders, 'enqueue_reminders', enqueue)
+    monkeypatch.setattr(send_reminders, 'record_reminders', record)
+
+    def person(fingerprint):
+        return (1, {'name': 'Alice', 'email': 'alice@example.com', 'fingerprint': fingerprint, 'tier': 0,
+                    'overdue_days': 0, 'tasks': [{'task_id': 10, 'task_name': 'CPR',
+                                                  'next_due_date': datetime.date(2023, 10, 1)}]})
+
+    today = datetime.date(2023, 10, 2)
+    assert enqueue_due_reminders([person('fp1')], today) == (1, 1)
+    assert state == {1: 'fp1'}
+    # The due set changes later the same day; today's reminder is already queued
+    assert enqueue_due_reminders([person('fp2')], today) == (0, 1)
+    assert state == {1: 'fp1'}
+    # So the change still differs from the recorded state and goes out next time
+    assert enqueue_due_reminders([person('fp2')], today + datetime.timedelta(days=1)) == (1, 1)
+    assert state == {1: 'fp2'}
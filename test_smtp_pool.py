@@ -0,0 +1,67 @@
+# test_smtp_pool.py
+
+import time
+from email.mime.text import MIMEText
+
+import pytest
+
+from local_services import LocalSMTPServer
+from smtp_pool import SMTPDeliveryPool
+
+def messages(count):
+    result = []
+    for number in range(count):
+        msg = MIMEText(f'Reminder {number}')
+        msg['From'] = 'bot@example.com'
+        msg['To'] = f'person{number}@example.com'
+        msg['Subject'] = 'Task Reminder - Tasks Due'
+        result.append(msg)
+    return result
+
+@pytest.fixture
+def server():
+    with LocalSMTPServer(user='bot@example.com', password='secret') as server:
+        yield server
+
+def make_pool(server, **kwargs):
+    kwargs.setdefault('size', 3)
+    kwargs.setdefault('backoff', 0.01)
+    return SMTPDeliveryPool('127.0.0.1', server.port, 'bot@example.com', 'secret', starttls=False, **kwargs)
+
+def test_messages_are_sent_over_pooled_sessions(server):
+    with make_pool(server) as pool:
+        results = pool.send_many(messages(20))
+    assert [result['status'] for result in results] == ['sent'] * 20
+    assert [result['recipient'] for result in results] == [f'person{number}@example.com' for number in range(20)]
+    assert len(server.messages) == 20
+    assert server.connections <= 3
+
+def test_dropped_sessions_are_reopened(server):
+    server.drop_after = 4
+    with make_pool(server, size=2) as pool:
+        results = pool.send_many(messages(12))
+    assert all(result['status'] == 'sent' for result in results)
+    assert len(server.messages) == 12
+    assert pool.stats['reconnects'] >= 2
+
+def test_transient_replies_are_retried(server):
+    server.fail_codes = [451, 421]
+    with make_pool(server, size=1) as pool:
+        result = pool.send(messages(1)[0])
+    assert result['status'] == 'sent'
+    assert result['attempts'] == 3
+
+def test_permanent_failures_are_reported_without_retry(server):
+    server.reject = {'person1@example.com'}
+    with make_pool(server) as pool:
+        results = pool.send_many(messages(3))
+    assert [result['status'] for result in results] == ['sent', 'failed', 'sent']
+    assert results[1]['attempts'] == 1
+    assert '550' in results[1]['error']
+
+def test_rate_limit_spaces_out_sends(server):
+    started = time.monotonic()
+    with make_pool(server, rate_limit=50) as pool:
+        pool.send_many(messages(11))
+    # 50 tokens a second with a one-token burst: ten waits of 20ms
+    assert time.monotonic() - started >= 0.18
@@ -0,0 +1,32 @@
+# test_task_matcher.py
+
+import time
+
+from task_matcher import TaskMatcher
+
+TASKS = [{'task_id': n, 'task_name': name} for n, name in enumerate([
+    'Fire Safety Training', 'Data Privacy Compliance', 'CPR Certification',
+    'Forklift Operation', 'First Aid Refresher',
+])]
+
+def test_misspelled_names_match():
+    matcher = TaskMatcher(TASKS)
+    task, score = matcher.best_match('Fire safety trainng')
+    assert task['task_name'] == 'Fire Safety Training'
+    assert 0.6 <= score < 1
+    assert matcher.best_match('data privacy')[0]['task_name'] == 'Data Privacy Compliance'
+
+def test_below_threshold_is_rejected():
+    matcher = TaskMatcher(TASKS)
+    task, score = matcher.best_match('Quarterly expense report')
+    assert task is None
+    assert score < 0.6
+
+def test_batch_matching_is_fast():
+    tasks = [{'task_id': n, 'task_name': f'Safety module {n} refresher'} for n in range(500)] + TASKS
+    matcher = TaskMatcher(tasks)
+    names = [f'Fire safety trainng {n}' for n in range(200)]
+    started = time.perf_counter()
+    matches = matcher.match_many(names)
+    assert len(matches) == 200
+    assert (time.perf_counter() - started) / len(names) < 0.005